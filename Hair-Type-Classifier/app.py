@@ -1,193 +1,76 @@
+import io
 import os
-import sys
-import inspect
-import pathlib
-from io import BytesIO
-from typing import List, Dict, Any
+import math
+import time
+import asyncio
+from concurrent.futures import Executor, Future
+from typing import List, Dict, Any, Optional, Tuple
 
 import numpy as np
 from PIL import Image
 
-# NEW: env + HTTP client for weather API
+# NEW: env for weather API
 from dotenv import load_dotenv
-import requests
 
 # Load environment variables from .env (if present)
 load_dotenv()
 WEATHER_API_KEY = os.getenv("WEATHER_API_KEY")
 
-# ===== Albucore / Albumentations compatibility shim =====
-# Some environments install a version of `albucore`
-# that does not define `preserve_channel_dim`, but the
-# `albumentations` version used when we trained the model
-# still expects it to exist. We recreate it here BEFORE
-# importing albumentations so that the import does not fail.
-try:
-    import albucore.utils as _acu
-    from typing import Callable
-    import numpy as _np
-
-    if not hasattr(_acu, "preserve_channel_dim"):
-
-        def preserve_channel_dim(
-            func: Callable[..., _np.ndarray]
-        ) -> Callable[..., _np.ndarray]:
-            """
-            Backwards-compat shim for old Albumentations code that expects
-            `albucore.utils.preserve_channel_dim`. Newer albucore removed it,
-            so we provide a tiny version that keeps the image channel dims.
-            """
-
-            def wrapper(image: _np.ndarray, *args, **kwargs) -> _np.ndarray:
-                orig_ndim = image.ndim
-                result = func(image, *args, **kwargs)
-                # If the number of dimensions changed, try to restore channels
-                if result.ndim == orig_ndim:
-                    return result
-                if orig_ndim == 3 and result.ndim == 2:
-                    # e.g. (H, W, C) -> (H, W); put channels back
-                    return result[..., None]
-                return result
-
-            return wrapper
-
-        # Attach our shim to albucore.utils so Albumentations can import it
-        _acu.preserve_channel_dim = preserve_channel_dim  # type: ignore[attr-defined]
-except Exception:
-    # If albucore isn't present yet during install, just ignore.
-    # When it is finally imported the above will already be defined.
-    pass
-
-# NOW it is safe to import albumentations
-import albumentations as A
-from fastai.vision.all import load_learner, PILImage, RandTransform
-
-from fastapi import FastAPI, UploadFile, File
+from fastapi import FastAPI, UploadFile, File, Form, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response
+
+from batching import MicroBatcher
+from bounded_executor import BoundedExecutor, QueueFullError
+from embedding_store import EmbeddingStore, create_index
+from inference import create_engine
+from metrics import CONTENT_TYPE, InFlightMiddleware, Registry
+from model_loader import ModelLoader
+from prediction_cache import DiskCacheTier, PredictionCache
+from product_store import DEFAULT_DB_PATH, ProductStore
+from profiling import PROFILE_HEADER, ProfileRun, RequestProfiler
+from recommender import AffinityIndex
+from uploads import (
+    UploadLimitMiddleware,
+    UploadTooLarge,
+    accepted_types_text,
+    decode_image,
+    expand_zip,
+    is_zip,
+    read_upload,
+    sniff_image_type,
+    too_large_response,
+)
+from weather import OPENWEATHERMAP_URL, CircuitBreaker, WeatherCache, WeatherClient, WeatherError
 
 # =========================================================
-# 0) Windows PosixPath pickle compatibility
-# =========================================================
-
-if os.name == "nt":
-    # Map PosixPath objects from pickle to WindowsPath
-    pathlib.PosixPath = pathlib.WindowsPath  # type: ignore
-    print("[Patch] Mapped pathlib.PosixPath -> WindowsPath for pickle loading on Windows.")
-
-# =========================================================
-# 1) Albumentations compatibility patches
-# =========================================================
-
-def _ensure_fastai_albu_compat(cls):
-    """
-    Ensure attributes/methods expected by the pickled fastai+albumentations pipeline exist.
-    Implemented as safe no-ops/defaults so newer Albumentations works with older pickles.
-    """
-    # apply_to_images: legacy API some pickles expect
-    if not hasattr(cls, "apply_to_images"):
-        def _apply_to_images(self, *args, **kwargs):
-            return self(*args, **kwargs)
-        setattr(cls, "apply_to_images", _apply_to_images)
-
-    # replay_mode: flag used internally in older versions
-    if not hasattr(cls, "replay_mode"):
-        setattr(cls, "replay_mode", False)
-
-    # deterministic: also touched in some older flows
-    if not hasattr(cls, "deterministic"):
-        setattr(cls, "deterministic", False)
-
-
-try:
-    from albumentations.core.transforms_interface import BasicTransform
-
-    for name in dir(A):
-        obj = getattr(A, name)
-        if inspect.isclass(obj) and issubclass(obj, BasicTransform):
-            _ensure_fastai_albu_compat(obj)
-except Exception:
-    # Fallback: best-effort patch for anything callable
-    for name in dir(A):
-        obj = getattr(A, name)
-        if inspect.isclass(obj) and hasattr(obj, "__call__"):
-            _ensure_fastai_albu_compat(obj)
-
-# Also patch Compose to always have additional_targets
-if hasattr(A, "Compose"):
-    Compose = A.Compose
-    if not hasattr(Compose, "additional_targets"):
-        Compose.additional_targets = {}
-
-    _old_init = Compose.__init__
-
-    def _new_init(self, *args, **kwargs):
-        if "additional_targets" not in kwargs:
-            kwargs["additional_targets"] = {}
-        _old_init(self, *args, **kwargs)
-
-    Compose.__init__ = _new_init  # type: ignore
-    print("[Patch] Added default additional_targets = {} to Albumentations Compose.")
-
-
-# =========================================================
-# 1b) AlbumentationsTransform stub for unpickling
-# =========================================================
-
-class AlbumentationsTransform(RandTransform):
-    """
-    Minimal compatible version of the AlbumentationsTransform class
-    that was used when training/saving the Learner.
-
-    It's only needed so `load_learner` can find this symbol during unpickling.
-    We don't rely on it explicitly in this serving script.
-    """
-    split_idx, order = None, 2
-
-    def __init__(self, train_aug=None, valid_aug=None):
-        super().__init__()
-        self.train_aug = train_aug
-        self.valid_aug = valid_aug
-        self.idx = 0
-
-    def before_call(self, b, split_idx):
-        self.idx = split_idx
-
-    def encodes(self, img: PILImage):
-        # Defensive: if aug is missing, just return the image unchanged
-        if self.idx == 0 and self.train_aug is not None:
-            aug_img = self.train_aug(image=np.array(img))["image"]
-            return PILImage.create(aug_img)
-        if self.idx == 1 and self.valid_aug is not None:
-            aug_img = self.valid_aug(image=np.array(img))["image"]
-            return PILImage.create(aug_img)
-        return img
-
-
-# 🔑 IMPORTANT: register stub on __main__ so torch.load can find it
-sys.modules["__main__"].AlbumentationsTransform = AlbumentationsTransform
-
-
-# =========================================================
-# 2) Load model
+# 1) Load model
 # =========================================================
 
+# INFERENCE_BACKEND selects how the classifier runs:
+#   torch       - unpickle the fastai Learner and run eager PyTorch (default);
+#                 fastai_compat.py applies the albumentations patches it needs
+#   weights     - the same eager model rebuilt from the pickle-free weights
+#                 artifact (`python export_model.py`, see model_weights.py)
+#   torchscript - frozen TorchScript from `python export_model.py`
+#   onnx        - ONNX Runtime over the same export
+#   int8        - INT8-quantized TorchScript from `python quantize_model.py`
+# The exported backends don't import fastai or albumentations at all.
 MODEL_PATH = os.path.join("models", "hair-resnet18-model.pkl")
+MODEL_EXPORT_DIR = os.getenv("MODEL_EXPORT_DIR", os.path.join("models", "export"))
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "torch").lower()
+PREDICT_MAX_BATCH_SIZE = int(os.getenv("PREDICT_MAX_BATCH_SIZE", "8"))
 
-if not os.path.isfile(MODEL_PATH):
-    raise FileNotFoundError(
-        f"Model file not found at {MODEL_PATH}. "
-        f"Make sure 'hair-resnet18-model.pkl' is inside the 'models' folder."
-    )
-
-print(f"[Info] Loading model from: {MODEL_PATH}")
-learn = load_learner(MODEL_PATH)
-print("[Info] Model loaded successfully.")
-
-HAIR_LABELS: List[str] = list(map(str, learn.dls.vocab))
+# The model is loaded in the background once the server is up (section 6).
+# Until then these stay empty; `engine` is the lean preprocessing + forward
+# path (inference.py).
+engine = None
+learn = None
+HAIR_LABELS: List[str] = []
 
 
 # =========================================================
-# 3) Simple product catalog & recommender
+# 2) Simple product catalog & recommender
 # =========================================================
 
 PRODUCT_CATALOG: List[Dict[str, Any]] = [
@@ -257,31 +140,51 @@ PRODUCT_CATALOG: List[Dict[str, Any]] = [
 ]
 
 
+# The catalog lives in the shared SQLite product store (PRODUCT_DB_PATH);
+# PRODUCT_CATALOG above only seeds it on first run. Requests read an
+# in-memory snapshot that is rebuilt when the store's version changes,
+# checked at most every PRODUCT_REFRESH_S seconds.
+PRODUCT_DB_PATH = os.getenv("PRODUCT_DB_PATH", DEFAULT_DB_PATH)
+PRODUCT_REFRESH_S = float(os.getenv("PRODUCT_REFRESH_S", "1"))
+PRODUCT_CATALOG_NAME = "api"
+
+product_store = ProductStore(PRODUCT_DB_PATH, refresh_interval_s=PRODUCT_REFRESH_S)
+if product_store.seed(PRODUCT_CATALOG_NAME, PRODUCT_CATALOG):
+    print(f"[Info] Seeded product store {PRODUCT_DB_PATH} with {len(PRODUCT_CATALOG)} products.")
+
+
+# Products x hair-type affinity matrix over the snapshot, updated in place
+# as products are appended (see recommender.py); built once the model's
+# labels are known
+affinity_index = None
+
+
 def recommend_products(hair_probs: Dict[str, float], top_k: int = 4) -> List[Dict[str, Any]]:
+    t0 = time.perf_counter()
     # Dominant predicted hair type
     best_label = max(hair_probs, key=hair_probs.get)
-    best_prob = hair_probs[best_label]
 
-    recs: List[Dict[str, Any]] = []
-    for p in PRODUCT_CATALOG:
-        targets = [t.lower() for t in p["hair_types"]]
-        if best_label.lower() in targets:
-            score = best_prob * 100  # strong match
-        else:
-            score = best_prob * 45   # soft match
+    # Every product is scored against the full probability vector, so mixed
+    # predictions (e.g. curly/wavy) favour products that suit both
+    snapshot = product_store.snapshot(PRODUCT_CATALOG_NAME)
+    affinity_index.sync(snapshot)
+    probs = np.fromiter((hair_probs.get(label, 0.0) for label in HAIR_LABELS), dtype=np.float32)
+    top, scores = affinity_index.top_k(probs, top_k, snapshot)
 
-        recs.append({
-            **p,
+    products = [
+        {
+            **snapshot.products[i],
             "match_score": round(float(score), 1),
             "for_label": best_label,
-        })
-
-    recs.sort(key=lambda x: x["match_score"], reverse=True)
-    return recs[:top_k]
+        }
+        for i, score in zip(top, scores)
+    ]
+    _observe_stage("recommend", time.perf_counter() - t0)
+    return products
 
 
 # =========================================================
-# 4) FastAPI app with CORS for React frontend
+# 3) FastAPI app with CORS for React frontend
 # =========================================================
 
 app = FastAPI(title="Trichofy Hair API")
@@ -298,6 +201,91 @@ origins = [
 if frontend_origin:
     origins.append(frontend_origin)
 
+# Hard cap on upload size, enforced while the body streams in (added before
+# CORS so that CORS stays outermost and 413s still carry CORS headers)
+PREDICT_MAX_UPLOAD_BYTES = int(os.getenv("PREDICT_MAX_UPLOAD_BYTES", str(10 * 2**20)))
+PREDICT_BATCH_MAX_UPLOAD_BYTES = int(os.getenv("PREDICT_BATCH_MAX_UPLOAD_BYTES", str(100 * 2**20)))
+app.add_middleware(
+    UploadLimitMiddleware,
+    limits={
+        "/predict": PREDICT_MAX_UPLOAD_BYTES,
+        "/analyze": PREDICT_MAX_UPLOAD_BYTES,
+        "/predict/batch": PREDICT_BATCH_MAX_UPLOAD_BYTES,
+    },
+)
+
+
+@app.exception_handler(UploadTooLarge)
+async def _upload_too_large(request, exc: UploadTooLarge):
+    ERRORS.labels("too_large").inc()
+    return too_large_response(exc.max_bytes)
+
+
+# In-process Prometheus metrics, scraped from GET /metrics (section 7).
+# Per-stage latencies are histograms; counters and gauges that the pools
+# and caches already keep are read at scrape time instead of per request.
+metrics = Registry()
+STAGE_SECONDS = metrics.histogram(
+    "trichofy_stage_seconds",
+    "Time spent per request stage (upload_read, decode, preprocess, forward, recommend, weather_upstream).",
+    labelnames=("stage",),
+)
+BATCH_SIZE = metrics.histogram(
+    "trichofy_inference_batch_size",
+    "Images per forward pass.",
+    buckets=(1, 2, 4, 8, 16, 32, 64),
+)
+ERRORS = metrics.counter(
+    "trichofy_errors",
+    "Requests (or batch items) answered with an error, by reason.",
+    labelnames=("reason",),
+)
+HTTP_REQUESTS = metrics.counter(
+    "trichofy_http_requests",
+    "Finished HTTP requests by method, route and status.",
+    labelnames=("method", "route", "status"),
+)
+HTTP_IN_FLIGHT = metrics.gauge("trichofy_http_requests_in_flight", "HTTP requests being handled right now.")
+_metric_routes = None
+
+
+def _metric_route(path: str) -> Optional[str]:
+    """Route label for a request path; None (counted as "other") for unknown paths."""
+    global _metric_routes
+    if _metric_routes is None:
+        _metric_routes = {r.path for r in app.routes if "{" not in r.path}
+    if path in _metric_routes:
+        return path
+    if path.startswith("/similar/"):
+        return "/similar/{image_id}"
+    return None
+
+
+# Set in PREDICT_POOL=process workers (see _pool_worker_init): what they
+# observe is buffered here and shipped back with each job's result, to be
+# recorded in the server process that serves /metrics.
+_worker_observations: Optional[List[Tuple[str, str, float]]] = None
+
+
+def _observe(kind: str, label: str, value: float) -> None:
+    if _worker_observations is not None:
+        _worker_observations.append((kind, label, value))
+        return
+    # Warmup passes are not traffic; keep them out of the histograms
+    if not model.ready:
+        return
+    if kind == "batch_size":
+        BATCH_SIZE.observe(value)
+    else:
+        STAGE_SECONDS.labels(label).observe(value)
+
+
+def _observe_stage(stage: str, seconds: float) -> None:
+    _observe("stage", stage, seconds)
+
+
+app.add_middleware(InFlightMiddleware, requests=HTTP_REQUESTS, in_flight=HTTP_IN_FLIGHT, route=_metric_route)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
@@ -309,85 +297,886 @@ app.add_middleware(
 # Simple health / root check
 @app.get("/")
 def root():
-    return {"status": "ok", "message": "Trichofy Hair API is running."}
+    return {"status": "ok", "message": "Trichofy Hair API is running.", "model": model.state}
 
 
 def _predict_from_pil(img: Image.Image):
-    pred, pred_idx, probs = learn.predict(PILImage.create(np.array(img)))
-    probs_dict = {HAIR_LABELS[i]: float(probs[i]) for i in range(len(HAIR_LABELS))}
+    label, probs_dict = _predict_batch_from_pil([img])[0]
     products = recommend_products(probs_dict)
-    return str(pred), probs_dict, products
+    return label, probs_dict, products
+
+
+def _predict_batch_from_pil(imgs: List[Image.Image]) -> List[Tuple[str, Dict[str, float]]]:
+    """
+    Run a batch of images through the lean inference engine (one forward
+    pass) and return `(label, probabilities)` per image.
+    """
+    probs = engine.predict_proba(imgs)
+    return [_label_and_probs(row) for row in probs]
+
+
+def _predict_batch(imgs: List[Image.Image]) -> List[Tuple]:
+    """What the micro-batcher runs: with embeddings when the store is enabled."""
+    _observe("batch_size", "", len(imgs))
+    if embedding_store is not None:
+        return _predict_batch_with_embeddings(imgs)
+    return _predict_batch_from_pil(imgs)
+
+
+def _label_and_probs(row: np.ndarray) -> Tuple[str, Dict[str, float]]:
+    probs_dict = {HAIR_LABELS[i]: float(row[i]) for i in range(len(HAIR_LABELS))}
+    return HAIR_LABELS[int(row.argmax())], probs_dict
+
+
+# =========================================================
+# 3a) Hair embeddings + similar profiles
+# =========================================================
+
+# EMBEDDINGS_DIR turns on similar profiles: every classified upload also
+# stores its penultimate-layer embedding (taken from the same forward pass)
+# with its hair type and recommended products, under the `image_id` that
+# /predict returns. GET /similar/{image_id} then answers from the stored
+# vectors without re-running the model. Needs INFERENCE_BACKEND=torch or weights.
+# EMBEDDINGS_DTYPE is float16 (default, 1 KB per photo) or float32;
+# SIMILAR_INDEX is "ivf" (approximate, default) or "exact"; SIMILAR_NPROBE
+# trades IVF recall for latency.
+EMBEDDINGS_DIR = os.getenv("EMBEDDINGS_DIR")
+EMBEDDINGS_DTYPE = os.getenv("EMBEDDINGS_DTYPE", "float16")
+SIMILAR_INDEX = os.getenv("SIMILAR_INDEX", "ivf").lower()
+SIMILAR_NPROBE = int(os.getenv("SIMILAR_NPROBE", "16"))
+SIMILAR_MAX_K = 50
+
+# Opened once the model is loaded (the vector size comes from the model)
+embedding_store = None
+similarity_index = None
+
+
+def _open_embedding_store() -> None:
+    global embedding_store, similarity_index
+    if not EMBEDDINGS_DIR:
+        return
+    if not engine.supports_embeddings:
+        print(f"[Warn] EMBEDDINGS_DIR is set but the {INFERENCE_BACKEND} backend has no embeddings; "
+              "similar profiles are disabled.")
+        return
+    embedding_store = EmbeddingStore(EMBEDDINGS_DIR, engine.embedding_dim, dtype=EMBEDDINGS_DTYPE)
+    similarity_index = create_index(SIMILAR_INDEX, embedding_store, nprobe=SIMILAR_NPROBE)
+    print(f"[Info] Embedding store: {EMBEDDINGS_DIR} ({len(embedding_store)} profiles, {SIMILAR_INDEX} index)")
+
+
+def _predict_batch_with_embeddings(imgs: List[Image.Image]) -> List[Tuple[str, Dict[str, float], np.ndarray]]:
+    """Like _predict_batch_from_pil, plus each image's embedding from the same forward pass."""
+    probs, embeddings = engine.predict_with_embeddings(imgs)
+    return [(*_label_and_probs(row), emb) for row, emb in zip(probs, embeddings)]
+
+
+async def _remember_profiles(profiles: List[Tuple[str, Dict[str, Any], List[Dict[str, Any]], np.ndarray]]) -> None:
+    """
+    Store `(image_id, prediction, products, embedding)` tuples, `products`
+    being what the request recommended; a failure never fails the prediction.
+    """
+    items = []
+    for image_id, prediction, products, embedding in profiles:
+        items.append((image_id, embedding, {
+            "hair_type": prediction["hair_type"],
+            "probabilities": prediction["probabilities"],
+            "products": [{k: p.get(k) for k in ("id", "name", "brand", "match_score")} for p in products],
+        }))
+    try:
+        await asyncio.to_thread(embedding_store.add_many, items)
+    except Exception as e:
+        print(f"[Warn] Could not store embeddings: {e}")
+
+
+def _similar(row: int, k: int) -> List[Dict[str, Any]]:
+    hits = similarity_index.search(embedding_store.vector(row), k, exclude=row)
+    return [{**embedding_store.meta(r), "similarity": round(score, 4)} for r, score in hits]
+
+
+@app.get("/similar/{image_id}")
+async def similar_profiles(image_id: str, k: int = 5):
+    """
+    The `k` stored hair profiles closest to an already-classified photo
+    (`image_id` from /predict), with the products recommended to each.
+    Uses the stored embedding: the model is not run again.
+    """
+    unavailable = _model_unavailable()
+    if unavailable is not None:
+        return unavailable
+    if similarity_index is None:
+        return JSONResponse(status_code=404, content={"error": "Similar profiles are not enabled on this server."})
+    row = embedding_store.row(image_id)
+    if row is None:
+        return JSONResponse(
+            status_code=404,
+            content={"error": "Unknown image_id; classify the photo with /predict first."},
+        )
+    similar = await asyncio.to_thread(_similar, row, max(1, min(k, SIMILAR_MAX_K)))
+    profile = embedding_store.meta(row)
+    return {
+        "image_id": image_id,
+        "hair_type": profile["hair_type"],
+        "similar": similar,
+        "index": similarity_index.stats(),
+    }
+
+
+# =========================================================
+# 3b) Micro-batching + bounded worker pools for /predict
+# =========================================================
+
+# Requests arriving within PREDICT_MAX_WAIT_MS of each other share one
+# forward pass (up to PREDICT_MAX_BATCH_SIZE images). A batch size of 1
+# restores the old one-forward-pass-per-request behaviour.
+PREDICT_MAX_WAIT_MS = float(os.getenv("PREDICT_MAX_WAIT_MS", "5"))
+
+# Decode and inference never run on the event loop. PREDICT_POOL picks
+# "thread" (default) or "process" workers; once PREDICT_MAX_QUEUE jobs are
+# waiting, /predict answers 503 with Retry-After instead of queueing more.
+# Process workers are forked (on every platform, so not on Windows) and
+# load the model themselves if the server hadn't loaded it yet.
+PREDICT_POOL = os.getenv("PREDICT_POOL", "thread")
+PREDICT_DECODE_WORKERS = int(os.getenv("PREDICT_DECODE_WORKERS", "2"))
+PREDICT_MAX_QUEUE = int(os.getenv("PREDICT_MAX_QUEUE", "32"))
+PREDICT_RETRY_AFTER_S = float(os.getenv("PREDICT_RETRY_AFTER_S", "1"))
+
+
+
+def _pool_worker_init() -> None:
+    """Runs once in each PREDICT_POOL=process worker, right after it is forked."""
+    global _worker_observations
+    _worker_observations = []
+    if engine is None:
+        # Forked before the server process had loaded the model
+        _on_model_loaded(_load_model())
+
+
+def _in_worker(fn, *args) -> Tuple[Any, List[Tuple[str, str, float]]]:
+    _worker_observations.clear()
+    return fn(*args), list(_worker_observations)
+
+
+class _ObservedProcessPool(Executor):
+    """
+    Front for a process pool: jobs run through _in_worker, and the stage
+    timings and batch sizes the worker observed are recorded here, in the
+    server process, when the job completes.
+    """
+
+    def __init__(self, executor: Executor):
+        self._executor = executor
+
+    def submit(self, fn, /, *args, **kwargs) -> Future:
+        outer: Future = Future()
+
+        def done(inner: Future) -> None:
+            try:
+                result, observations = inner.result()
+            except BaseException as e:
+                outer.set_exception(e)
+                return
+            for observation in observations:
+                _observe(*observation)
+            outer.set_result(result)
+
+        self._executor.submit(_in_worker, fn, *args).add_done_callback(done)
+        return outer
+
+    def shutdown(self, wait: bool = True, **kwargs) -> None:
+        self._executor.shutdown(wait=wait, **kwargs)
+
+
+decode_pool = BoundedExecutor(
+    max_workers=PREDICT_DECODE_WORKERS,
+    max_queue=PREDICT_MAX_QUEUE,
+    kind=PREDICT_POOL,
+    name="decode",
+    retry_after=PREDICT_RETRY_AFTER_S,
+    initializer=_pool_worker_init,
+)
+# A single inference worker: one batch at a time gets all torch threads
+inference_pool = BoundedExecutor(
+    max_workers=1,
+    max_queue=0,
+    kind=PREDICT_POOL,
+    name="inference",
+    initializer=_pool_worker_init,
+)
+if PREDICT_POOL == "process":
+    decode_pool.executor = _ObservedProcessPool(decode_pool.executor)
+    inference_pool.executor = _ObservedProcessPool(inference_pool.executor)
+batcher = MicroBatcher(
+    _predict_batch,
+    max_batch_size=PREDICT_MAX_BATCH_SIZE,
+    max_wait_ms=PREDICT_MAX_WAIT_MS,
+    executor=inference_pool.executor,
+    max_queue=PREDICT_MAX_QUEUE,
+    retry_after=PREDICT_RETRY_AFTER_S,
+)
+
+
+# Re-uploads of the same photo (retries, reloads, double taps) are answered
+# from a content-addressed cache; identical concurrent uploads share one
+# inference. PREDICT_CACHE_ENTRIES=0 disables it. PREDICT_CACHE_DIR adds an
+# on-disk tier that survives restarts (clear it when the model changes); it
+# is read in worker threads and written behind, so a slow disk doesn't stall
+# the event loop.
+PREDICT_CACHE_ENTRIES = int(os.getenv("PREDICT_CACHE_ENTRIES", "1024"))
+PREDICT_CACHE_MAX_BYTES = int(os.getenv("PREDICT_CACHE_MAX_BYTES", str(16 * 2**20)))
+PREDICT_CACHE_TTL_S = float(os.getenv("PREDICT_CACHE_TTL_S", "3600"))
+PREDICT_CACHE_DIR = os.getenv("PREDICT_CACHE_DIR")
+
+# JPEGs are decoded directly at a reduced scale close to the model input
+# (PIL draft mode); PREDICT_JPEG_DRAFT=0 decodes at full resolution
+PREDICT_JPEG_DRAFT = os.getenv("PREDICT_JPEG_DRAFT", "1") == "1"
+
+prediction_cache = PredictionCache(
+    max_entries=PREDICT_CACHE_ENTRIES,
+    max_bytes=PREDICT_CACHE_MAX_BYTES,
+    ttl_s=PREDICT_CACHE_TTL_S,
+    disk_tier=DiskCacheTier(PREDICT_CACHE_DIR) if PREDICT_CACHE_DIR else None,
+    namespace=f"{INFERENCE_BACKEND}:draft={int(PREDICT_JPEG_DRAFT)}",
+)
+
+
+@app.on_event("startup")
+async def _start_batcher():
+    batcher.start()
+
+
+@app.on_event("shutdown")
+async def _stop_batcher():
+    await batcher.stop()
+    await prediction_cache.flush()
+    decode_pool.shutdown()
+    inference_pool.shutdown()
+
+
+def _decode_image(contents: bytes) -> Image.Image:
+    t0 = time.perf_counter()
+    img = decode_image(contents, (engine.height, engine.width), draft=PREDICT_JPEG_DRAFT)
+    _observe_stage("decode", time.perf_counter() - t0)
+    return img
+
+
+def _unsupported_image() -> JSONResponse:
+    ERRORS.labels("unsupported_type").inc()
+    return JSONResponse(
+        status_code=415,
+        content={"error": f"Unsupported image type. Please upload a {accepted_types_text()} photo."},
+    )
+
+
+def _overloaded(e: QueueFullError) -> JSONResponse:
+    ERRORS.labels("overloaded").inc()
+    return JSONResponse(
+        status_code=503,
+        content={"error": "Server is busy, please retry shortly."},
+        headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))},
+    )
+
+
+async def _classify_upload(contents: bytes, key: str, computed: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Decode + batched inference for one upload; raises ValueError on a bad
+    image. When the profile is stored, the products recommended for it are
+    left in `computed["products"]` for the request to reuse.
+    """
+    try:
+        img = await decode_pool.run(_decode_image, contents)
+    except QueueFullError:
+        raise
+    except Exception as e:
+        raise ValueError("Invalid image file.") from e
+
+    result = await batcher.submit(img)
+    prediction = {"hair_type": result[0], "probabilities": result[1]}
+    if embedding_store is not None:
+        computed["products"] = recommend_products(prediction["probabilities"])
+        await _remember_profiles([(key, prediction, computed["products"], result[2])])
+    return prediction
+
+
+@app.get("/cache")
+def cache_stats():
+    """Hit / miss / eviction counters of the prediction cache."""
+    return prediction_cache.stats()
+
+
+@app.get("/queue")
+def queue_stats():
+    """Current depth, rejections and wait times of the /predict queues."""
+    return {
+        "decode": decode_pool.stats(),
+        "inference": batcher.stats(),
+    }
 
 
 @app.post("/predict")
-async def predict_endpoint(file: UploadFile = File(...)):
+async def predict_endpoint(request: Request, file: UploadFile = File(...)):
     """
     Accepts an uploaded image and returns:
     - predicted hair type
     - probabilities per class
     - recommended products with match scores
     """
+    return await _predict_upload(file, request)
+
+
+async def _predict_upload(file: UploadFile, request: Optional[Request] = None) -> Any:
+    """The /predict answer for one upload: a dict, or a JSONResponse for 413 / 415 / 503."""
+    unavailable = _model_unavailable()
+    if unavailable is not None:
+        return unavailable
+    t0 = time.perf_counter()
     try:
-        contents = await file.read()
-        img = Image.open(BytesIO(contents)).convert("RGB")
+        contents = await read_upload(file, PREDICT_MAX_UPLOAD_BYTES)
+    except UploadTooLarge as e:
+        ERRORS.labels("too_large").inc()
+        return too_large_response(e.max_bytes)
     except Exception:
+        ERRORS.labels("invalid_image").inc()
+        return {"error": "Invalid image file."}
+    upload_read_s = time.perf_counter() - t0
+    _observe_stage("upload_read", upload_read_s)
+
+    if sniff_image_type(contents[:16]) is None:
+        return _unsupported_image()
+
+    key = prediction_cache.key(contents)
+    if profiler is not None:
+        reason = profiler.reason(request.headers.get(PROFILE_HEADER) if request is not None else None)
+        run = profiler.start(reason) if reason is not None else None
+        if run is not None:
+            run.timer.ms["upload_read"] = round(upload_read_s * 1000, 3)
+            return await _predict_profiled(run, contents, key)
+    computed: Dict[str, Any] = {}
+    try:
+        prediction = await prediction_cache.get_or_compute(key, lambda: _classify_upload(contents, key, computed))
+    except QueueFullError as e:
+        return _overloaded(e)
+    except ValueError:
+        ERRORS.labels("invalid_image").inc()
         return {"error": "Invalid image file."}
 
-    pred_label, probs_dict, products = _predict_from_pil(img)
+    # Cache hits and coalesced requests rank the products themselves
+    products = computed.get("products")
+    if products is None:
+        products = recommend_products(prediction["probabilities"])
 
-    return {
-        "hair_type": pred_label,
-        "probabilities": probs_dict,
+    response = {
+        "hair_type": prediction["hair_type"],
+        "probabilities": prediction["probabilities"],
         "products": products,
     }
+    if embedding_store is not None:
+        response["image_id"] = key
+    return response
 
 
 # =========================================================
-# 5) Weather endpoint for Seasonal Hair Adjustments
+# 3c) Batch prediction: many images in one request
 # =========================================================
 
+PREDICT_BATCH_MAX_ITEMS = int(os.getenv("PREDICT_BATCH_MAX_ITEMS", "64"))
+
+
+def _decode_many(items: List[bytes]) -> List[Any]:
+    """Decode several uploads in one pool job; failures come back as exceptions."""
+    out: List[Any] = []
+    for contents in items:
+        try:
+            out.append(_decode_image(contents))
+        except Exception as e:
+            out.append(e)
+    return out
+
+
+async def _classify_many(items: List[Dict[str, Any]]) -> None:
+    """
+    Fill in `prediction` or `error` on each item in place (and `products`
+    when the profile is stored). Cache hits skip all work; the rest are
+    decoded in parallel across the decode workers and go through the
+    micro-batcher, so they share forward passes with each other and with
+    concurrent /predict calls.
+    """
+    todo = []
+    for item in items:
+        if item.get("error"):
+            continue
+        if sniff_image_type(item["data"][:16]) is None:
+            item["error"] = f"Unsupported image type (accepted: {accepted_types_text()})."
+            continue
+        item["key"] = prediction_cache.key(item["data"])
+        cached = await prediction_cache.get(item["key"]) if prediction_cache.enabled else None
+        if cached is not None:
+            item["prediction"] = cached
+        else:
+            todo.append(item)
+    if not todo:
+        return
+
+    n_chunks = min(decode_pool.max_workers, len(todo))
+    chunks = [todo[i::n_chunks] for i in range(n_chunks)]
+    decoded = await asyncio.gather(
+        *(decode_pool.run(_decode_many, [item["data"] for item in chunk]) for chunk in chunks)
+    )
+
+    ready = []
+    for chunk, imgs in zip(chunks, decoded):
+        for item, img in zip(chunk, imgs):
+            if isinstance(img, Exception):
+                item["error"] = "Invalid image file."
+            else:
+                item["image"] = img
+                ready.append(item)
+    if not ready:
+        return
+
+    outputs = await batcher.submit_many([item.pop("image") for item in ready])
+    profiles = []
+    for item, out in zip(ready, outputs):
+        if isinstance(out, Exception):
+            item["error"] = "Prediction failed."
+            continue
+        item["prediction"] = {"hair_type": out[0], "probabilities": out[1]}
+        if prediction_cache.enabled:
+            prediction_cache.set(item["key"], item["prediction"])
+        if embedding_store is not None:
+            item["products"] = recommend_products(item["prediction"]["probabilities"])
+            profiles.append((item["key"], item["prediction"], item["products"], out[2]))
+    if profiles:
+        await _remember_profiles(profiles)
+
+
+@app.post("/predict/batch")
+async def predict_batch_endpoint(files: List[UploadFile] = File(...)):
+    """
+    Classify many images in one request: several `files` parts and/or zip
+    archives of images. Returns one entry per image, in upload order, with
+    the same `hair_type` / `probabilities` / `products` shape as /predict.
+    Images that fail get an `error` instead; they never fail the batch.
+    """
+    unavailable = _model_unavailable()
+    if unavailable is not None:
+        return unavailable
+    items: List[Dict[str, Any]] = []
+    for upload in files:
+        name = upload.filename or f"file-{len(items)}"
+        t0 = time.perf_counter()
+        try:
+            contents = await read_upload(upload, PREDICT_BATCH_MAX_UPLOAD_BYTES)
+        except UploadTooLarge as e:
+            ERRORS.labels("too_large").inc()
+            return too_large_response(e.max_bytes)
+        except Exception:
+            items.append({"filename": name, "error": "Could not read upload."})
+            continue
+        _observe_stage("upload_read", time.perf_counter() - t0)
+
+        if is_zip(contents):
+            for member, data, error in expand_zip(contents, PREDICT_MAX_UPLOAD_BYTES, PREDICT_BATCH_MAX_ITEMS):
+                items.append({"filename": f"{name}/{member}", "data": data, "error": error})
+        elif len(contents) > PREDICT_MAX_UPLOAD_BYTES:
+            items.append({"filename": name, "error": "File exceeds the upload limit."})
+        else:
+            items.append({"filename": name, "data": contents})
+
+        if len(items) > PREDICT_BATCH_MAX_ITEMS:
+            ERRORS.labels("too_many_items").inc()
+            return JSONResponse(
+                status_code=413,
+                content={"error": f"Too many images; at most {PREDICT_BATCH_MAX_ITEMS} per request."},
+            )
+
+    try:
+        await _classify_many(items)
+    except QueueFullError as e:
+        return _overloaded(e)
+
+    results = []
+    for item in items:
+        if "prediction" in item:
+            prediction = item["prediction"]
+            products = item.get("products")
+            if products is None:
+                products = recommend_products(prediction["probabilities"])
+            results.append({
+                "filename": item["filename"],
+                "hair_type": prediction["hair_type"],
+                "probabilities": prediction["probabilities"],
+                "products": products,
+            })
+            if embedding_store is not None:
+                results[-1]["image_id"] = item["key"]
+        else:
+            results.append({"filename": item["filename"], "error": item.get("error") or "Invalid image file."})
+            ERRORS.labels("batch_item").inc()
+
+    succeeded = sum(1 for r in results if "error" not in r)
+    return {
+        "count": len(results),
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+        "results": results,
+    }
+
+
+# =========================================================
+# 3d) Opt-in request profiling
+# =========================================================
+
+# Off by default. PROFILE_SAMPLE_RATE profiles that fraction of /predict and
+# /analyze requests; PROFILE_TOKENS (comma-separated) lets a caller ask for
+# a profile with `X-Profile: <token>`. Profiles (cProfile, torch.profiler
+# operator times, image size and per-stage timings) go to PROFILE_DIR,
+# keeping the newest PROFILE_MAX_FILES; see profiling.py and
+# summarize_profiles.py. PROFILE_TORCH=0 skips torch.profiler.
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_TOKENS = [t.strip() for t in os.getenv("PROFILE_TOKENS", "").split(",") if t.strip()]
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "50"))
+PROFILE_TORCH = os.getenv("PROFILE_TORCH", "1") == "1"
+
+profiler = None
+if PROFILE_SAMPLE_RATE > 0 or PROFILE_TOKENS:
+    profiler = RequestProfiler(
+        PROFILE_DIR,
+        sample_rate=PROFILE_SAMPLE_RATE,
+        tokens=PROFILE_TOKENS,
+        max_files=PROFILE_MAX_FILES,
+        torch_profile=PROFILE_TORCH,
+    )
+    print(f"[Info] Request profiling on: sample rate {PROFILE_SAMPLE_RATE}, "
+          f"{len(PROFILE_TOKENS)} header token(s), writing to {PROFILE_DIR}/")
+
+
+def _profiled_prediction(run: ProfileRun, contents: bytes) -> Tuple[Dict[str, Any], List[Dict[str, Any]], Any]:
+    """
+    Decode, preprocess, forward and product ranking for one upload, in the
+    calling thread and unbatched, so a single profile covers every stage.
+    """
+    with run:
+        stage = run.timer.stage
+        with stage("decode"):
+            img = _decode_image(contents)
+        with Image.open(io.BytesIO(contents)) as original:
+            run.meta["image"] = {
+                "bytes": len(contents),
+                "format": original.format,
+                "size": list(original.size),
+                "decoded_size": list(img.size),
+            }
+        run.meta["backend"] = INFERENCE_BACKEND
+        with stage("preprocess"):
+            x = engine.preprocess([img])
+        with stage("forward"), run.torch_ops():
+            if embedding_store is not None:
+                probs, feats = engine.backend.embed(x)
+            else:
+                probs, feats = engine.backend(x), None
+        label, probs_dict = _label_and_probs(probs[0])
+        with stage("recommend"):
+            products = recommend_products(probs_dict)
+        run.meta["hair_type"] = label
+    prediction = {"hair_type": label, "probabilities": probs_dict}
+    return prediction, products, None if feats is None else feats[0]
+
+
+async def _predict_profiled(run: ProfileRun, contents: bytes, key: str) -> Any:
+    """/predict for a request picked for profiling; skips the cache lookup so the work is measured."""
+    try:
+        prediction, products, embedding = await asyncio.to_thread(_profiled_prediction, run, contents)
+    except Exception:
+        ERRORS.labels("invalid_image").inc()
+        return {"error": "Invalid image file."}
+    if prediction_cache.enabled:
+        prediction_cache.set(key, prediction)
+    response = {**prediction, "products": products}
+    if embedding is not None:
+        await _remember_profiles([(key, prediction, products, embedding)])
+        response["image_id"] = key
+    return response
+
+
+# =========================================================
+# 4) Weather endpoint for Seasonal Hair Adjustments
+# =========================================================
+
+# Weather changes slowly: answers are cached per normalized (city, country)
+# for WEATHER_CACHE_TTL_S, then served stale for up to WEATHER_STALE_TTL_S
+# more while one background refresh runs. WEATHER_CACHE_TTL_S=0 disables
+# the cache. WEATHER_API_URL can point at a stand-in server for local runs.
+WEATHER_API_URL = os.getenv("WEATHER_API_URL", OPENWEATHERMAP_URL)
+WEATHER_CACHE_TTL_S = float(os.getenv("WEATHER_CACHE_TTL_S", "600"))
+WEATHER_STALE_TTL_S = float(os.getenv("WEATHER_STALE_TTL_S", "3600"))
+WEATHER_CACHE_ENTRIES = int(os.getenv("WEATHER_CACHE_ENTRIES", "256"))
+
+# Upstream calls share one pooled keep-alive client. After
+# WEATHER_BREAKER_FAILURES consecutive failures, lookups fail fast for
+# WEATHER_BREAKER_COOLDOWN_S instead of waiting on a sick upstream.
+WEATHER_CONNECT_TIMEOUT_S = float(os.getenv("WEATHER_CONNECT_TIMEOUT_S", "2"))
+WEATHER_READ_TIMEOUT_S = float(os.getenv("WEATHER_READ_TIMEOUT_S", "5"))
+WEATHER_MAX_CONNECTIONS = int(os.getenv("WEATHER_MAX_CONNECTIONS", "20"))
+WEATHER_BREAKER_FAILURES = int(os.getenv("WEATHER_BREAKER_FAILURES", "5"))
+WEATHER_BREAKER_COOLDOWN_S = float(os.getenv("WEATHER_BREAKER_COOLDOWN_S", "30"))
+
+weather_client = WeatherClient(
+    WEATHER_API_KEY,
+    url=WEATHER_API_URL,
+    connect_timeout_s=WEATHER_CONNECT_TIMEOUT_S,
+    read_timeout_s=WEATHER_READ_TIMEOUT_S,
+    max_connections=WEATHER_MAX_CONNECTIONS,
+    breaker=CircuitBreaker(WEATHER_BREAKER_FAILURES, WEATHER_BREAKER_COOLDOWN_S),
+)
+
+
+async def _fetch_weather(city: str, country: str) -> Dict[str, Any]:
+    """The upstream call behind the cache, timed (failures and fast-fails included)."""
+    t0 = time.perf_counter()
+    try:
+        return await weather_client.fetch(city, country)
+    finally:
+        STAGE_SECONDS.labels("weather_upstream").observe(time.perf_counter() - t0)
+
+
+weather_cache = WeatherCache(
+    _fetch_weather,
+    ttl_s=WEATHER_CACHE_TTL_S,
+    stale_ttl_s=WEATHER_STALE_TTL_S,
+    max_entries=WEATHER_CACHE_ENTRIES,
+)
+
+
+@app.on_event("shutdown")
+async def _close_weather_client():
+    await weather_client.aclose()
+
+
 @app.get("/weather")
-def get_weather(city: str = "Johannesburg", country: str = "ZA"):
+async def get_weather(city: str = "Johannesburg", country: str = "ZA"):
     """
     Fetch current weather for a given South African city using OpenWeatherMap.
 
     Default: Johannesburg, ZA
     """
+    return await _lookup_weather(city, country)
+
+
+async def _lookup_weather(city: str, country: str) -> Dict[str, Any]:
     if not WEATHER_API_KEY:
         return {"error": "Weather API key not configured on the server."}
 
-    url = "https://api.openweathermap.org/data/2.5/weather"
-    params = {
-        "q": f"{city},{country}",
-        "appid": WEATHER_API_KEY,
-        "units": "metric",
-    }
+    try:
+        return await weather_cache.get(city, country)
+    except WeatherError as e:
+        ERRORS.labels("weather").inc()
+        return e.payload
+
+
+@app.get("/weather/cache")
+def weather_cache_stats():
+    """Hit / stale / refresh counters of the weather cache, and the upstream circuit state."""
+    return {**weather_cache.stats(), "upstream": weather_client.stats()}
+
+
+# =========================================================
+# 5) Combined analysis: prediction + weather in one round trip
+# =========================================================
+
+# /analyze never waits longer than this for the weather part; a slower
+# lookup keeps running in the cache and is ready for the next request.
+ANALYZE_WEATHER_TIMEOUT_S = float(os.getenv("ANALYZE_WEATHER_TIMEOUT_S", "3"))
+
 
+async def _weather_for_analyze(city: str, country: str) -> Dict[str, Any]:
     try:
-        response = requests.get(url, params=params, timeout=8)
+        return await asyncio.wait_for(_lookup_weather(city, country), ANALYZE_WEATHER_TIMEOUT_S)
+    except asyncio.TimeoutError:
+        ERRORS.labels("weather_timeout").inc()
+        return {"error": "Weather service timed out."}
     except Exception as e:
-        return {"error": "Failed to reach weather service.", "details": str(e)}
+        print(f"[Warn] Weather lookup for /analyze failed: {e}")
+        ERRORS.labels("weather").inc()
+        return {"error": "Failed to reach weather service."}
+
+
+@app.post("/analyze")
+async def analyze_endpoint(
+    request: Request,
+    file: UploadFile = File(...),
+    city: str = Form("Johannesburg"),
+    country: str = Form("ZA"),
+):
+    """
+    /predict and /weather in one request, run concurrently. Returns the
+    /predict fields plus `weather`; if only the weather lookup fails,
+    `weather` holds its error and the prediction is still returned.
+    """
+    prediction, weather = await asyncio.gather(
+        _predict_upload(file, request),
+        _weather_for_analyze(city, country),
+    )
+    if not isinstance(prediction, dict) or "error" in prediction:
+        return prediction
+    return {**prediction, "weather": weather}
 
-    if response.status_code != 200:
-        return {
-            "error": "Weather API returned an error.",
-            "status_code": response.status_code,
-            "details": response.text,
-        }
 
-    data = response.json()
+# =========================================================
+# 6) Model lifecycle: background load, warmup, health probes
+# =========================================================
+
+# MODEL_LOAD=background (default) loads the model on a background thread
+# once the server is up, so liveness probes answer straight away and
+# prediction endpoints return 503 + Retry-After until it is loaded. It is
+# then warmed up with MODEL_WARMUP_ROUNDS synthetic forward passes at each
+# of MODEL_WARMUP_BATCH_SIZES (default: 1 and PREDICT_MAX_BATCH_SIZE), on
+# the inference worker itself. GET /readyz only answers 200 after that,
+# so an orchestrator routes traffic once first-request latency is steady
+# state. MODEL_LOAD=eager loads during import instead; serve_prefork.py
+# always loads in the parent before forking and warms up in each worker.
+MODEL_LOAD = os.getenv("MODEL_LOAD", "background").lower()
+MODEL_WARMUP_ROUNDS = int(os.getenv("MODEL_WARMUP_ROUNDS", "3"))
+MODEL_WARMUP_BATCH_SIZES = [
+    int(b) for b in os.getenv("MODEL_WARMUP_BATCH_SIZES", f"1,{PREDICT_MAX_BATCH_SIZE}").split(",") if b.strip()
+]
+
+
+def _load_model():
+    return create_engine(
+        INFERENCE_BACKEND,
+        model_path=MODEL_PATH,
+        export_dir=MODEL_EXPORT_DIR,
+        max_batch_size=PREDICT_MAX_BATCH_SIZE,
+    )
+
+
+def _on_model_loaded(result) -> None:
+    global engine, learn, affinity_index
+    engine, learn = result
+    HAIR_LABELS[:] = engine.vocab
+    affinity_index = AffinityIndex(HAIR_LABELS)
+    engine.on_stage = _observe_stage
+    _open_embedding_store()
+    print(f"[Info] Inference backend: {INFERENCE_BACKEND}")
+
+
+def _warmup(imgs: List[Image.Image]) -> None:
+    # Same worker (thread or process) and code path as real batches
+    imgs = [_decode_image(_encode_jpeg(img)) for img in imgs]
+    inference_pool.executor.submit(_predict_batch, imgs).result()
+
+
+def _encode_jpeg(img: Image.Image) -> bytes:
+    buf = io.BytesIO()
+    img.save(buf, format="JPEG", quality=90)
+    return buf.getvalue()
+
+
+model = ModelLoader(
+    _load_model,
+    on_loaded=_on_model_loaded,
+    warmup=_warmup,
+    warmup_batch_sizes=[min(b, PREDICT_MAX_BATCH_SIZE) for b in MODEL_WARMUP_BATCH_SIZES],
+    warmup_rounds=MODEL_WARMUP_ROUNDS,
+)
+if MODEL_LOAD == "eager":
+    model.load()
+
+
+def _model_unavailable() -> Optional[JSONResponse]:
+    """503 while the model is loading (or failed to load); None once it can serve."""
+    if model.loaded:
+        return None
+    ERRORS.labels("model_unavailable").inc()
+    message = "Model failed to load." if model.state == "failed" else "Model is loading, please retry shortly."
+    return JSONResponse(
+        status_code=503,
+        content={"error": message, "model": model.state},
+        headers={"Retry-After": str(max(1, math.ceil(PREDICT_RETRY_AFTER_S)))},
+    )
+
+
+@app.on_event("startup")
+async def _start_model():
+    model.start()
+
+
+@app.get("/healthz")
+def liveness():
+    """Liveness: the process is up. Only a failed model load makes it fail (so it gets restarted)."""
+    status = {"status": "failed" if model.state == "failed" else "ok", "model": model.state}
+    return JSONResponse(status_code=503 if model.state == "failed" else 200, content=status)
+
+
+@app.get("/readyz")
+def readiness():
+    """Readiness: 200 once the model is loaded and warmed up; load / warmup timings either way."""
+    return JSONResponse(
+        status_code=200 if model.ready else 503,
+        content={**model.status(), "backend": INFERENCE_BACKEND},
+    )
+
+
+
+# =========================================================
+# 7) Metrics
+# =========================================================
+
+# Read at scrape time from the counters the pools, caches and model loader
+# already keep; nothing extra happens per request.
+metrics.gauge_callback(
+    "trichofy_queue_depth",
+    "Jobs waiting for a worker.",
+    lambda: {("decode",): decode_pool.queue_depth, ("inference",): batcher.queue_depth},
+    labelnames=("queue",),
+)
+metrics.gauge_callback(
+    "trichofy_pool_in_flight",
+    "Jobs queued or running in a worker pool.",
+    lambda: {("decode",): decode_pool.in_flight},
+    labelnames=("pool",),
+)
+metrics.counter_callback(
+    "trichofy_rejected",
+    "Jobs refused because a queue was full (answered 503).",
+    lambda: {("decode",): decode_pool.rejected, ("inference",): batcher.rejected},
+    labelnames=("queue",),
+)
+metrics.counter_callback(
+    "trichofy_prediction_cache_lookups",
+    "Prediction cache lookups by result.",
+    lambda: {
+        ("hit",): prediction_cache.hits,
+        ("disk_hit",): prediction_cache.disk_hits,
+        ("coalesced",): prediction_cache.coalesced,
+        ("miss",): prediction_cache.misses,
+    },
+    labelnames=("result",),
+)
+metrics.counter_callback(
+    "trichofy_weather_cache_lookups",
+    "Weather cache lookups by result.",
+    lambda: {
+        ("hit",): weather_cache.hits,
+        ("stale",): weather_cache.stale_hits,
+        ("coalesced",): weather_cache.coalesced,
+        ("miss",): weather_cache.misses,
+    },
+    labelnames=("result",),
+)
+metrics.gauge_callback(
+    "trichofy_weather_circuit_open",
+    "1 while the weather circuit breaker is open or half-open.",
+    lambda: 0 if weather_client.breaker.state == "closed" else 1,
+)
+metrics.gauge_callback("trichofy_model_ready", "1 once the model is loaded and warmed up.", lambda: int(model.ready))
 
-    weather_info = {
-        "city": data.get("name"),
-        "temp": data["main"]["temp"],
-        "feels_like": data["main"]["feels_like"],
-        "humidity": data["main"]["humidity"],
-        "condition": data["weather"][0]["main"],
-        "description": data["weather"][0]["description"],
-        "icon": data["weather"][0]["icon"],
-    }
 
-    return weather_info
+@app.get("/metrics")
+def metrics_endpoint():
+    """Prometheus text format: stage latency histograms, error / cache / rejection counters, queue gauges."""
+    return Response(metrics.render(), media_type=CONTENT_TYPE)
 
 
 if __name__ == "__main__":
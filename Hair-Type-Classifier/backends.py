@@ -0,0 +1,183 @@
+"""
+CPU inference backends for the hair classifier.
+
+A backend is a callable that takes a normalized float32 NCHW batch and
+returns class probabilities as a float32 (N, num_classes) array. The
+preprocessing in front of it lives in `inference.InferenceEngine`, so all
+backends see exactly the same input.
+
+    torch        eager PyTorch on `learn.model` (default)
+    weights      the same eager model rebuilt from the pickle-free weights
+                 artifact written by export_model.py (model_weights.py)
+    torchscript  frozen TorchScript module written by export_model.py
+    onnx         ONNX graph run with onnxruntime, written by export_model.py
+    int8         INT8-quantized TorchScript module written by quantize_model.py
+"""
+import json
+import os
+import threading
+from typing import Any, Dict
+
+import numpy as np
+import torch
+
+EXPORT_METADATA = "metadata.json"
+EXPORT_FILES = {
+    "weights": "weights.npz",
+    "torchscript": "model.ts",
+    "onnx": "model.onnx",
+}
+QUANTIZED_FILE = "model-int8.ts"
+
+
+class ProbabilitiesModel(torch.nn.Module):
+    """Wraps a classifier so its output is softmax probabilities, as fastai's predict returns."""
+
+    def __init__(self, model: torch.nn.Module):
+        super().__init__()
+        self.model = model
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        logits = self.model(x)
+        return torch.softmax(logits.as_subclass(torch.Tensor).float(), dim=-1)
+
+
+class EmbeddingModel(torch.nn.Module):
+    """
+    Returns `(probabilities, embedding)` from one forward pass. The
+    embedding is the penultimate-layer feature vector: the output of
+    fastai's head minus its final Linear layer, i.e. that layer's input.
+    """
+
+    def __init__(self, model: torch.nn.Module):
+        super().__init__()
+        head = model[1] if isinstance(model, torch.nn.Sequential) and len(model) == 2 else None
+        if not isinstance(head, torch.nn.Sequential) or not isinstance(head[-1], torch.nn.Linear):
+            raise ValueError("Embeddings need a fastai Sequential(body, head) model whose head ends in nn.Linear.")
+        self.features = torch.nn.Sequential(model[0], head[:-1])
+        self.classifier = head[-1]
+        self.dim = self.classifier.in_features
+
+    def forward(self, x: torch.Tensor):
+        features = self.features(x).as_subclass(torch.Tensor).float()
+        return torch.softmax(self.classifier(features), dim=-1), features
+
+
+class TorchBackend:
+    name = "torch"
+
+    def __init__(self, model: torch.nn.Module):
+        self.model = ProbabilitiesModel(model).eval()
+        self._source = model
+        self._embedding_model = None
+
+    def __call__(self, x: np.ndarray) -> np.ndarray:
+        with torch.inference_mode():
+            return self.model(torch.from_numpy(x)).numpy().copy()
+
+    def _get_embedding_model(self) -> EmbeddingModel:
+        if self._embedding_model is None:
+            # Shares its parameters with self.model: no extra memory
+            self._embedding_model = EmbeddingModel(self._source).eval()
+        return self._embedding_model
+
+    @property
+    def embedding_dim(self) -> int:
+        return self._get_embedding_model().dim
+
+    def embed(self, x: np.ndarray):
+        """`(probabilities, embeddings)` for a batch, as float32 arrays."""
+        with torch.inference_mode():
+            probs, features = self._get_embedding_model()(torch.from_numpy(x))
+            return probs.numpy().copy(), features.numpy().copy()
+
+    def share_memory(self) -> None:
+        self.model.share_memory()
+
+
+class WeightsBackend(TorchBackend):
+    name = "weights"
+
+    def __init__(self, path: str, architecture: Dict[str, Any]):
+        from model_weights import load_weights_model
+
+        super().__init__(load_weights_model(path, architecture))
+
+
+class TorchScriptBackend(TorchBackend):
+    name = "torchscript"
+    # Frozen graphs only expose the probabilities output
+    embed = None
+
+    def __init__(self, path: str):
+        self.model = torch.jit.load(path, map_location="cpu").eval()
+
+
+class OnnxBackend:
+    name = "onnx"
+
+    def __init__(self, path: str, intra_op_threads: int = 0):
+        try:
+            import onnxruntime  # noqa: F401
+        except ImportError as e:
+            raise ImportError(
+                "INFERENCE_BACKEND=onnx needs onnxruntime: pip install onnxruntime"
+            ) from e
+        self.path = path
+        self.intra_op_threads = intra_op_threads
+        self._session = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _get_session(self):
+        # onnxruntime sessions own a thread pool that does not survive fork(),
+        # so each process (e.g. every pre-fork worker) builds its own lazily.
+        if self._session is None or self._pid != os.getpid():
+            with self._lock:
+                if self._session is None or self._pid != os.getpid():
+                    import onnxruntime as ort
+
+                    opts = ort.SessionOptions()
+                    opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+                    opts.intra_op_num_threads = self.intra_op_threads or torch.get_num_threads()
+                    self._session = ort.InferenceSession(
+                        self.path, sess_options=opts, providers=["CPUExecutionProvider"]
+                    )
+                    self._input_name = self._session.get_inputs()[0].name
+                    self._pid = os.getpid()
+        return self._session
+
+    def __call__(self, x: np.ndarray) -> np.ndarray:
+        session = self._get_session()
+        return session.run(None, {self._input_name: x})[0]
+
+    def share_memory(self) -> None:
+        # Nothing to share up front: sessions are built per process
+        pass
+
+
+def load_export_metadata(export_dir: str) -> Dict[str, Any]:
+    path = os.path.join(export_dir, EXPORT_METADATA)
+    if not os.path.isfile(path):
+        raise FileNotFoundError(
+            f"No exported model found at {path}. Run `python export_model.py` first."
+        )
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_exported_backend(name: str, export_dir: str, meta: Dict[str, Any]):
+    defaults = {**EXPORT_FILES, "int8": QUANTIZED_FILE}
+    filename = meta.get("files", {}).get(name, defaults.get(name))
+    if filename is None:
+        raise ValueError(f"Backend {name!r} has no exported artifact in {export_dir}.")
+    path = os.path.join(export_dir, filename)
+    if not os.path.isfile(path):
+        raise FileNotFoundError(f"Exported {name} model not found at {path}.")
+    if name == "onnx":
+        return OnnxBackend(path)
+    if name == "weights":
+        if "architecture" not in meta:
+            raise ValueError(f"{export_dir}/{EXPORT_METADATA} has no architecture; re-run export_model.py.")
+        return WeightsBackend(path, meta["architecture"])
+    return TorchScriptBackend(path)
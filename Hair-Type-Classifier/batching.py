@@ -0,0 +1,181 @@
+import asyncio
+import time
+from concurrent.futures import Executor
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from bounded_executor import QueueFullError, WaitStats
+
+
+class MicroBatcher:
+    """
+    Collects concurrent single-item requests into one batch so the model
+    runs a single forward pass for all of them.
+
+    A batch is flushed as soon as it holds `max_batch_size` items or the
+    first item in it has waited `max_wait_ms`, whichever comes first.
+    `predict_batch` receives the list of items and must return one result
+    per item, in the same order. It runs on `executor` so the event loop
+    stays free while the forward pass is in progress.
+
+    With `max_queue` set, `submit` raises QueueFullError once that many
+    items are already waiting, instead of queueing without bound.
+    """
+
+    def __init__(
+        self,
+        predict_batch: Callable[[List[Any]], Sequence[Any]],
+        max_batch_size: int = 8,
+        max_wait_ms: float = 5.0,
+        executor: Optional[Executor] = None,
+        max_queue: Optional[int] = None,
+        retry_after: float = 1.0,
+    ):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be >= 1")
+        self.predict_batch = predict_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max(0.0, float(max_wait_ms))
+        self._executor = executor
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+        self.batches = 0
+        self.items = 0
+        self.rejected = 0
+        self.wait = WaitStats()
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    @property
+    def running(self) -> bool:
+        return self._worker is not None and not self._worker.done()
+
+    def start(self) -> None:
+        """Start the batching loop on the running event loop (idempotent)."""
+        if self.running:
+            return
+        self._queue = asyncio.Queue()
+        self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the batching loop and fail anything still waiting."""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        if self._queue is not None:
+            while not self._queue.empty():
+                _, fut, _ = self._queue.get_nowait()
+                if not fut.done():
+                    fut.set_exception(RuntimeError("Batcher stopped."))
+
+    async def submit(self, item: Any) -> Any:
+        """Queue one item and wait for its own result."""
+        if not self.running:
+            self.start()
+        if self.max_queue is not None and self._queue.qsize() >= self.max_queue:
+            self.rejected += 1
+            raise QueueFullError("Inference queue is full.", retry_after=self.retry_after)
+        fut = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((item, fut, time.monotonic()))
+        return await fut
+
+    async def submit_many(self, items: Sequence[Any]) -> List[Any]:
+        """
+        Queue several items at once (e.g. one multi-image request) and wait
+        for all of them. They are batched together with everybody else's
+        items. A failed batch puts its exception in place of the result
+        rather than raising, so one bad batch doesn't fail the rest.
+        """
+        if not self.running:
+            self.start()
+        # Admit the whole group if there is any room, so a group larger than
+        # max_queue can still get through on an idle server
+        if self.max_queue is not None and self._queue.qsize() >= self.max_queue:
+            self.rejected += 1
+            raise QueueFullError("Inference queue is full.", retry_after=self.retry_after)
+        loop = asyncio.get_running_loop()
+        now = time.monotonic()
+        futs = []
+        for item in items:
+            fut = loop.create_future()
+            self._queue.put_nowait((item, fut, now))
+            futs.append(fut)
+        return list(await asyncio.gather(*futs, return_exceptions=True))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+            "max_queue": self.max_queue,
+            "queue_depth": self.queue_depth,
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "rejected": self.rejected,
+            "wait": self.wait.as_dict(),
+        }
+
+    async def _collect(self) -> List[Tuple[Any, asyncio.Future, float]]:
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait_ms / 1000.0
+
+        while len(batch) < self.max_batch_size:
+            # Take whatever is already queued without waiting
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            getter = asyncio.ensure_future(self._queue.get())
+            done, _ = await asyncio.wait({getter}, timeout=timeout)
+            if getter in done:
+                batch.append(getter.result())
+            else:
+                # Cancelling a pending Queue.get never drops an item
+                getter.cancel()
+                break
+        return batch
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            # Callers that gave up (client disconnect, timeout) don't need a slot
+            live = [(item, fut) for item, fut, _ in batch if not fut.done()]
+            if not live:
+                continue
+
+            dispatched = time.monotonic()
+            for _, fut, submitted in batch:
+                if not fut.done():
+                    self.wait.record(dispatched - submitted)
+            self.batches += 1
+            self.items += len(live)
+
+            try:
+                results = await loop.run_in_executor(
+                    self._executor, self.predict_batch, [item for item, _ in live]
+                )
+                if len(results) != len(live):
+                    raise RuntimeError(
+                        f"predict_batch returned {len(results)} results for {len(live)} items."
+                    )
+            except Exception as e:
+                for _, fut in live:
+                    if not fut.done():
+                        fut.set_exception(e)
+                continue
+
+            for (_, fut), result in zip(live, results):
+                if not fut.done():
+                    fut.set_result(result)
@@ -0,0 +1,117 @@
+"""
+End-to-end latency: one /analyze request vs the old /predict then /weather flow.
+
+    python benchmarks/bench_analyze.py --weather-delay-ms 150 --rtt-ms 100 --requests 50
+
+Starts benchmarks/fake_weather_server.py (with --weather-delay-ms upstream
+latency) and the API pointed at it, with the prediction and weather caches
+off so every request pays for both inference and the upstream call. Each
+client round trip is charged an extra --rtt-ms, standing in for a mobile
+network:
+  two-call  POST /predict, then GET /weather (what App.jsx used to do)
+  analyze   POST /analyze, inference and weather lookup run concurrently
+"""
+import argparse
+import glob
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_weather_server import start_fake_weather_server  # noqa: E402
+
+
+def _wait_ready(url, proc, timeout=300):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError("Server exited during startup.")
+        try:
+            if requests.get(url, timeout=1).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError("Server did not become ready in time.")
+
+
+def _percentiles(samples_ms):
+    samples_ms = sorted(samples_ms)
+    p95 = samples_ms[min(len(samples_ms) - 1, int(round(0.95 * (len(samples_ms) - 1))))]
+    return statistics.median(samples_ms), p95
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8123)
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--weather-delay-ms", type=float, default=150.0)
+    parser.add_argument("--rtt-ms", type=float, default=100.0, help="simulated client network round trip")
+    args = parser.parse_args()
+
+    images = [(os.path.basename(p), open(p, "rb").read())
+              for p in sorted(glob.glob(os.path.join(ROOT, "examples", "*.jpg")))]
+    if not images:
+        sys.exit("No examples/*.jpg found.")
+
+    weather = start_fake_weather_server(delay_s=args.weather_delay_ms / 1000)
+    env = {
+        **os.environ,
+        "WEATHER_API_URL": weather.url,
+        "WEATHER_API_KEY": os.getenv("WEATHER_API_KEY", "dummy"),
+        "WEATHER_CACHE_TTL_S": "0",
+        "PREDICT_CACHE_ENTRIES": "0",
+    }
+    base = f"http://127.0.0.1:{args.port}"
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--port", str(args.port), "--log-level", "warning"],
+        cwd=ROOT, env=env,
+    )
+    rtt = args.rtt_ms / 1000
+    form = {"city": "Johannesburg", "country": "ZA"}
+
+    def two_call(session, name, data):
+        time.sleep(rtt)
+        r = session.post(f"{base}/predict", files={"file": (name, data, "image/jpeg")}, timeout=60)
+        ok = "hair_type" in r.json()
+        time.sleep(rtt)
+        r = session.get(f"{base}/weather", params=form, timeout=60)
+        return ok and "temp" in r.json()
+
+    def analyze(session, name, data):
+        time.sleep(rtt)
+        r = session.post(f"{base}/analyze", files={"file": (name, data, "image/jpeg")}, data=form, timeout=60)
+        body = r.json()
+        return "hair_type" in body and "temp" in body.get("weather", {})
+
+    try:
+        _wait_ready(f"{base}/readyz", proc)
+        session = requests.Session()
+        print(f"[Bench] {args.requests} requests, upstream weather {args.weather_delay_ms:.0f} ms, "
+              f"client RTT {args.rtt_ms:.0f} ms")
+        for label, flow in (("two-call", two_call), ("analyze", analyze)):
+            for name, data in images[:2]:
+                flow(session, name, data)  # warm up
+            samples, errors = [], 0
+            for i in range(args.requests):
+                name, data = images[i % len(images)]
+                t0 = time.perf_counter()
+                if not flow(session, name, data):
+                    errors += 1
+                samples.append((time.perf_counter() - t0) * 1000)
+            p50, p95 = _percentiles(samples)
+            print(f"  {label:<9} p50 {p50:8.1f} ms   p95 {p95:8.1f} ms   errors {errors}")
+    finally:
+        proc.terminate()
+        proc.wait()
+        weather.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Compare inference backends on single-image latency and batched throughput.
+
+    python export_model.py                     # once, writes models/export
+    python benchmarks/bench_backends.py --backends torch,torchscript,onnx
+
+Backends whose artifact (or runtime) is missing are reported and skipped.
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import numpy as np  # noqa: E402
+import torch  # noqa: E402
+from PIL import Image  # noqa: E402
+
+from inference import create_engine  # noqa: E402
+
+
+def _timings(fn, repeats):
+    fn()
+    times = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return np.array(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", default="torch,torchscript,onnx")
+    parser.add_argument("--batch-sizes", default="8,32")
+    parser.add_argument("--repeats", type=int, default=30)
+    parser.add_argument("--threads", type=int, default=0, help="torch/ORT intra-op threads (default: torch default)")
+    parser.add_argument("--model", default=os.path.join("models", "hair-resnet18-model.pkl"))
+    parser.add_argument("--export-dir", default=os.path.join("models", "export"))
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    imgs = [Image.open(p).convert("RGB") for p in sorted(glob.glob(os.path.join(ROOT, "examples", "*.jpg")))]
+    if not imgs:
+        raise SystemExit("No example images found in examples/.")
+    batch_sizes = [int(b) for b in args.batch_sizes.split(",")]
+
+    print(f"{'backend':<12} {'1-img p50 ms':>13} {'1-img p99 ms':>13} "
+          + " ".join(f"{f'bs={b} img/s':>12}" for b in batch_sizes))
+    for name in args.backends.split(","):
+        try:
+            engine, _ = create_engine(name, args.model, args.export_dir, max_batch_size=max(batch_sizes))
+        except (FileNotFoundError, ImportError, ValueError) as e:
+            print(f"{name:<12} skipped: {e}")
+            continue
+
+        single = _timings(lambda: engine.predict(imgs[0]), args.repeats) * 1000
+        row = f"{name:<12} {np.percentile(single, 50):>13.2f} {np.percentile(single, 99):>13.2f} "
+        for bs in batch_sizes:
+            batch = [imgs[i % len(imgs)] for i in range(bs)]
+            t = _timings(lambda: engine.predict_proba(batch), max(3, args.repeats // 5))
+            row += f"{bs / np.median(t):>12.1f} "
+        print(row)
+
+
+if __name__ == "__main__":
+    main()
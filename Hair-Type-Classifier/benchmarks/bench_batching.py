@@ -0,0 +1,120 @@
+"""
+Latency / throughput of /predict inference with and without micro-batching.
+
+Run from anywhere (the model is loaded from Hair-Type-Classifier/models):
+
+    python benchmarks/bench_batching.py --concurrency 1,4,16,32
+
+For each concurrency level N, N simulated clients each send
+--requests-per-client predictions back to back through a MicroBatcher.
+"unbatched" uses max_batch_size=1 (the old one-forward-per-request path).
+"""
+import argparse
+import asyncio
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import numpy as np  # noqa: E402
+from PIL import Image  # noqa: E402
+
+import app  # noqa: E402
+from batching import MicroBatcher  # noqa: E402
+
+
+def load_examples():
+    paths = sorted(glob.glob(os.path.join(ROOT, "examples", "*.jpg")))
+    if not paths:
+        raise SystemExit("No example images found in examples/.")
+    return paths, [Image.open(p).convert("RGB") for p in paths]
+
+
+def check_parity(paths, imgs):
+    """Compare batched results against learn.predict, one image at a time."""
+    from fastai.vision.all import PILImage
+
+    if app.learn is None:
+        print("  skipped: needs INFERENCE_BACKEND=torch")
+        return
+    batched = app._predict_batch_from_pil(imgs)
+    worst = 0.0
+    for path, img, (label, probs) in zip(paths, imgs, batched):
+        ref_label, _, ref = app.learn.predict(PILImage.create(np.array(img)))
+        ref_label = str(ref_label)
+        diff = max(abs(probs[k] - float(ref[i])) for i, k in enumerate(app.HAIR_LABELS))
+        worst = max(worst, diff)
+        status = "ok" if label == ref_label else "LABEL MISMATCH"
+        print(f"  {os.path.basename(path)}: {label} vs {ref_label} max|dp|={diff:.2e} {status}")
+    print(f"  worst probability difference: {worst:.2e}")
+
+
+async def run_level(imgs, concurrency, requests_per_client, max_batch_size, max_wait_ms):
+    executor = ThreadPoolExecutor(max_workers=1)
+    batcher = MicroBatcher(
+        app._predict_batch_from_pil,
+        max_batch_size=max_batch_size,
+        max_wait_ms=max_wait_ms,
+        executor=executor,
+    )
+    batcher.start()
+    latencies = []
+
+    async def client(offset):
+        for i in range(requests_per_client):
+            img = imgs[(offset + i) % len(imgs)]
+            t0 = time.perf_counter()
+            await batcher.submit(img)
+            latencies.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(client(c) for c in range(concurrency)))
+    elapsed = time.perf_counter() - t0
+
+    await batcher.stop()
+    executor.shutdown()
+
+    lat_ms = np.array(latencies) * 1000
+    return {
+        "p50": float(np.percentile(lat_ms, 50)),
+        "p99": float(np.percentile(lat_ms, 99)),
+        "ips": len(latencies) / elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", default="1,4,16,32")
+    parser.add_argument("--requests-per-client", type=int, default=10)
+    parser.add_argument("--max-batch-size", type=int, default=app.PREDICT_MAX_BATCH_SIZE)
+    parser.add_argument("--max-wait-ms", type=float, default=app.PREDICT_MAX_WAIT_MS)
+    args = parser.parse_args()
+    app.model.load()
+
+    paths, imgs = load_examples()
+    print("[Parity] batched vs learn.predict")
+    check_parity(paths, imgs)
+
+    levels = [int(c) for c in args.concurrency.split(",")]
+    modes = [
+        ("unbatched", 1, 0.0),
+        ("batched", args.max_batch_size, args.max_wait_ms),
+    ]
+
+    # Warm up allocator / kernel selection so the first level isn't penalised
+    app._predict_batch_from_pil(imgs[:1])
+
+    print(f"\n{'mode':<10} {'conc':>5} {'p50 ms':>9} {'p99 ms':>9} {'img/s':>8}")
+    for name, bs, wait in modes:
+        for level in levels:
+            r = asyncio.run(run_level(imgs, level, args.requests_per_client, bs, wait))
+            print(f"{name:<10} {level:>5} {r['p50']:>9.1f} {r['p99']:>9.1f} {r['ips']:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Cold start of the pickled Learner vs the pickle-free weights artifact.
+
+    python export_model.py --formats weights        # once
+    python benchmarks/bench_cold_start.py [--backends torch,weights] [--repeat 5]
+
+Each run is a fresh Python process that imports the serving code, builds
+the engine with create_engine() and classifies one image, as a server
+worker does at startup. Reported per backend (median over --repeat runs):
+  process   wall time of the whole child process, interpreter start included
+  load      create_engine() alone (imports + unpickle / rebuild + weights)
+  first     the first prediction after loading
+  rss       resident memory after the first prediction, and the peak
+  fastai    whether fastai / albumentations ended up imported
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def _rss_mb() -> float:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return float("nan")
+
+
+def child(backend, model_path, export_dir, image):
+    import resource
+
+    t0 = time.perf_counter()
+    from inference import create_engine
+    from PIL import Image
+
+    engine, _ = create_engine(backend, model_path=model_path, export_dir=export_dir)
+    t1 = time.perf_counter()
+    engine.predict(Image.open(image).convert("RGB"))
+    t2 = time.perf_counter()
+    print(json.dumps({
+        "load_s": t1 - t0,
+        "first_ms": (t2 - t1) * 1000,
+        "rss_mb": _rss_mb(),
+        "peak_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "fastai": "fastai" in sys.modules or "albumentations" in sys.modules,
+    }))
+
+
+def run(backend, args):
+    cmd = [sys.executable, os.path.abspath(__file__), "--child", backend,
+           "--model", args.model, "--export-dir", args.export_dir, "--image", args.image]
+    t0 = time.perf_counter()
+    out = subprocess.run(cmd, cwd=ROOT, capture_output=True, text=True)
+    wall = time.perf_counter() - t0
+    if out.returncode != 0:
+        raise RuntimeError(out.stderr.strip().splitlines()[-1] if out.stderr.strip() else "child failed")
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+    result["process_s"] = wall
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", default="torch,weights")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--model", default=os.path.join("models", "hair-resnet18-model.pkl"))
+    parser.add_argument("--export-dir", default=os.path.join("models", "export"))
+    parser.add_argument("--image", default=os.path.join("examples", "1.jpg"))
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.model, args.export_dir, args.image)
+        return
+
+    print(f"{'backend':<12} {'process s':>9} {'load s':>7} {'first ms':>9} {'rss MB':>7} {'peak MB':>8} {'fastai':>7}")
+    for backend in args.backends.split(","):
+        try:
+            runs = [run(backend, args) for _ in range(args.repeat)]
+        except RuntimeError as e:
+            print(f"{backend:<12} skipped: {e}")
+            continue
+        med = {k: statistics.median(r[k] for r in runs) for k in ("process_s", "load_s", "first_ms", "rss_mb", "peak_mb")}
+        print(f"{backend:<12} {med['process_s']:>9.2f} {med['load_s']:>7.2f} {med['first_ms']:>9.1f} "
+              f"{med['rss_mb']:>7.0f} {med['peak_mb']:>8.0f} {'yes' if runs[0]['fastai'] else 'no':>7}")
+
+
+if __name__ == "__main__":
+    main()
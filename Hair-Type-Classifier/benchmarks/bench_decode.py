@@ -0,0 +1,96 @@
+"""
+Decode time and peak memory for large phone photos: full decode vs JPEG draft.
+
+    python benchmarks/bench_decode.py [--sizes 4032x3024,4000x3000,3024x4032]
+
+For each size a synthetic phone-like JPEG is generated, then decoded and
+resized to the model input (224x224) the way /predict does it:
+  full   Image.open(...).convert("RGB") at native resolution (old path)
+  draft  PIL draft mode: libjpeg decodes straight at 1/2, 1/4 or 1/8 scale
+Peak memory is the growth of the process' max RSS while decoding, measured
+in a fresh subprocess per case so runs don't pollute each other.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import cv2  # noqa: E402
+import numpy as np  # noqa: E402
+from PIL import Image  # noqa: E402
+
+from uploads import decode_image  # noqa: E402
+
+TARGET = (224, 224)
+
+
+def make_photo(width, height, path):
+    """Smooth gradients + texture + noise, so the JPEG has realistic entropy."""
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    base = np.stack([
+        128 + 100 * np.sin(x / 180.0),
+        128 + 100 * np.cos(y / 240.0),
+        128 + 60 * np.sin((x + y) / 50.0),
+    ], axis=-1)
+    base += rng.normal(0, 12, base.shape)
+    Image.fromarray(np.clip(base, 0, 255).astype(np.uint8)).save(path, "JPEG", quality=92)
+
+
+def worker(path, mode, repeats):
+    with open(path, "rb") as f:
+        data = f.read()
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    times = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        img = decode_image(data, TARGET, draft=(mode == "draft"))
+        cv2.resize(np.asarray(img), (TARGET[1], TARGET[0]), interpolation=cv2.INTER_LINEAR)
+        times.append((time.perf_counter() - t0) * 1000)
+        decoded = img.size
+        del img
+    after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({
+        "median_ms": float(np.median(times)),
+        "peak_mb": (after - before) / 1024,  # ru_maxrss is in KB on Linux
+        "decoded": decoded,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="4032x3024,4000x3000,3024x4032")
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--worker", nargs=2, metavar=("PATH", "MODE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args.worker[0], args.worker[1], args.repeats)
+        return
+
+    print(f"{'photo':<11} {'file MB':>8} {'mode':<6} {'decoded':>11} {'median ms':>10} {'peak MB':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes.split(","):
+            w, h = (int(v) for v in size.split("x"))
+            path = os.path.join(tmp, f"{size}.jpg")
+            make_photo(w, h, path)
+            mb = os.path.getsize(path) / 2**20
+            for mode in ("full", "draft"):
+                out = subprocess.run(
+                    [sys.executable, __file__, "--worker", path, mode, "--repeats", str(args.repeats)],
+                    check=True, capture_output=True, text=True,
+                ).stdout
+                r = json.loads(out.strip().splitlines()[-1])
+                decoded = "x".join(str(v) for v in r["decoded"])
+                print(f"{size:<11} {mb:>8.1f} {mode:<6} {decoded:>11} {r['median_ms']:>10.1f} {r['peak_mb']:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Goal matching for the Gradio recommender: substring test vs the BM25 index.
+
+    python benchmarks/bench_goal_search.py [--sizes 7,10000,100000]
+
+For synthetic catalogs of each size, reports:
+  build     indexing the whole catalog once (text_search.BM25Index)
+  append    adding one provider product to the existing index
+  rerank    scoring the recommender's 32 candidates (what app(real).py does)
+  search    a full-catalog top-10 query
+  substring the old per-candidate `goal in (description + name).lower()`
+and how many of the candidates each approach matches for multi-word goals.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from text_search import BM25Index  # noqa: E402
+
+GOALS = ["reduce frizz and define curls", "scalp health", "more volume for fine hair", "shine"]
+PHRASES = [
+    "reduces frizz", "defines curls", "soothes a flaky scalp", "adds volume", "seals in moisture",
+    "boosts shine", "strengthens ends", "detangles knots", "protects from heat", "balances oily roots",
+    "softens coils", "enhances waves", "repairs breakage", "lightweight hold", "deep conditioning",
+]
+NOUNS = ["Cleanser", "Shampoo", "Conditioner", "Mask", "Oil", "Serum", "Cream", "Gel", "Mousse", "Spray"]
+ACTIVES = ["Shea Butter", "Argan Oil", "Castor Oil", "Glycerin", "Keratin", "Aloe Vera", "Tea Tree", "Biotin"]
+
+
+def make_catalog(n, seed=0):
+    rng = random.Random(seed)
+    return [
+        {
+            "name": f"{rng.choice(['Hydra', 'Silk', 'Velvet', 'Pure', 'Root'])}{i} {rng.choice(NOUNS)}",
+            "description": f"{rng.choice(PHRASES).capitalize()} and {rng.choice(PHRASES)}.",
+            "actives": rng.sample(ACTIVES, 2),
+        }
+        for i in range(n)
+    ]
+
+
+def time_us(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1e6)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="7,10000,100000")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'products':>9} | {'build ms':>9} {'append us':>9} | {'rerank us':>9} {'search us':>10} "
+          f"{'substr us':>9} | {'matched bm25/substr':>19}")
+    for n in [int(s) for s in args.sizes.split(",")]:
+        catalog = make_catalog(n)
+        index = BM25Index()
+        t0 = time.perf_counter()
+        for p in catalog:
+            index.add(p)
+        build_ms = (time.perf_counter() - t0) * 1000
+        append_us = time_us(lambda: index.add(catalog[0]), 1)
+
+        rng = random.Random(1)
+        candidates = sorted(rng.sample(range(n), min(32, n)))
+
+        def substring(goal):
+            return [goal.lower() in (catalog[i]["description"] + catalog[i]["name"]).lower() for i in candidates]
+
+        rerank = statistics.mean(time_us(lambda: index.score_docs(g, candidates), args.repeat) for g in GOALS)
+        search = statistics.mean(time_us(lambda: index.search(g, 10), max(5, args.repeat // 10)) for g in GOALS)
+        substr = statistics.mean(time_us(lambda: substring(g), args.repeat) for g in GOALS)
+        matched_bm25 = sum(s > 0 for g in GOALS for s in index.score_docs(g, candidates))
+        matched_substr = sum(m for g in GOALS for m in substring(g))
+        print(f"{n:>9} | {build_ms:>9.1f} {append_us:>9.1f} | {rerank:>9.1f} {search:>10.1f} "
+              f"{substr:>9.1f} | {matched_bm25:>9}/{matched_substr:<9}")
+
+
+if __name__ == "__main__":
+    main()
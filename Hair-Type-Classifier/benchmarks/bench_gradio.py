@@ -0,0 +1,162 @@
+"""
+Throughput of the Gradio "Analyze & Recommend" handler with 1 vs many
+concurrent sessions, per-click vs batched.
+
+    python benchmarks/bench_gradio.py [--sessions 1,20] [--clicks 5]
+
+Needs gradio installed (it imports app(real).py) and a model: the one
+configured by INFERENCE_BACKEND / MODEL_PATH / MODEL_EXPORT_DIR. The
+product catalog is a throwaway SQLite file.
+
+Gradio's queue is simulated in-process: a pool of `concurrency` workers,
+each taking up to `batch` waiting clicks at a time and calling the handler
+with them, like `.click(..., batch=True, max_batch_size=batch,
+concurrency_limit=concurrency)` does. Each session clicks --clicks times
+back to back with its own photo. Modes:
+
+  per-click       the old handler (engine.predict per click), Gradio's
+                  default concurrency_limit=1
+  per-click xN    the old handler with one worker thread per session
+  batched         analyze_and_recommend_batch with GRADIO_MAX_BATCH_SIZE /
+                  GRADIO_CONCURRENCY / GRADIO_MAX_WAIT_MS
+"""
+import argparse
+import asyncio
+import importlib.util
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPO = os.path.dirname(ROOT)
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+os.chdir(ROOT)
+
+import numpy as np  # noqa: E402
+
+from suite import jpeg_bytes, synthetic_image, synthetic_products  # noqa: E402
+
+
+def load_gradio_app():
+    if importlib.util.find_spec("gradio") is None:
+        raise SystemExit("gradio is not installed.")
+    spec = importlib.util.spec_from_file_location("gradio_app", os.path.join(REPO, "app(real).py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+async def simulate(handler, sessions, clicks, imgs, goals, batch, concurrency):
+    """Run `sessions` users clicking `clicks` times through a Gradio-like batching queue."""
+    queue: asyncio.Queue = asyncio.Queue()
+    latencies = []
+
+    async def worker():
+        while True:
+            pending = [await queue.get()]
+            while len(pending) < batch and not queue.empty():
+                pending.append(queue.get_nowait())
+            # Every session is signed in: check_analysis let all clicks through
+            summaries, _, _ = await handler(
+                [p[0] for p in pending], [p[1] for p in pending], [True] * len(pending)
+            )
+            for (_, _, fut), summary in zip(pending, summaries):
+                fut.set_result(summary)
+
+    async def session(i):
+        for _ in range(clicks):
+            fut = asyncio.get_running_loop().create_future()
+            t0 = time.perf_counter()
+            queue.put_nowait((imgs[i % len(imgs)], goals[i % len(goals)], fut))
+            summary = await fut
+            if not summary.startswith("### Predicted"):
+                raise RuntimeError(f"Unexpected answer: {summary[:80]}")
+            latencies.append(time.perf_counter() - t0)
+
+    workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+    t0 = time.perf_counter()
+    await asyncio.gather(*(session(i) for i in range(sessions)))
+    elapsed = time.perf_counter() - t0
+    for w in workers:
+        w.cancel()
+
+    lat_ms = np.array(latencies) * 1000
+    return {
+        "p50": float(np.percentile(lat_ms, 50)),
+        "p95": float(np.percentile(lat_ms, 95)),
+        "cps": len(latencies) / elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", default="1,20")
+    parser.add_argument("--clicks", type=int, default=5, help="clicks per session")
+    parser.add_argument("--products", type=int, default=200)
+    args = parser.parse_args()
+
+    db_dir = tempfile.mkdtemp(prefix="bench-gradio-")
+    os.environ["PRODUCT_DB_PATH"] = os.path.join(db_dir, "products.db")
+    os.environ.setdefault("MODEL_WARMUP_ROUNDS", "1")
+    try:
+        gapp = load_gradio_app()
+        gapp.product_store.add_many(gapp.PRODUCT_CATALOG_NAME, synthetic_products(args.products))
+        gapp.model._thread.join()
+        if not gapp.model.ready:
+            raise SystemExit(f"Model not ready: {gapp.model.error}")
+
+        from PIL import Image
+        from io import BytesIO
+
+        # What Gradio hands the handler: a decoded camera-sized photo
+        imgs = [Image.open(BytesIO(jpeg_bytes(synthetic_image(1280, 960, seed)))).convert("RGB")
+                for seed in range(8)]
+        goals = ["", "reduce frizz", "define curls", "scalp health"]
+
+        async def per_click(imgs_, goals_, allowed):
+            # The handler before batching: one engine.predict per click
+            def one(img, goal):
+                _, probs = gapp.engine.predict(img)
+                return gapp._present(probs.tolist(), goal)
+
+            outs = [await asyncio.to_thread(one, img, goal) for img, goal in zip(imgs_, goals_)]
+            return tuple(list(col) for col in zip(*outs))
+
+        async def batched(imgs_, goals_, allowed):
+            return await gapp.analyze_and_recommend_batch(imgs_, goals_, allowed)
+
+        print(f"backend: {gapp.INFERENCE_BACKEND}, batch {gapp.GRADIO_MAX_BATCH_SIZE}, "
+              f"concurrency {gapp.GRADIO_CONCURRENCY}, wait {gapp.GRADIO_MAX_WAIT_MS} ms, "
+              f"{args.products} products, {args.clicks} clicks/session")
+        print(f"\n{'mode':<14} {'sessions':>8} {'p50 ms':>9} {'p95 ms':>9} {'clicks/s':>9} {'avg batch':>10}")
+        for n in [int(s) for s in args.sessions.split(",")]:
+            modes = [
+                ("per-click", per_click, 1, 1),
+                (f"per-click x{n}", per_click, 1, n),
+                ("batched", batched, gapp.GRADIO_MAX_BATCH_SIZE, gapp.GRADIO_CONCURRENCY),
+            ]
+            for name, handler, batch, concurrency in modes:
+                if n == 1 and name.startswith("per-click x"):
+                    continue
+                batches, items = gapp.batcher.batches, gapp.batcher.items
+
+                async def level():
+                    try:
+                        return await simulate(handler, n, args.clicks, imgs, goals, batch, concurrency)
+                    finally:
+                        # The batcher lives on this run's event loop
+                        await gapp.batcher.stop()
+
+                r = asyncio.run(level())
+                nb = gapp.batcher.batches - batches
+                avg = f"{(gapp.batcher.items - items) / nb:.1f}" if nb else "1.0"
+                print(f"{name:<14} {n:>8} {r['p50']:>9.1f} {r['p95']:>9.1f} {r['cps']:>9.1f} {avg:>10}")
+    finally:
+        shutil.rmtree(db_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Parity and latency check: lean InferenceEngine vs fastai's learn.predict.
+
+    python benchmarks/bench_inference.py [--repeats 20] [--atol 1e-5]
+
+Every image in examples/*.jpg must get the same label and probabilities
+within --atol from both paths; the script exits non-zero otherwise, so it
+can gate a deploy. It then times both paths on single images and the
+engine on a full batch.
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import numpy as np  # noqa: E402
+from PIL import Image  # noqa: E402
+
+import app  # noqa: E402
+
+
+def fastai_predict(img):
+    from fastai.vision.all import PILImage
+
+    label, _, probs = app.learn.predict(PILImage.create(np.array(img)))
+    return str(label), probs.numpy()
+
+
+def check_parity(paths, imgs, atol):
+    ok = True
+    batch_probs = app.engine.predict_proba(imgs)
+    for path, img, batched in zip(paths, imgs, batch_probs):
+        ref_label, ref = fastai_predict(img)
+        label, single = app.engine.predict(img)
+        diff = float(max(np.abs(single - ref).max(), np.abs(batched - ref).max()))
+        good = label == ref_label and diff <= atol
+        ok &= good
+        print(f"  {os.path.basename(path)}: engine={label} fastai={ref_label} "
+              f"max|dp|={diff:.2e} {'ok' if good else 'FAIL'}")
+    return ok
+
+
+def timeit(fn, repeats):
+    fn()  # warmup
+    times = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t0) * 1000)
+    return float(np.median(times)), float(np.percentile(times, 99))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--atol", type=float, default=1e-5)
+    args = parser.parse_args()
+    app.model.load()
+
+    if app.learn is None:
+        raise SystemExit("Parity against learn.predict needs INFERENCE_BACKEND=torch.")
+
+    paths = sorted(glob.glob(os.path.join(ROOT, "examples", "*.jpg")))
+    imgs = [Image.open(p).convert("RGB") for p in paths]
+    if not imgs:
+        raise SystemExit("No example images found in examples/.")
+
+    print("[Parity] engine vs learn.predict")
+    ok = check_parity(paths, imgs, args.atol)
+
+    img = imgs[0]
+    rows = [
+        ("learn.predict (1 img)", timeit(lambda: fastai_predict(img), args.repeats), 1),
+        ("engine (1 img)", timeit(lambda: app.engine.predict(img), args.repeats), 1),
+        (f"engine ({len(imgs)} imgs)", timeit(lambda: app.engine.predict_proba(imgs), args.repeats), len(imgs)),
+    ]
+    print(f"\n{'path':<24} {'median ms':>10} {'p99 ms':>9} {'ms/img':>8}")
+    for name, (med, p99), n in rows:
+        print(f"{name:<24} {med:>10.2f} {p99:>9.2f} {med / n:>8.2f}")
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+Cost of the in-process metrics behind GET /metrics.
+
+    python benchmarks/bench_metrics.py [--requests 200] [--threads 4]
+
+Reports:
+  per op      ns per histogram observe / timer block / counter inc, single
+              threaded and with --threads threads hammering the same series
+  render      one /metrics scrape of the app's registry
+  /predict    recordings per request (counted while serving real requests
+              in-process), their estimated cost, and the measured request
+              latency with stage recording on vs off (requests alternate,
+              so drift hits both sides equally)
+
+The prediction cache is disabled so every request runs decode + forward.
+"""
+import argparse
+import glob
+import os
+import statistics
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+os.environ.setdefault("PREDICT_CACHE_ENTRIES", "0")
+
+import asyncio  # noqa: E402
+
+import httpx  # noqa: E402
+
+import metrics  # noqa: E402
+
+
+def per_op_ns(fn, n):
+    t0 = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - t0) / n * 1e9
+
+
+def contended_ns(fn, n, threads):
+    def work():
+        for _ in range(n):
+            fn()
+
+    pool = [threading.Thread(target=work) for _ in range(threads)]
+    t0 = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    return (time.perf_counter() - t0) / (n * threads) * 1e9
+
+
+def micro(args):
+    registry = metrics.Registry()
+    hist = registry.histogram("bench_seconds", "x", labelnames=("stage",))
+    counter = registry.counter("bench_errors", "x", labelnames=("reason",))
+    child = hist.labels("decode")
+    n = args.ops
+
+    def timed():
+        with child.time():
+            pass
+
+    def baseline():
+        pass
+
+    empty = per_op_ns(baseline, n)
+    rows = [
+        ("observe (cached child)", lambda: child.observe(0.003)),
+        ("observe via labels()", lambda: hist.labels("decode").observe(0.003)),
+        ("timer block", timed),
+        ("counter inc via labels()", lambda: counter.labels("invalid_image").inc()),
+        ("2x perf_counter", lambda: (time.perf_counter(), time.perf_counter())),
+    ]
+    print(f"{'op':<28} {'ns/op':>8} {f'ns/op x{args.threads} threads':>22}")
+    for name, fn in rows:
+        single = per_op_ns(fn, n) - empty
+        threaded = contended_ns(fn, n // args.threads, args.threads) - empty
+        print(f"{name:<28} {single:>8.0f} {threaded:>22.0f}")
+
+
+async def serve(args):
+    import app
+
+    if not app.model.load() or not app.model.warm_up():
+        raise SystemExit(f"Model not available: {app.model.error}")
+    paths = sorted(glob.glob(os.path.join(ROOT, "examples", "*.jpg")))
+    if not paths:
+        raise SystemExit("No example images found in examples/.")
+    uploads = [open(p, "rb").read() for p in paths]
+
+    app.batcher.start()
+    transport = httpx.ASGITransport(app=app.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def predict(i):
+            t0 = time.perf_counter()
+            r = await client.post("/predict", files={"file": ("x.jpg", uploads[i % len(uploads)], "image/jpeg")})
+            r.raise_for_status()
+            return time.perf_counter() - t0
+
+        for i in range(5):
+            await predict(i)
+
+        # Count recordings per request
+        calls = {"n": 0}
+        originals = (metrics._HistogramChild.observe, metrics._CounterChild.inc, metrics._CounterChild.dec)
+
+        def counting(original):
+            def wrapper(self, *a):
+                calls["n"] += 1
+                return original(self, *a)
+            return wrapper
+
+        metrics._HistogramChild.observe, metrics._CounterChild.inc, metrics._CounterChild.dec = map(counting, originals)
+        for i in range(20):
+            await predict(i)
+        metrics._HistogramChild.observe, metrics._CounterChild.inc, metrics._CounterChild.dec = originals
+        per_request = calls["n"] / 20
+
+        # Stage recording on vs off, alternating
+        observe_stage = app._observe_stage
+        on, off = [], []
+        for i in range(args.requests):
+            enabled = i % 2 == 0
+            app._observe_stage = observe_stage if enabled else (lambda stage, seconds: None)
+            app.engine.on_stage = app._observe_stage if enabled else None
+            (on if enabled else off).append(await predict(i))
+        app._observe_stage = observe_stage
+        app.engine.on_stage = observe_stage
+
+        t0 = time.perf_counter()
+        for _ in range(50):
+            body = (await client.get("/metrics")).text
+        scrape_ms = (time.perf_counter() - t0) / 50 * 1000
+    await app.batcher.stop()
+
+    child = metrics.Histogram("x", "x").labels()
+    op_ns = per_op_ns(lambda: child.observe(0.003), 200_000)
+    estimate_us = per_request * (op_ns + 100) / 1000  # + the perf_counter pair around each stage
+    p50_on, p50_off = statistics.median(on) * 1000, statistics.median(off) * 1000
+    print(f"\nrender: {len(body.splitlines())} lines, {len(body) / 1024:.1f} KiB, "
+          f"{scrape_ms:.2f} ms per GET /metrics")
+    print(f"/predict: {per_request:.0f} recordings per request, ~{estimate_us:.1f} us estimated "
+          f"({estimate_us / 10 / p50_on:.3f}% of the p50)")
+    print(f"/predict p50 with stage recording {p50_on:.2f} ms, without {p50_off:.2f} ms "
+          f"(difference {p50_on - p50_off:+.2f} ms; within run-to-run noise unless it dwarfs the estimate)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ops", type=int, default=400_000)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--skip-app", action="store_true", help="only the per-op numbers (no model needed)")
+    args = parser.parse_args()
+
+    micro(args)
+    if not args.skip_app:
+        asyncio.run(serve(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""
+Per-worker memory and aggregate throughput of the API for several worker counts.
+
+    python benchmarks/bench_prefork.py --workers 1,2,4,8 --duration 20
+
+For each worker count the server is started twice:
+  prefork  - serve_prefork.py (model loaded once, weights shared)
+  uvicorn  - `uvicorn app:app --workers N` (every worker loads its own model)
+and hammered with concurrent /predict uploads of examples/*.jpg.
+
+RSS counts shared pages in every process that maps them; PSS divides
+shared pages between the processes sharing them, so the PSS sum is the
+real memory footprint of the whole server.
+"""
+import argparse
+import glob
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _children(pid):
+    kids = []
+    try:
+        for tid in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{tid}/children") as f:
+                kids += [int(c) for c in f.read().split()]
+    except FileNotFoundError:
+        pass
+    return kids
+
+
+def _descendants(pid):
+    out = []
+    for child in _children(pid):
+        out.append(child)
+        out += _descendants(child)
+    return out
+
+
+def _cmdline(pid):
+    try:
+        with open(f"/proc/{pid}/cmdline", "rb") as f:
+            return f.read().replace(b"\0", b" ").decode(errors="replace")
+    except FileNotFoundError:
+        return ""
+
+
+def _memory_mb(pid):
+    """(RSS, PSS) in MB from /proc/<pid>/smaps_rollup."""
+    rss = pss = 0
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                if line.startswith("Rss:"):
+                    rss = int(line.split()[1])
+                elif line.startswith("Pss:"):
+                    pss = int(line.split()[1])
+    except FileNotFoundError:
+        pass
+    return rss / 1024, pss / 1024
+
+
+def _wait_ready(url, proc, timeout=300):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError("Server exited during startup.")
+        try:
+            if requests.get(url, timeout=1).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError("Server did not become ready in time.")
+
+
+def _load(url, images, concurrency, duration):
+    done = [0]
+    errors = [0]
+    lock = threading.Lock()
+    stop = time.time() + duration
+
+    def client(offset):
+        session = requests.Session()
+        i = offset
+        while time.time() < stop:
+            name, data = images[i % len(images)]
+            i += 1
+            try:
+                r = session.post(url, files={"file": (name, data, "image/jpeg")}, timeout=60)
+                ok = r.status_code == 200 and "hair_type" in r.json()
+            except requests.RequestException:
+                ok = False
+            with lock:
+                if ok:
+                    done[0] += 1
+                else:
+                    errors[0] += 1
+
+    threads = [threading.Thread(target=client, args=(c,)) for c in range(concurrency)]
+    t0 = time.time()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return done[0] / (time.time() - t0), errors[0]
+
+
+def run(mode, workers, port, images, args):
+    if mode == "prefork":
+        cmd = [sys.executable, "serve_prefork.py", "--workers", str(workers),
+               "--port", str(port), "--log-level", "warning"]
+    else:
+        cmd = [sys.executable, "-m", "uvicorn", "app:app", "--workers", str(workers),
+               "--port", str(port), "--log-level", "warning"]
+    proc = subprocess.Popen(cmd, cwd=ROOT, start_new_session=True)
+    base = f"http://127.0.0.1:{port}"
+    try:
+        _wait_ready(base + "/readyz", proc)
+        # Give every worker a chance to come up and serve a request
+        time.sleep(2)
+        _load(base + "/predict", images, workers, 2)
+        ips, errors = _load(base + "/predict", images, args.concurrency_per_worker * workers, args.duration)
+
+        pids = [p for p in _descendants(proc.pid) if "resource_tracker" not in _cmdline(p)]
+        mem = [_memory_mb(p) for p in pids]
+        parent = _memory_mb(proc.pid)
+        return {
+            "rss": sum(m[0] for m in mem) / max(1, len(mem)),
+            "pss": sum(m[1] for m in mem) / max(1, len(mem)),
+            "total_pss": sum(m[1] for m in mem) + parent[1],
+            "ips": ips,
+            "errors": errors,
+        }
+    finally:
+        os.killpg(proc.pid, signal.SIGTERM)
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            os.killpg(proc.pid, signal.SIGKILL)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", default="1,2,4,8")
+    parser.add_argument("--modes", default="prefork,uvicorn")
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--concurrency-per-worker", type=int, default=4)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    images = [(os.path.basename(p), open(p, "rb").read())
+              for p in sorted(glob.glob(os.path.join(ROOT, "examples", "*.jpg")))]
+    if not images:
+        raise SystemExit("No example images found in examples/.")
+
+    print(f"{'mode':<8} {'workers':>7} {'RSS/worker MB':>14} {'PSS/worker MB':>14} "
+          f"{'total PSS MB':>13} {'img/s':>8} {'errors':>7}")
+    for mode in args.modes.split(","):
+        for n in [int(w) for w in args.workers.split(",")]:
+            r = run(mode, n, args.port, images, args)
+            print(f"{mode:<8} {n:>7} {r['rss']:>14.0f} {r['pss']:>14.0f} "
+                  f"{r['total_pss']:>13.0f} {r['ips']:>8.1f} {r['errors']:>7}")
+
+
+if __name__ == "__main__":
+    main()
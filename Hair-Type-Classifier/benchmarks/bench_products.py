@@ -0,0 +1,148 @@
+"""
+Recommendation latency vs catalog size: list scan vs the product store snapshot.
+
+    python benchmarks/bench_products.py [--sizes 7,1000,10000,100000]
+
+For each size a synthetic catalog is written to a temporary product store,
+then both recommenders are timed the old way (linear scan over the Python
+list on every request) and the new way (index lookups on the in-memory
+snapshot, as app.py and app(real).py do now):
+  api     FastAPI recommend_products: best label, top 4
+  gradio  Gradio recommend_products: hair type or "All", top 8 by score_boost
+Also reports the one-off cost of inserting the catalog and building the
+snapshot, and what one provider addition costs afterwards: the SQLite
+insert ("add ms") and the next snapshot, which extends the previous one
+instead of re-reading the catalog ("refresh us").
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from product_store import ProductStore  # noqa: E402
+
+HAIR_TYPES = ["Straight", "Wavy", "Curly", "Coily", "Kinky"]
+ACTIVES = ["Shea Butter", "Marula Oil", "Castor Oil", "Glycerin", "Argan Oil", "Jojoba Oil", "Keratin"]
+BRANDS = [f"Brand {i}" for i in range(50)]
+
+
+def make_catalog(n, seed=0):
+    rng = random.Random(seed)
+    return [
+        {
+            "name": f"Product {i}",
+            "brand": rng.choice(BRANDS),
+            "hair_types": rng.sample(HAIR_TYPES, rng.randint(1, 3)) if rng.random() > 0.05 else ["All"],
+            "description": "Synthetic product for benchmarking.",
+            "actives": rng.sample(ACTIVES, rng.randint(1, 2)),
+            "score_boost": round(rng.uniform(0.1, 0.25), 2),
+        }
+        for i in range(n)
+    ]
+
+
+# ---------- old implementations (list scan per request) ----------
+
+def api_scan(catalog, hair_probs, top_k=4):
+    best_label = max(hair_probs, key=hair_probs.get)
+    best_prob = hair_probs[best_label]
+    recs = []
+    for p in catalog:
+        targets = [t.lower() for t in p["hair_types"]]
+        score = best_prob * 100 if best_label.lower() in targets else best_prob * 45
+        recs.append({**p, "match_score": round(float(score), 1), "for_label": best_label})
+    recs.sort(key=lambda x: x["match_score"], reverse=True)
+    return recs[:top_k]
+
+
+def gradio_scan(catalog, label):
+    relevant = [p for p in catalog if label in p["hair_types"] or "All" in p["hair_types"]] or catalog[:]
+    random.shuffle(relevant)
+    relevant.sort(key=lambda p: p.get("score_boost", 0.0), reverse=True)
+    return relevant[:8]
+
+
+# ---------- new implementations (snapshot indexes) ----------
+
+def api_snapshot(store, hair_probs, top_k=4):
+    best_label = max(hair_probs, key=hair_probs.get)
+    best_prob = hair_probs[best_label]
+    snapshot = store.snapshot("bench")
+    strong = snapshot.matching(best_label)[:top_k]
+    ranked = [(i, best_prob * 100) for i in strong]
+    if len(ranked) < top_k:
+        strong_set = set(strong)
+        for i in range(len(snapshot)):
+            if i not in strong_set:
+                ranked.append((i, best_prob * 45))
+                if len(ranked) == top_k:
+                    break
+    return [{**snapshot.products[i], "match_score": round(float(s), 1), "for_label": best_label} for i, s in ranked]
+
+
+def gradio_snapshot(store, label):
+    snapshot = store.snapshot("bench")
+    return [snapshot.products[i] for i in snapshot.top_by_boost([label, "All"], 8)]
+
+
+def time_us(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1e6)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="7,1000,10000,100000")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    probs = {"Curly": 0.62, "Wavy": 0.2, "Straight": 0.1, "Kinky": 0.05, "Dreadlocks": 0.03}
+    print(f"{'products':>9} | {'insert s':>8} {'snapshot ms':>11} {'add ms':>7} {'refresh us':>10} | "
+          f"{'api scan us':>11} {'api store us':>12} | {'gradio scan us':>14} {'gradio store us':>15}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in [int(s) for s in args.sizes.split(",")]:
+            catalog = make_catalog(n)
+            store = ProductStore(os.path.join(tmp, f"products-{n}.db"), refresh_interval_s=1.0)
+            t0 = time.perf_counter()
+            store.add_many("bench", catalog)
+            insert_s = time.perf_counter() - t0
+            t0 = time.perf_counter()
+            store.snapshot("bench")
+            snapshot_ms = (time.perf_counter() - t0) * 1000
+            extra = make_catalog(5, seed=1)
+            add_s = refresh_s = 0.0
+            for p in extra:
+                t0 = time.perf_counter()
+                store.add("bench", p)
+                t1 = time.perf_counter()
+                store.snapshot("bench")
+                add_s += t1 - t0
+                refresh_s += time.perf_counter() - t1
+            add_ms = add_s * 1000 / len(extra)
+            refresh_us = refresh_s * 1e6 / len(extra)
+
+            # Fewer repeats for the slow scans on big catalogs
+            scan_repeat = max(5, min(args.repeat, 2_000_000 // max(n, 1)))
+            row = (
+                time_us(lambda: api_scan(catalog, probs), scan_repeat),
+                time_us(lambda: api_snapshot(store, probs), args.repeat),
+                time_us(lambda: gradio_scan(catalog, "Curly"), scan_repeat),
+                time_us(lambda: gradio_snapshot(store, "Curly"), args.repeat),
+            )
+            print(f"{n:>9} | {insert_s:>8.2f} {snapshot_ms:>11.1f} {add_ms:>7.2f} {refresh_us:>10.0f} | "
+                  f"{row[0]:>11.1f} {row[1]:>12.1f} | {row[2]:>14.1f} {row[3]:>15.1f}")
+            store.close()
+
+
+if __name__ == "__main__":
+    main()
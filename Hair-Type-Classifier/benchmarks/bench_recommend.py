@@ -0,0 +1,99 @@
+"""
+API recommender scoring: per-product Python loop vs the NumPy affinity matrix.
+
+    python benchmarks/bench_recommend.py [--sizes 10,10000,1000000]
+
+  loop    the original recommend_products: lowercase every product's
+          hair_types, score the best label only, sort the whole list
+  matrix  recommender.AffinityIndex: one products x labels mat-vec over the
+          full probability vector, top 4 by argpartition
+Also times building the matrix from scratch and appending one product,
+which is what a catalog change costs.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np  # noqa: E402
+
+from product_store import CatalogSnapshot  # noqa: E402
+from recommender import AffinityIndex  # noqa: E402
+
+LABELS = ["Curly", "Dreadlocks", "Kinky", "Straight", "Wavy"]
+HAIR_TYPES = ["straight", "wavy", "curly", "coily", "kinky"]
+
+
+def make_catalog(n, seed=0):
+    rng = random.Random(seed)
+    return [
+        {"id": i + 1, "name": f"Product {i}", "hair_types": rng.sample(HAIR_TYPES, rng.randint(1, 3))}
+        for i in range(n)
+    ]
+
+
+def loop_recommend(catalog, hair_probs, top_k=4):
+    best_label = max(hair_probs, key=hair_probs.get)
+    best_prob = hair_probs[best_label]
+    recs = []
+    for p in catalog:
+        targets = [t.lower() for t in p["hair_types"]]
+        score = best_prob * 100 if best_label.lower() in targets else best_prob * 45
+        recs.append({**p, "match_score": round(float(score), 1), "for_label": best_label})
+    recs.sort(key=lambda x: x["match_score"], reverse=True)
+    return recs[:top_k]
+
+
+def matrix_recommend(index, snapshot, hair_probs, top_k=4):
+    best_label = max(hair_probs, key=hair_probs.get)
+    probs = np.fromiter((hair_probs.get(label, 0.0) for label in LABELS), dtype=np.float32)
+    top, scores = index.top_k(probs, top_k, snapshot)
+    return [{**snapshot.products[i], "match_score": round(float(s), 1), "for_label": best_label}
+            for i, s in zip(top, scores)]
+
+
+def time_ms(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10,10000,1000000")
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    probs = {"Curly": 0.55, "Wavy": 0.40, "Straight": 0.03, "Kinky": 0.01, "Dreadlocks": 0.01}
+    print(f"{'products':>9} | {'loop ms':>9} {'matrix ms':>9} {'speedup':>8} | {'build ms':>9} {'append ms':>9}")
+    for n in [int(s) for s in args.sizes.split(",")]:
+        catalog = make_catalog(n)
+        snapshot = CatalogSnapshot("bench", 1, catalog)
+
+        index = AffinityIndex(LABELS)
+        t0 = time.perf_counter()
+        index.sync(snapshot)
+        build_ms = (time.perf_counter() - t0) * 1000
+
+        grown = snapshot.appended(2, [{"id": n + 1, "name": "New", "hair_types": ["wavy"]}])
+        t0 = time.perf_counter()
+        index.sync(grown)
+        append_ms = (time.perf_counter() - t0) * 1000
+        assert len(index) == n + 1 and index.rebuilds == 1
+
+        loop_repeat = max(3, min(args.repeat, 1_000_000 // n))
+        loop = time_ms(lambda: loop_recommend(catalog, probs), loop_repeat)
+        matrix = time_ms(lambda: matrix_recommend(index, grown, probs), args.repeat)
+        print(f"{n:>9} | {loop:>9.3f} {matrix:>9.3f} {loop / matrix:>7.0f}x | {build_ms:>9.1f} {append_ms:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
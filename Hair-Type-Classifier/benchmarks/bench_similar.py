@@ -0,0 +1,115 @@
+"""
+Similar-profile search over the embedding store: exact vs IVF.
+
+    python benchmarks/bench_similar.py [--rows 1000000] [--dim 512] [--dtype float16]
+
+Fills a temporary embedding_store.EmbeddingStore with synthetic clustered
+embeddings (real photos of one hair type sit close together, so uniform
+noise would understate what IVF can do), then reports:
+  build    appending all rows (vectors + metadata sidecar)
+  train    IVF k-means + bucketing every row (once, in the background in app.py)
+  exact    brute-force cosine over the memmap, p50 / p95 per query
+  ivf      IVF search at each --nprobe, p50 / p95 and recall@k against exact
+  lookup   row + metadata for one image id (what /similar adds on top)
+Pass --dir to keep (and reuse) the store instead of a temporary one.
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np  # noqa: E402
+
+from embedding_store import EmbeddingStore, ExactIndex, IVFIndex  # noqa: E402
+
+LABELS = ["Curly", "Dreadlocks", "Kinky", "Straight", "Wavy"]
+
+
+def fill(store, rows, dim, clusters, chunk=50000, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    for start in range(len(store), rows, chunk):
+        n = min(chunk, rows - start)
+        which = rng.integers(0, clusters, n)
+        vectors = centers[which] + rng.normal(size=(n, dim)).astype(np.float32)
+        store.add_many([
+            (f"img{start + i:08d}", vectors[i], {"hair_type": LABELS[which[i] % len(LABELS)], "products": []})
+            for i in range(n)
+        ])
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return statistics.median(samples), samples[int(0.95 * (len(samples) - 1))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--dim", type=int, default=512, help="ResNet18 head features are 512-d")
+    parser.add_argument("--dtype", default="float16", choices=["float16", "float32"])
+    parser.add_argument("--clusters", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nprobe", default="4,16,64")
+    parser.add_argument("--dir", help="store directory to keep / reuse (default: a temporary one)")
+    args = parser.parse_args()
+
+    directory = args.dir or tempfile.mkdtemp(prefix="embeddings-")
+    try:
+        store = EmbeddingStore(directory, args.dim, dtype=args.dtype)
+        t0 = time.perf_counter()
+        fill(store, args.rows, args.dim, args.clusters)
+        build_s = time.perf_counter() - t0
+        print(f"rows: {len(store)} x {args.dim} {args.dtype} "
+              f"({store.stats()['bytes'] / 2**20:.0f} MiB of vectors), build {build_s:.1f} s")
+
+        rng = np.random.default_rng(1)
+        query_rows = rng.choice(len(store), size=args.queries, replace=False)
+
+        exact = ExactIndex(store)
+        truth, samples = [], []
+        for row in query_rows:
+            t0 = time.perf_counter()
+            hits = exact.search(store.vector(row), args.k, exclude=int(row))
+            samples.append((time.perf_counter() - t0) * 1000)
+            truth.append({r for r, _ in hits})
+        p50, p95 = percentiles(samples)
+        print(f"{'exact':>12}: p50 {p50:8.2f} ms  p95 {p95:8.2f} ms  recall@{args.k} 1.000")
+
+        ivf = IVFIndex(store, background=False)
+        t0 = time.perf_counter()
+        ivf.sync()
+        print(f"{'ivf train':>12}: {time.perf_counter() - t0:.1f} s ({ivf.stats()['nlist']} lists)")
+        for nprobe in [int(s) for s in args.nprobe.split(",")]:
+            ivf.nprobe = nprobe
+            samples, found = [], 0
+            for row, expected in zip(query_rows, truth):
+                t0 = time.perf_counter()
+                hits = ivf.search(store.vector(row), args.k, exclude=int(row))
+                samples.append((time.perf_counter() - t0) * 1000)
+                found += len(expected & {r for r, _ in hits})
+            p50, p95 = percentiles(samples)
+            recall = found / max(1, sum(len(t) for t in truth))
+            print(f"{f'ivf nprobe={nprobe}':>12}: p50 {p50:8.2f} ms  p95 {p95:8.2f} ms  recall@{args.k} {recall:.3f}")
+
+        image_id = store.meta(int(query_rows[0]))["image_id"]
+        samples = []
+        for _ in range(1000):
+            t0 = time.perf_counter()
+            store.meta(store.row(image_id))
+            samples.append((time.perf_counter() - t0) * 1e6)
+        print(f"{'lookup':>12}: p50 {statistics.median(samples):8.1f} us")
+    finally:
+        if not args.dir:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""
+Local stand-in for OpenWeatherMap's current-weather API.
+
+Answers `GET /data/2.5/weather?q=<city>,<country>` with a fixed-shape
+payload and counts the calls and TCP connections it receives, so the API
+can be exercised without network access or an API key:
+
+    python benchmarks/fake_weather_server.py --port 8010 --delay-ms 200 --error-rate 0.1
+    WEATHER_API_URL=http://127.0.0.1:8010/data/2.5/weather WEATHER_API_KEY=dummy python app.py
+
+Faults can be injected: every call waits `--delay-ms` (plus up to
+`--jitter-ms`), and a share `--error-rate` of calls answers
+`--error-status` instead. `POST /config` with a JSON body such as
+`{"delay_ms": 3000, "error_rate": 1.0}` changes them at runtime.
+`GET /stats` returns the counters; `POST /reset` clears them.
+Scripts can also run it in-process with `start_fake_weather_server()`.
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Tuple
+from urllib.parse import parse_qs, urlparse
+
+
+class FakeWeatherServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], delay_s: float = 0.0, jitter_s: float = 0.0,
+                 error_rate: float = 0.0, error_status: int = 503):
+        super().__init__(address, _Handler)
+        self.delay_s = delay_s
+        self.jitter_s = jitter_s
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.lock = threading.Lock()
+        self.calls: Dict[str, int] = {}
+        self.connections = 0
+        self.errors = 0
+
+    def handle_error(self, request, client_address):
+        # Clients giving up on slow answers (timeouts) are expected here
+        if not isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            super().handle_error(request, client_address)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/data/2.5/weather"
+
+    @property
+    def total_calls(self) -> int:
+        with self.lock:
+            return sum(self.calls.values())
+
+    def reset(self) -> None:
+        with self.lock:
+            self.calls.clear()
+            self.connections = 0
+            self.errors = 0
+
+    def configure(self, delay_ms=None, jitter_ms=None, error_rate=None, error_status=None) -> None:
+        if delay_ms is not None:
+            self.delay_s = float(delay_ms) / 1000
+        if jitter_ms is not None:
+            self.jitter_s = float(jitter_ms) / 1000
+        if error_rate is not None:
+            self.error_rate = float(error_rate)
+        if error_status is not None:
+            self.error_status = int(error_status)
+
+    def stats(self) -> Dict:
+        with self.lock:
+            return {
+                "calls": dict(self.calls),
+                "total_calls": sum(self.calls.values()),
+                "connections": self.connections,
+                "errors": self.errors,
+                "delay_ms": self.delay_s * 1000,
+                "jitter_ms": self.jitter_s * 1000,
+                "error_rate": self.error_rate,
+                "error_status": self.error_status,
+            }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: FakeWeatherServer
+    # Keep-alive, so clients that pool connections can reuse them; without
+    # TCP_NODELAY the split header/body writes hit delayed-ACK stalls
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, body) -> None:
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        if parsed.path == "/stats":
+            self._send_json(200, self.server.stats())
+            return
+        if parsed.path != "/data/2.5/weather":
+            self._send_json(404, {"cod": "404", "message": "not found"})
+            return
+
+        q = parse_qs(parsed.query).get("q", [""])[0]
+        city = q.split(",")[0] or "Johannesburg"
+        with self.server.lock:
+            self.server.calls[q] = self.server.calls.get(q, 0) + 1
+        delay = self.server.delay_s + random.uniform(0, self.server.jitter_s)
+        if delay:
+            time.sleep(delay)
+        if self.server.error_rate and random.random() < self.server.error_rate:
+            with self.server.lock:
+                self.server.errors += 1
+            self._send_json(self.server.error_status, {"cod": str(self.server.error_status), "message": "injected error"})
+            return
+
+        self._send_json(200, {
+            "name": city,
+            "main": {"temp": 21.5, "feels_like": 20.9, "humidity": 43},
+            "weather": [{"main": "Clear", "description": "clear sky", "icon": "01d"}],
+        })
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        if path == "/reset":
+            self.server.reset()
+            self._send_json(200, {"ok": True})
+        elif path == "/config":
+            try:
+                self.server.configure(**json.loads(body or b"{}"))
+            except (TypeError, ValueError) as e:
+                self._send_json(400, {"error": str(e)})
+                return
+            self._send_json(200, self.server.stats())
+        else:
+            self._send_json(404, {"cod": "404", "message": "not found"})
+
+
+def start_fake_weather_server(host: str = "127.0.0.1", port: int = 0, **kwargs) -> FakeWeatherServer:
+    """Start the server on a background thread (port 0 picks a free port)."""
+    server = FakeWeatherServer((host, port), **kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8010)
+    parser.add_argument("--delay-ms", type=float, default=0.0, help="latency added to every weather call")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="extra random latency, up to this much")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of calls that fail (0-1)")
+    parser.add_argument("--error-status", type=int, default=503)
+    args = parser.parse_args()
+
+    server = FakeWeatherServer(
+        (args.host, args.port),
+        delay_s=args.delay_ms / 1000,
+        jitter_s=args.jitter_ms / 1000,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+    )
+    print(f"[Info] Fake weather API on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
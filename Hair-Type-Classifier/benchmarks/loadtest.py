@@ -0,0 +1,435 @@
+"""
+End-to-end load and soak harness for the FastAPI service.
+
+    python benchmarks/loadtest.py sweep --concurrency 1,2,4,8,16,32 --duration 20
+    python benchmarks/loadtest.py soak --concurrency 8 --duration 1800 --rss-interval 10
+    python benchmarks/loadtest.py sweep --url https://staging.example.com   # an already running server
+
+Unless --url is given, starts the API (uvicorn app:app, or --server-cmd) on
+--port with benchmarks/fake_weather_server.py as its weather upstream
+(--weather-delay-ms, --weather-error-rate), waits for /readyz, and then
+drives it with --concurrency closed-loop asyncio clients (each sends its
+next request as soon as the previous one is answered).
+
+Traffic:
+  --mix          request mix, e.g. predict=0.7,weather=0.2,health=0.1
+                 (also: analyze); weather picks one of a few dozen cities
+  --image-sizes  upload size distribution, e.g. 640x480:0.5,1920x1080:0.3,4032x3024:0.2
+                 (synthetic JPEGs, generated once)
+  --repeat-rate  share of uploads that re-send an earlier photo byte for
+                 byte; the rest get a random trailer so they miss the
+                 prediction cache and pay for decode + inference
+
+sweep  one step per --concurrency level: throughput, p50 / p95 / p99 per
+       route, error rate and shed (503) rate, then the saturation point,
+       i.e. the level past which throughput stops growing but latency
+       keeps climbing
+soak   one level for --duration seconds, reported per --window; samples
+       the server's RSS (process tree) every --rss-interval and reports
+       growth and the trend over the second half, where a leak shows up
+       as a steady slope after the allocator has warmed up
+
+--out saves everything as JSON.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import httpx  # noqa: E402
+
+from fake_weather_server import start_fake_weather_server  # noqa: E402
+from suite import jpeg_bytes, synthetic_image  # noqa: E402
+
+CITIES = [
+    ("Johannesburg", "ZA"), ("Cape Town", "ZA"), ("Durban", "ZA"), ("Pretoria", "ZA"), ("Gqeberha", "ZA"),
+    ("Bloemfontein", "ZA"), ("East London", "ZA"), ("Polokwane", "ZA"), ("Mbombela", "ZA"), ("Kimberley", "ZA"),
+    ("Pietermaritzburg", "ZA"), ("Rustenburg", "ZA"), ("George", "ZA"), ("Soweto", "ZA"), ("Stellenbosch", "ZA"),
+    ("Nairobi", "KE"), ("Lagos", "NG"), ("Accra", "GH"), ("Cairo", "EG"), ("London", "GB"),
+    ("New York", "US"), ("Atlanta", "US"), ("Toronto", "CA"), ("Kingston", "JM"), ("Sao Paulo", "BR"),
+]
+ROUTES = ("predict", "analyze", "weather", "health")
+
+
+def parse_weights(spec: str) -> List[Tuple[str, float]]:
+    out = []
+    for part in spec.split(","):
+        name, _, weight = part.partition("=") if "=" in part else part.partition(":")
+        out.append((name.strip(), float(weight or 1)))
+    return out
+
+
+def percentile(sorted_ms: List[float], q: float) -> float:
+    if not sorted_ms:
+        return float("nan")
+    return sorted_ms[min(len(sorted_ms) - 1, int(q * len(sorted_ms)))]
+
+
+# ---------------------------------------------------------------------------
+# Server process and its memory
+# ---------------------------------------------------------------------------
+
+def _children(pid: int) -> List[int]:
+    kids = []
+    try:
+        for tid in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{tid}/children") as f:
+                kids += [int(c) for c in f.read().split()]
+    except OSError:
+        pass
+    return kids
+
+
+def tree_rss_mb(pid: int) -> float:
+    """Resident memory of a process and all its descendants (Linux /proc)."""
+    total, todo = 0, [pid]
+    while todo:
+        p = todo.pop()
+        try:
+            with open(f"/proc/{p}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1])
+                        break
+        except OSError:
+            continue
+        todo += _children(p)
+    return total / 1024
+
+
+async def wait_ready(client: httpx.AsyncClient, proc: Optional[subprocess.Popen], timeout: float = 300) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc is not None and proc.poll() is not None:
+            raise RuntimeError("Server exited during startup.")
+        try:
+            if (await client.get("/readyz", timeout=2)).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.5)
+    raise RuntimeError("Server did not become ready in time.")
+
+
+# ---------------------------------------------------------------------------
+# Load generation
+# ---------------------------------------------------------------------------
+
+class Traffic:
+    def __init__(self, mix: List[Tuple[str, float]], images: List[Tuple[bytes, float]], repeat_rate: float, seed: int):
+        for name, _ in mix:
+            if name not in ROUTES:
+                raise SystemExit(f"Unknown route {name!r} in --mix; expected {ROUTES}.")
+        self.routes = [name for name, _ in mix]
+        self.route_weights = [w for _, w in mix]
+        self.images = [data for data, _ in images]
+        self.image_weights = [w for _, w in images]
+        self.repeat_rate = repeat_rate
+        self.rng = random.Random(seed)
+
+    def route(self) -> str:
+        return self.rng.choices(self.routes, self.route_weights)[0]
+
+    def upload(self) -> bytes:
+        data = self.rng.choices(self.images, self.image_weights)[0]
+        if self.rng.random() < self.repeat_rate:
+            return data
+        # Bytes after the JPEG end marker are ignored by decoders but change the cache key
+        return data + os.urandom(16)
+
+    def city(self) -> Dict[str, str]:
+        city, country = self.rng.choice(CITIES)
+        return {"city": city, "country": country}
+
+
+def _is_ok(outcome: str) -> bool:
+    # "200-error" is a 200 whose body reports a failure
+    return outcome.isdigit() and outcome.startswith("2")
+
+
+class Recorder:
+    def __init__(self):
+        self.samples: List[Tuple[float, str, float, str]] = []  # (finished at, route, ms, outcome)
+
+    def add(self, route: str, ms: float, outcome: str) -> None:
+        self.samples.append((time.perf_counter(), route, ms, outcome))
+
+    def summary(self, start: float, end: float) -> Dict[str, Any]:
+        window = [s for s in self.samples if start <= s[0] < end]
+        elapsed = max(1e-9, end - start)
+        out: Dict[str, Any] = {"requests": len(window), "throughput_rps": round(len(window) / elapsed, 2)}
+        by_route: Dict[str, List[Tuple[float, str]]] = defaultdict(list)
+        for _, route, ms, outcome in window:
+            by_route[route].append((ms, outcome))
+        routes = {}
+        for route, items in [("all", [(ms, o) for _, _, ms, o in window])] + sorted(by_route.items()):
+            ok = sorted(ms for ms, o in items if _is_ok(o))
+            outcomes = defaultdict(int)
+            for _, o in items:
+                outcomes[o] += 1
+            errors = sum(n for o, n in outcomes.items() if not _is_ok(o) and o != "503")
+            routes[route] = {
+                "requests": len(items),
+                "p50_ms": round(percentile(ok, 0.50), 2),
+                "p95_ms": round(percentile(ok, 0.95), 2),
+                "p99_ms": round(percentile(ok, 0.99), 2),
+                "error_rate": round(errors / len(items), 4) if items else 0.0,
+                "shed_rate": round(outcomes.get("503", 0) / len(items), 4) if items else 0.0,
+                "outcomes": dict(outcomes),
+            }
+        out["routes"] = routes
+        return out
+
+
+async def one_request(client: httpx.AsyncClient, traffic: Traffic, timeout: float) -> Tuple[str, str]:
+    route = traffic.route()
+    try:
+        if route == "predict":
+            r = await client.post("/predict", files={"file": ("photo.jpg", traffic.upload(), "image/jpeg")},
+                                  timeout=timeout)
+        elif route == "analyze":
+            r = await client.post("/analyze", files={"file": ("photo.jpg", traffic.upload(), "image/jpeg")},
+                                  data=traffic.city(), timeout=timeout)
+        elif route == "weather":
+            r = await client.get("/weather", params=traffic.city(), timeout=timeout)
+        else:
+            r = await client.get("/healthz", timeout=timeout)
+        outcome = str(r.status_code)
+        # The API reports some failures (bad image, weather errors) as 200 + {"error": ...}
+        if r.status_code == 200 and route != "health":
+            body = r.json()
+            if "error" in body or (route == "analyze" and "error" in body.get("weather", {})):
+                outcome = "200-error"
+    except httpx.TimeoutException:
+        outcome = "timeout"
+    except httpx.HTTPError as e:
+        outcome = type(e).__name__
+    return route, outcome
+
+
+async def drive(client: httpx.AsyncClient, traffic: Traffic, recorder: Recorder, concurrency: int,
+                duration_s: float, timeout: float, on_tick=None, tick_s: float = 1.0) -> Tuple[float, float]:
+    start = time.perf_counter()
+    stop_at = start + duration_s
+
+    async def worker():
+        while time.perf_counter() < stop_at:
+            t0 = time.perf_counter()
+            route, outcome = await one_request(client, traffic, timeout)
+            recorder.add(route, (time.perf_counter() - t0) * 1000, outcome)
+
+    async def ticker():
+        while time.perf_counter() < stop_at:
+            await asyncio.sleep(tick_s)
+            on_tick()
+
+    tasks = [asyncio.create_task(worker()) for _ in range(concurrency)]
+    if on_tick is not None:
+        tasks.append(asyncio.create_task(ticker()))
+    await asyncio.gather(*tasks)
+    return start, time.perf_counter()
+
+
+def print_level(label: str, summary: Dict[str, Any]) -> None:
+    a = summary["routes"].get("all", {})
+    print(f"{label:>8} {summary['throughput_rps']:>8.1f} {a.get('p50_ms', 0):>8.1f} {a.get('p95_ms', 0):>8.1f} "
+          f"{a.get('p99_ms', 0):>8.1f} {a.get('error_rate', 0):>7.1%} {a.get('shed_rate', 0):>6.1%}")
+    for route, r in summary["routes"].items():
+        if route != "all":
+            print(f"{'':>8} {route:>8} p50 {r['p50_ms']:>7.1f}  p95 {r['p95_ms']:>7.1f}  p99 {r['p99_ms']:>7.1f}  "
+                  f"n={r['requests']}  err {r['error_rate']:.1%}  503 {r['shed_rate']:.1%}")
+
+
+def saturation(levels: List[Dict[str, Any]]) -> Optional[int]:
+    """
+    Last concurrency level that still raised throughput by >= 10%; past it,
+    requests only queue. None if throughput grew at every level.
+    """
+    for prev, cur in zip(levels, levels[1:]):
+        if cur["throughput_rps"] < prev["throughput_rps"] * 1.10:
+            return prev["concurrency"]
+    return None
+
+
+async def sweep(args, client, traffic, pid) -> Dict[str, Any]:
+    levels = []
+    print(f"{'conc':>8} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7} {'503':>6}")
+    for concurrency in [int(c) for c in args.concurrency.split(",")]:
+        recorder = Recorder()
+        start, end = await drive(client, traffic, recorder, concurrency, args.duration, args.timeout)
+        summary = {"concurrency": concurrency, **recorder.summary(start, end)}
+        if pid is not None:
+            summary["rss_mb"] = round(tree_rss_mb(pid), 1)
+        levels.append(summary)
+        print_level(str(concurrency), summary)
+    knee = saturation(levels)
+    if knee is not None:
+        at = next(level for level in levels if level["concurrency"] == knee)
+        print(f"\nSaturation around concurrency {knee}: {at['throughput_rps']:.1f} req/s, "
+              f"p95 {at['routes']['all']['p95_ms']:.0f} ms. Beyond it throughput stays flat and latency grows.")
+    elif levels:
+        print(f"\nThroughput still grew at concurrency {levels[-1]['concurrency']}; "
+              f"add higher --concurrency levels to find the saturation point.")
+    return {"levels": levels, "saturation_concurrency": knee}
+
+
+def _slope_mb_per_hour(points: List[Tuple[float, float]]) -> float:
+    if len(points) < 3:
+        return 0.0
+    xs = [t for t, _ in points]
+    ys = [m for _, m in points]
+    mx, my = statistics.fmean(xs), statistics.fmean(ys)
+    var = sum((x - mx) ** 2 for x in xs)
+    return sum((x - mx) * (y - my) for x, y in zip(xs, ys)) / var * 3600 if var else 0.0
+
+
+async def soak(args, client, traffic, pid) -> Dict[str, Any]:
+    concurrency = int(args.concurrency.split(",")[0])
+    recorder = Recorder()
+    rss: List[Tuple[float, float]] = []
+    t_start = time.perf_counter()
+
+    def sample_rss():
+        if pid is not None:
+            rss.append((time.perf_counter() - t_start, tree_rss_mb(pid)))
+
+    sample_rss()
+    print(f"[Info] Soak: concurrency {concurrency} for {args.duration:.0f}s, windows of {args.window:.0f}s")
+    print(f"{'t s':>8} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7} {'503':>6} {'rss MB':>8}")
+    windows = []
+    next_window = [t_start + args.window]
+
+    def on_tick():
+        now = time.perf_counter()
+        if len(rss) == 0 or now - t_start - rss[-1][0] >= args.rss_interval:
+            sample_rss()
+        if now >= next_window[0]:
+            summary = recorder.summary(next_window[0] - args.window, next_window[0])
+            summary["t_s"] = round(next_window[0] - t_start)
+            summary["rss_mb"] = round(rss[-1][1], 1) if rss else None
+            windows.append(summary)
+            a = summary["routes"].get("all", {})
+            print(f"{summary['t_s']:>8} {summary['throughput_rps']:>8.1f} {a.get('p50_ms', 0):>8.1f} "
+                  f"{a.get('p95_ms', 0):>8.1f} {a.get('p99_ms', 0):>8.1f} {a.get('error_rate', 0):>7.1%} "
+                  f"{a.get('shed_rate', 0):>6.1%} {summary['rss_mb'] or 0:>8.0f}")
+            next_window[0] += args.window
+
+    start, end = await drive(client, traffic, recorder, concurrency, args.duration, args.timeout,
+                             on_tick=on_tick, tick_s=min(1.0, args.rss_interval))
+    sample_rss()
+    total = recorder.summary(start, end)
+    print("\nWhole run:")
+    print_level(str(concurrency), total)
+
+    result: Dict[str, Any] = {"concurrency": concurrency, "total": total, "windows": windows}
+    if rss:
+        second_half = [p for p in rss if p[0] >= rss[-1][0] / 2]
+        result["rss"] = {
+            "start_mb": round(rss[0][1], 1),
+            "end_mb": round(rss[-1][1], 1),
+            "peak_mb": round(max(m for _, m in rss), 1),
+            "growth_mb": round(rss[-1][1] - rss[0][1], 1),
+            "second_half_slope_mb_per_hour": round(_slope_mb_per_hour(second_half), 1),
+            "samples": [(round(t, 1), round(m, 1)) for t, m in rss],
+        }
+        r = result["rss"]
+        print(f"\nRSS: {r['start_mb']:.0f} -> {r['end_mb']:.0f} MB (peak {r['peak_mb']:.0f}), "
+              f"second-half trend {r['second_half_slope_mb_per_hour']:+.1f} MB/hour")
+        if second_half[-1][0] - second_half[0][0] < 300:
+            print("[Info] Soak for at least 10 minutes for a meaningful leak verdict.")
+        elif r["second_half_slope_mb_per_hour"] > args.leak_mb_per_hour:
+            print(f"[Warn] RSS is still growing faster than {args.leak_mb_per_hour:.0f} MB/hour after warmup: "
+                  f"possible leak.")
+            result["possible_leak"] = True
+    return result
+
+
+async def run(args) -> Dict[str, Any]:
+    images = []
+    for part in parse_weights(args.image_sizes):
+        w, h = (int(v) for v in part[0].lower().split("x"))
+        images.append((jpeg_bytes(synthetic_image(w, h, seed=w * h)), part[1]))
+    traffic = Traffic(parse_weights(args.mix), images, args.repeat_rate, args.seed)
+
+    weather, proc, pid = None, None, None
+    base = args.url
+    if base is None:
+        weather = start_fake_weather_server(delay_s=args.weather_delay_ms / 1000, error_rate=args.weather_error_rate)
+        env = {
+            **os.environ,
+            "WEATHER_API_URL": weather.url,
+            "WEATHER_API_KEY": os.getenv("WEATHER_API_KEY", "dummy"),
+        }
+        cmd = (args.server_cmd.split() if args.server_cmd else
+               [sys.executable, "-m", "uvicorn", "app:app", "--log-level", "warning"]) + ["--port", str(args.port)]
+        proc = subprocess.Popen(cmd, cwd=ROOT, env=env)
+        pid = proc.pid
+        base = f"http://127.0.0.1:{args.port}"
+
+    limits = httpx.Limits(max_connections=max(int(c) for c in args.concurrency.split(",")) + 8)
+    try:
+        async with httpx.AsyncClient(base_url=base, limits=limits) as client:
+            await wait_ready(client, proc)
+            # Warm up connections, caches and allocator before measuring
+            await drive(client, traffic, Recorder(), 2, args.warmup, args.timeout)
+            mode = sweep if args.command == "sweep" else soak
+            result = await mode(args, client, traffic, pid)
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+        if weather is not None:
+            weather.shutdown()
+    return {
+        "mode": args.command,
+        "config": {k: v for k, v in vars(args).items() if k != "out"},
+        **result,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["sweep", "soak"])
+    parser.add_argument("--url", help="target an already running server (no RSS tracking)")
+    parser.add_argument("--server-cmd", help="command that starts the server, run in Hair-Type-Classifier/; "
+                                             "--port is appended (default: uvicorn app:app)")
+    parser.add_argument("--port", type=int, default=8130)
+    parser.add_argument("--concurrency", default=None, help="levels for sweep (default 1,2,4,8,16,32); first one for soak (8)")
+    parser.add_argument("--duration", type=float, default=None, help="seconds per level (sweep, 20) or in total (soak, 600)")
+    parser.add_argument("--warmup", type=float, default=5.0)
+    parser.add_argument("--window", type=float, default=60.0, help="soak report interval, seconds")
+    parser.add_argument("--rss-interval", type=float, default=5.0)
+    parser.add_argument("--leak-mb-per-hour", type=float, default=50.0, help="soak warns above this RSS trend")
+    parser.add_argument("--mix", default="predict=0.7,weather=0.2,health=0.1")
+    parser.add_argument("--image-sizes", default="640x480:0.5,1920x1080:0.3,4032x3024:0.2")
+    parser.add_argument("--repeat-rate", type=float, default=0.1)
+    parser.add_argument("--weather-delay-ms", type=float, default=150.0)
+    parser.add_argument("--weather-error-rate", type=float, default=0.0)
+    parser.add_argument("--timeout", type=float, default=30.0, help="per-request client timeout, seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="save the results as JSON")
+    args = parser.parse_args()
+    if args.concurrency is None:
+        args.concurrency = "1,2,4,8,16,32" if args.command == "sweep" else "8"
+    if args.duration is None:
+        args.duration = 20.0 if args.command == "sweep" else 600.0
+
+    result = asyncio.run(run(args))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"\nSaved {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Checks the pooled weather client and its circuit breaker against the fake upstream.
+
+    python benchmarks/smoke_weather_client.py [--requests 200]
+
+Uses benchmarks/fake_weather_server.py with injected latency and errors:
+  keep-alive   sequential calls reuse pooled connections; per-call time is
+               compared with a fresh `requests.get` per call (the old path)
+  timeouts     a slow upstream fails after the read timeout, not later
+  breaker      repeated 5xx open the circuit; further calls fail fast
+               without reaching upstream; after the cooldown one trial
+               call goes through and closes it again
+Exits non-zero if any check fails. Needs no model and no network access.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import requests  # noqa: E402
+
+from fake_weather_server import start_fake_weather_server  # noqa: E402
+from weather import CircuitBreaker, CircuitOpenError, WeatherClient, WeatherError  # noqa: E402
+
+
+async def run(n_requests: int) -> bool:
+    server = start_fake_weather_server()
+    failures = []
+
+    def check(name, ok, detail):
+        print(f"[{'OK' if ok else 'FAIL'}] {name}: {detail}")
+        if not ok:
+            failures.append(name)
+
+    # Keep-alive vs a new connection per call
+    params = {"q": "Johannesburg,ZA", "appid": "dummy", "units": "metric"}
+    t0 = time.perf_counter()
+    for _ in range(n_requests):
+        requests.get(server.url, params=params, timeout=8).close()
+    per_call_ms = (time.perf_counter() - t0) * 1000 / n_requests
+    fresh_connections = server.stats()["connections"]
+
+    server.reset()
+    client = WeatherClient("dummy", url=server.url, connect_timeout_s=1, read_timeout_s=0.5,
+                           breaker=CircuitBreaker(failure_threshold=3, cooldown_s=1.0))
+    t0 = time.perf_counter()
+    for _ in range(n_requests):
+        await client.fetch("Johannesburg", "ZA")
+    pooled_ms = (time.perf_counter() - t0) * 1000 / n_requests
+    pooled_connections = server.stats()["connections"]
+    check("keep-alive", pooled_connections == 1,
+          f"{n_requests} calls: requests.get {per_call_ms:.2f} ms/call over {fresh_connections} connections, "
+          f"pooled client {pooled_ms:.2f} ms/call over {pooled_connections} connection(s)")
+
+    # Read timeout
+    server.configure(delay_ms=2000)
+    t0 = time.perf_counter()
+    try:
+        await client.fetch("Johannesburg", "ZA")
+        timed_out = False
+    except WeatherError:
+        timed_out = True
+    elapsed = time.perf_counter() - t0
+    check("read timeout", timed_out and elapsed < 1.0,
+          f"2000 ms upstream gave up after {elapsed * 1000:.0f} ms (read timeout 500 ms)")
+    server.configure(delay_ms=0)
+    client.breaker.record_success()
+
+    # Breaker opens after 3 consecutive 5xx, then fails fast
+    server.configure(error_rate=1.0)
+    for _ in range(3):
+        try:
+            await client.fetch("Johannesburg", "ZA")
+        except WeatherError:
+            pass
+    check("breaker opens", client.breaker.state == "open", f"state after 3 errors: {client.breaker.state}")
+
+    server.configure(delay_ms=500)
+    calls_before = server.total_calls
+    t0 = time.perf_counter()
+    rejected = 0
+    for _ in range(50):
+        try:
+            await client.fetch("Johannesburg", "ZA")
+        except CircuitOpenError:
+            rejected += 1
+    fast_ms = (time.perf_counter() - t0) * 1000
+    check("fail fast", rejected == 50 and server.total_calls == calls_before,
+          f"50 calls rejected in {fast_ms:.2f} ms total, {server.total_calls - calls_before} reached upstream")
+
+    # Half-open: one trial after the cooldown, success closes the circuit
+    server.configure(delay_ms=50, error_rate=0.0)
+    await asyncio.sleep(1.1)
+    calls_before = server.total_calls
+    results = await asyncio.gather(*(client.fetch("Johannesburg", "ZA") for _ in range(10)),
+                                   return_exceptions=True)
+    ok = sum(1 for r in results if not isinstance(r, Exception))
+    check("half-open trial", ok == 1 and server.total_calls - calls_before == 1,
+          f"10 concurrent calls after cooldown: {server.total_calls - calls_before} trial call upstream, "
+          f"{10 - ok} rejected")
+    await client.fetch("Johannesburg", "ZA")
+    check("breaker closes", client.breaker.state == "closed", f"state after trial: {client.breaker.state}")
+
+    print(f"[Info] client stats: {client.stats()}")
+    await client.aclose()
+    server.shutdown()
+    return not failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+    ok = asyncio.run(run(args.requests))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
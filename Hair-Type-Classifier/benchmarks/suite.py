@@ -0,0 +1,374 @@
+"""
+Microbenchmark suite for the inference and recommendation hot paths, with
+a regression check against a stored baseline. Offline and CPU-only.
+
+    python benchmarks/suite.py run [--quick] [--filter predict] [--out results.json]
+    python benchmarks/suite.py run --baseline benchmarks/results/baseline.json   # run, then compare
+    python benchmarks/suite.py compare baseline.json current.json [--threshold 0.10]
+
+Cases (synthetic inputs, fixed seeds):
+  api.decode[WxH]                 app._decode_image on a JPEG at several resolutions
+  api.predict_from_pil[WxH]       app._predict_from_pil: preprocess + forward + recommend
+  api.predict_batch[8x640x480]    app._predict_batch_from_pil, one batched forward pass
+  api.recommend_products[N]       app.recommend_products over catalogs of N products
+  gradio.normalize_hair_label     per call, over a mix of vocab labels
+  gradio.recommend_products[N]    with and without a free-text goal
+  gradio.render_recommendations_html[8]
+The gradio.* cases need gradio installed (they import app(real).py) and are
+skipped otherwise.
+
+--model picks the classifier: "real" serves the configured INFERENCE_BACKEND
+(models/hair-resnet18-model.pkl or MODEL_EXPORT_DIR), "tiny" a small random
+CNN with the same labels and input size, so the rest of the path can be
+timed without the trained model; "auto" (default) uses the real one when
+its file is present. The model kind is stored with the results, and compare
+warns when the two runs differ in model, backend or machine.
+
+Results are JSON (median / p95 / min ms per case, plus the environment);
+compare exits with status 1 when any case's median got slower than
+--threshold (default 10%) and by more than --min-delta-ms.
+"""
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from io import BytesIO
+from typing import Any, Callable, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPO = os.path.dirname(ROOT)
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import numpy as np  # noqa: E402
+from PIL import Image  # noqa: E402
+
+RESOLUTIONS = [(224, 224), (640, 480), (1920, 1080), (4032, 3024)]
+CATALOG_SIZES = [10, 1000, 100_000]
+QUICK_RESOLUTIONS = [(224, 224), (1920, 1080)]
+QUICK_CATALOG_SIZES = [10, 1000]
+HAIR_TYPES = ["Straight", "Wavy", "Curly", "Coily", "Kinky"]
+ACTIVES = ["argan oil", "shea butter", "keratin", "biotin", "aloe vera", "glycerin", "panthenol", "coconut oil"]
+
+
+class Case:
+    def __init__(self, name: str, fn: Callable[[], Any], inner: int = 1,
+                 setup: Optional[Callable[[], Any]] = None):
+        self.name = name
+        self.fn = fn
+        self.inner = inner
+        self.setup = setup
+
+
+def measure(fn: Callable[[], Any], inner: int, min_time_s: float, max_runs: int) -> Dict[str, Any]:
+    for _ in range(2):
+        fn()
+    samples: List[float] = []
+    start = time.perf_counter()
+    while len(samples) < 5 or (len(samples) < max_runs and time.perf_counter() - start < min_time_s):
+        t0 = time.perf_counter()
+        for _ in range(inner):
+            fn()
+        samples.append((time.perf_counter() - t0) / inner * 1000)
+    samples.sort()
+    return {
+        "median_ms": statistics.median(samples),
+        "p95_ms": samples[min(len(samples) - 1, int(0.95 * len(samples)))],
+        "min_ms": samples[0],
+        "runs": len(samples),
+        "inner": inner,
+    }
+
+
+# ---------------------------------------------------------------------------
+# Synthetic inputs
+# ---------------------------------------------------------------------------
+
+def synthetic_image(width: int, height: int, seed: int = 0) -> Image.Image:
+    """Smooth colour fields plus grain: compresses like a photo, unlike pure noise."""
+    rng = np.random.default_rng(seed)
+    coarse = rng.integers(0, 256, (max(2, height // 64), max(2, width // 64), 3), dtype=np.uint8)
+    img = Image.fromarray(coarse).resize((width, height), Image.BILINEAR)
+    grain = rng.integers(-12, 13, (height, width, 3), dtype=np.int16)
+    return Image.fromarray(np.clip(np.asarray(img, dtype=np.int16) + grain, 0, 255).astype(np.uint8))
+
+
+def jpeg_bytes(img: Image.Image) -> bytes:
+    buf = BytesIO()
+    img.save(buf, format="JPEG", quality=90)
+    return buf.getvalue()
+
+
+def synthetic_products(n: int, seed: int = 0) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    return [
+        {
+            "name": f"Product {i}",
+            "brand": f"Brand {rng.randint(1, 200)}",
+            "hair_types": rng.sample(HAIR_TYPES, rng.randint(1, 3)),
+            "score_boost": round(rng.random() * 0.3, 3),
+            "actives": rng.sample(ACTIVES, 2),
+            "description": f"{' and '.join(rng.sample(ACTIVES, 2))} formula for "
+                           f"{rng.choice(['frizz', 'shine', 'volume', 'moisture', 'repair'])}.",
+        }
+        for i in range(n)
+    ]
+
+
+def tiny_engine(labels: List[str]):
+    """Small random CNN with the trained model's labels and input size (body + head, so embeddings work)."""
+    import torch
+    from torch import nn
+
+    from backends import TorchBackend
+    from inference import InferenceEngine
+
+    torch.manual_seed(0)
+    body = nn.Sequential(
+        nn.Conv2d(3, 16, 3, stride=4, padding=1), nn.ReLU(),
+        nn.Conv2d(16, 32, 3, stride=4, padding=1), nn.ReLU(),
+    )
+    head = nn.Sequential(nn.AdaptiveAvgPool2d(1), nn.Flatten(), nn.Linear(32, len(labels)))
+    return InferenceEngine(TorchBackend(nn.Sequential(body, head).eval()), labels, size=(224, 224))
+
+
+# ---------------------------------------------------------------------------
+# Cases
+# ---------------------------------------------------------------------------
+
+def real_model_available(app) -> bool:
+    if app.INFERENCE_BACKEND == "torch":
+        return os.path.exists(app.MODEL_PATH)
+    return os.path.isdir(app.MODEL_EXPORT_DIR)
+
+
+def load_api(model_kind: str):
+    import app
+    from model_loader import ModelLoader
+
+    if model_kind == "auto":
+        model_kind = "real" if real_model_available(app) else "tiny"
+    if model_kind == "tiny":
+        labels = ["Curly", "Dreadlocks", "Kinky", "Straight", "Wavy"]
+        app.model = ModelLoader(lambda: (tiny_engine(labels), None), on_loaded=app._on_model_loaded)
+    if not app.model.load():
+        raise SystemExit(f"Model not available ({app.model.error}); try --model tiny.")
+    app.model.warm_up()
+    return app, model_kind
+
+
+def api_cases(app, resolutions, catalog_sizes, store) -> List[Case]:
+    from recommender import AffinityIndex
+
+    cases = []
+    for w, h in resolutions:
+        img = synthetic_image(w, h)
+        data = jpeg_bytes(img)
+        cases.append(Case(f"api.decode[{w}x{h}]", lambda data=data: app._decode_image(data)))
+        cases.append(Case(f"api.predict_from_pil[{w}x{h}]", lambda img=img: app._predict_from_pil(img)))
+    batch = [synthetic_image(640, 480, seed=i) for i in range(8)]
+    cases.append(Case("api.predict_batch[8x640x480]", lambda: app._predict_batch_from_pil(batch)))
+
+    probs = {"Curly": 0.55, "Wavy": 0.40, "Straight": 0.03, "Kinky": 0.01, "Dreadlocks": 0.01}
+    for n in catalog_sizes:
+        catalog = f"bench-api-{n}"
+        if not store.count(catalog):
+            store.add_many(catalog, synthetic_products(n))
+
+        def recommend(catalog=catalog):
+            app.PRODUCT_CATALOG_NAME = catalog
+            return app.recommend_products(probs)
+
+        def setup(catalog=catalog):
+            app.affinity_index = AffinityIndex(app.HAIR_LABELS)
+            recommend(catalog)
+
+        cases.append(Case(f"api.recommend_products[{n}]", recommend, setup=setup))
+    return cases
+
+
+def load_gradio():
+    if importlib.util.find_spec("gradio") is None:
+        return None
+    spec = importlib.util.spec_from_file_location("gradio_app", os.path.join(REPO, "app(real).py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def gradio_cases(gapp, catalog_sizes, store) -> List[Case]:
+    from text_search import BM25Index
+
+    labels = ["Curly", "Dreadlocks", "Kinky", "Straight", "Wavy", "type_3c", "2a_wavy", "4C"]
+    probs = [0.55, 0.02, 0.01, 0.02, 0.40]
+
+    def normalize():
+        for label in labels:
+            gapp._normalize_hair_label(label)
+
+    cases = [Case("gradio.normalize_hair_label", normalize, inner=1000 // len(labels))]
+    for n in catalog_sizes:
+        catalog = f"bench-gradio-{n}"
+        if not store.count(catalog):
+            store.add_many(catalog, synthetic_products(n))
+        for goal in ("", "repair frizz with argan oil"):
+            def recommend(catalog=catalog, goal=goal):
+                gapp.PRODUCT_CATALOG_NAME = catalog
+                return gapp.recommend_products("Curly", probs, goal)
+
+            def setup(catalog=catalog, goal=goal):
+                gapp.goal_index = BM25Index()
+                recommend(catalog, goal)
+
+            suffix = ",goal" if goal else ""
+            cases.append(Case(f"gradio.recommend_products[{n}{suffix}]", recommend, setup=setup))
+
+    gapp.PRODUCT_CATALOG_NAME = f"bench-gradio-{catalog_sizes[-1]}"
+    gapp.goal_index = BM25Index()
+    recs = gapp.recommend_products("Curly", probs, "")
+    cases.append(Case(f"gradio.render_recommendations_html[{len(recs)}]",
+                      lambda: gapp.render_recommendations_html(recs), inner=100))
+    return cases
+
+
+def environment(model_kind: str, backend: str) -> Dict[str, Any]:
+    import torch
+
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": commit,
+        "model": model_kind,
+        "backend": backend,
+        "python": platform.python_version(),
+        "torch": torch.__version__,
+        "torch_threads": torch.get_num_threads(),
+        "cpu_count": os.cpu_count(),
+        "machine": f"{platform.system()} {platform.machine()} {platform.processor()}".strip(),
+    }
+
+
+def run(args) -> int:
+    db_dir = tempfile.mkdtemp(prefix="bench-suite-")
+    os.environ["PRODUCT_DB_PATH"] = os.path.join(db_dir, "products.db")
+    os.environ.setdefault("MODEL_WARMUP_ROUNDS", "1")
+
+    from product_store import ProductStore
+
+    resolutions = QUICK_RESOLUTIONS if args.quick else RESOLUTIONS
+    catalog_sizes = QUICK_CATALOG_SIZES if args.quick else CATALOG_SIZES
+    min_time_s = 0.2 if args.quick else args.min_time
+
+    app, model_kind = load_api(args.model)
+    store = ProductStore(os.environ["PRODUCT_DB_PATH"], refresh_interval_s=0)
+    cases = api_cases(app, resolutions, catalog_sizes, store)
+    gapp = load_gradio()
+    if gapp is None:
+        print("[Warn] gradio is not installed; skipping the gradio.* cases.")
+    else:
+        cases += gradio_cases(gapp, catalog_sizes, store)
+
+    results: Dict[str, Any] = {}
+    print(f"model: {model_kind} ({app.INFERENCE_BACKEND})")
+    print(f"{'case':<46} {'median ms':>10} {'p95 ms':>10} {'runs':>6}")
+    for case in cases:
+        if args.filter and args.filter not in case.name:
+            continue
+        if case.setup is not None:
+            case.setup()
+        r = measure(case.fn, case.inner, min_time_s, args.max_runs)
+        results[case.name] = r
+        print(f"{case.name:<46} {r['median_ms']:>10.4f} {r['p95_ms']:>10.4f} {r['runs']:>6}")
+
+    out = args.out or os.path.join(ROOT, "benchmarks", "results", time.strftime("suite-%Y%m%d-%H%M%S.json"))
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    report = {"environment": environment(model_kind, app.INFERENCE_BACKEND), "results": results}
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nSaved {out}")
+    shutil.rmtree(db_dir, ignore_errors=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            return compare(json.load(f), report, args.threshold, args.min_delta_ms)
+    return 0
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float, min_delta_ms: float) -> int:
+    """Print a comparison table; returns the number of regressions."""
+    base_env, cur_env = baseline.get("environment", {}), current.get("environment", {})
+    for key in ("model", "backend", "cpu_count", "machine", "torch"):
+        if base_env.get(key) != cur_env.get(key):
+            print(f"[Warn] {key} differs: baseline {base_env.get(key)!r}, current {cur_env.get(key)!r}; "
+                  f"timings may not be comparable.")
+
+    base, cur = baseline["results"], current["results"]
+    regressions = 0
+    print(f"{'case':<46} {'base ms':>10} {'now ms':>10} {'change':>8}")
+    for name in list(base) + [n for n in cur if n not in base]:
+        if name not in cur:
+            print(f"{name:<46} {base[name]['median_ms']:>10.4f} {'-':>10} {'missing':>8}")
+            continue
+        if name not in base:
+            print(f"{name:<46} {'-':>10} {cur[name]['median_ms']:>10.4f} {'new':>8}")
+            continue
+        b, c = base[name]["median_ms"], cur[name]["median_ms"]
+        change = (c - b) / b if b else 0.0
+        flag = ""
+        if change > threshold and c - b > min_delta_ms:
+            flag = "  REGRESSION"
+            regressions += 1
+        elif change < -threshold:
+            flag = "  faster"
+        print(f"{name:<46} {b:>10.4f} {c:>10.4f} {change:>+8.1%}{flag}")
+    print(f"\n{regressions} regression(s) beyond {threshold:.0%}.")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_run = sub.add_parser("run", help="run the suite and save JSON results")
+    p_run.add_argument("--model", default="auto", choices=["auto", "real", "tiny"])
+    p_run.add_argument("--quick", action="store_true", help="fewer resolutions / catalog sizes, shorter runs")
+    p_run.add_argument("--filter", help="only cases whose name contains this")
+    p_run.add_argument("--min-time", type=float, default=1.0, help="seconds of samples per case")
+    p_run.add_argument("--max-runs", type=int, default=200)
+    p_run.add_argument("--out", help="results file (default: benchmarks/results/suite-<time>.json)")
+    p_run.add_argument("--baseline", help="compare against this results file afterwards")
+
+    p_cmp = sub.add_parser("compare", help="compare two results files")
+    p_cmp.add_argument("baseline")
+    p_cmp.add_argument("current")
+
+    for p in (p_run, p_cmp):
+        p.add_argument("--threshold", type=float, default=0.10, help="relative slowdown that counts (0.10 = 10%%)")
+        p.add_argument("--min-delta-ms", type=float, default=0.005, help="ignore slowdowns smaller than this")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        regressions = run(args)
+    else:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.current) as f:
+            current = json.load(f)
+        regressions = compare(baseline, current, args.threshold, args.min_delta_ms)
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
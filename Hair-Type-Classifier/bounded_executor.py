@@ -0,0 +1,133 @@
+import asyncio
+import functools
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+class QueueFullError(Exception):
+    """Raised instead of queueing more work; the caller should shed load."""
+
+    def __init__(self, message: str = "Queue is full.", retry_after: float = 1.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class WaitStats:
+    """Running count / mean / max of queue wait times, in milliseconds."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.last_ms = 0.0
+
+    def record(self, wait_s: float) -> None:
+        ms = wait_s * 1000.0
+        with self._lock:
+            self.count += 1
+            self.total_ms += ms
+            self.last_ms = ms
+            if ms > self.max_ms:
+                self.max_ms = ms
+
+    def as_dict(self) -> Dict[str, float]:
+        with self._lock:
+            avg = self.total_ms / self.count if self.count else 0.0
+            return {
+                "last_ms": round(self.last_ms, 3),
+                "avg_ms": round(avg, 3),
+                "max_ms": round(self.max_ms, 3),
+            }
+
+
+def _timed_call(fn: Callable, *args) -> Tuple[float, Any]:
+    # time.monotonic is system-wide on Linux, so this also works across
+    # processes when the pool is a ProcessPoolExecutor.
+    return time.monotonic(), fn(*args)
+
+
+class BoundedExecutor:
+    """
+    Thread or process pool with a hard cap on queued work.
+
+    At most `max_workers` jobs run at once and at most `max_queue` more may
+    wait. Past that, `run` raises QueueFullError immediately so the caller
+    can answer 503 instead of letting latency pile up.
+
+    Process workers are always forked (whatever the platform's default
+    start method), so they start from the parent's state, e.g. a model it
+    already loaded; `initializer` runs once in each of them first.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 2,
+        max_queue: int = 32,
+        kind: str = "thread",
+        name: str = "work",
+        retry_after: float = 1.0,
+        initializer: Optional[Callable[[], None]] = None,
+    ):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown pool kind {kind!r}; use 'thread' or 'process'.")
+        self.max_workers = max(1, int(max_workers))
+        self.max_queue = max(0, int(max_queue))
+        self.kind = kind
+        self.name = name
+        self.retry_after = retry_after
+        if kind == "thread":
+            self.executor: Executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix=name)
+        else:
+            self.executor = ProcessPoolExecutor(
+                self.max_workers, mp_context=multiprocessing.get_context("fork"), initializer=initializer
+            )
+
+        self._pending = 0  # queued + running; only touched on the event loop
+        self.completed = 0
+        self.rejected = 0
+        self.wait = WaitStats()
+
+    @property
+    def in_flight(self) -> int:
+        return self._pending
+
+    @property
+    def queue_depth(self) -> int:
+        return max(0, self._pending - self.max_workers)
+
+    async def run(self, fn: Callable, *args) -> Any:
+        if self._pending >= self.max_workers + self.max_queue:
+            self.rejected += 1
+            raise QueueFullError(f"{self.name} queue is full.", retry_after=self.retry_after)
+
+        self._pending += 1
+        submitted = time.monotonic()
+        try:
+            loop = asyncio.get_running_loop()
+            started, result = await loop.run_in_executor(
+                self.executor, functools.partial(_timed_call, fn, *args)
+            )
+            self.wait.record(started - submitted)
+            self.completed += 1
+            return result
+        finally:
+            self._pending -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "kind": self.kind,
+            "workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "wait": self.wait.as_dict(),
+        }
+
+    def shutdown(self, wait: bool = False) -> None:
+        self.executor.shutdown(wait=wait)
@@ -0,0 +1,197 @@
+"""
+Offline bulk classification of image folders with the serving model.
+
+    python classify_bulk.py data/hair-type-dataset --output labels.jsonl
+    python classify_bulk.py "archive/**/*.jpg" --output labels.csv --batch-size 64 --workers 8
+
+Images are read and decoded by a pool of --workers threads that stays up to
+--prefetch batches ahead of the model, and classified in batched forward
+passes by the same engine / INFERENCE_BACKEND the API uses. Results are
+appended to --output (JSONL or CSV, by extension or --format) and flushed
+to disk after every batch.
+
+The output file is also the checkpoint: re-running the same command after a
+crash or Ctrl-C skips every file already in it (a half-written last line is
+dropped) and carries on. Use --restart to start over.
+"""
+import argparse
+import csv
+import glob
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Set
+
+from inference import create_engine
+from uploads import decode_image
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".bmp", ".gif"}
+
+
+def discover(inputs: List[str]) -> List[str]:
+    """Image files under the given directories / glob patterns, sorted and de-duplicated."""
+    found: Set[str] = set()
+    for pattern in inputs:
+        if os.path.isdir(pattern):
+            for root, _, names in os.walk(pattern):
+                for name in names:
+                    if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS:
+                        found.add(os.path.abspath(os.path.join(root, name)))
+        else:
+            for path in glob.glob(pattern, recursive=True):
+                if os.path.isfile(path) and os.path.splitext(path)[1].lower() in IMAGE_EXTENSIONS:
+                    found.add(os.path.abspath(path))
+    return sorted(found)
+
+
+def _truncate_partial_line(path: str) -> None:
+    """Drop a trailing line without newline, left behind by a crash mid-write."""
+    with open(path, "rb+") as f:
+        data = f.read()
+        if data and not data.endswith(b"\n"):
+            f.truncate(data.rfind(b"\n") + 1)
+
+
+def load_done(path: str, fmt: str) -> Set[str]:
+    if not os.path.isfile(path):
+        return set()
+    _truncate_partial_line(path)
+    done: Set[str] = set()
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if fmt == "jsonl":
+            for line in f:
+                try:
+                    done.add(json.loads(line)["path"])
+                except (ValueError, KeyError):
+                    continue
+        else:
+            for row in csv.DictReader(f):
+                if row.get("path"):
+                    done.add(row["path"])
+    return done
+
+
+class ResultWriter:
+    def __init__(self, path: str, fmt: str, labels: List[str]):
+        self.fmt = fmt
+        self.labels = labels
+        new_file = not os.path.isfile(path) or os.path.getsize(path) == 0
+        self.f = open(path, "a", encoding="utf-8", newline="")
+        if fmt == "csv":
+            self.fields = ["path", "hair_type", *[f"prob_{label}" for label in labels], "error"]
+            self.csv = csv.DictWriter(self.f, fieldnames=self.fields)
+            if new_file:
+                self.csv.writeheader()
+
+    def write(self, rows: List[Dict[str, Any]]) -> None:
+        for row in rows:
+            if self.fmt == "jsonl":
+                self.f.write(json.dumps(row) + "\n")
+            else:
+                flat = {"path": row["path"], "hair_type": row.get("hair_type", ""), "error": row.get("error", "")}
+                for label, p in row.get("probabilities", {}).items():
+                    flat[f"prob_{label}"] = f"{p:.6f}"
+                self.csv.writerow(flat)
+        # Flushed and synced per batch: this file is the resume checkpoint
+        self.f.flush()
+        os.fsync(self.f.fileno())
+
+    def close(self) -> None:
+        self.f.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("inputs", nargs="+", help="directories and/or glob patterns (quote them)")
+    parser.add_argument("--output", required=True)
+    parser.add_argument("--format", choices=("jsonl", "csv"), default=None)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4, help="decode threads")
+    parser.add_argument("--prefetch", type=int, default=4, help="batches decoded ahead of the model")
+    parser.add_argument("--backend", default=os.getenv("INFERENCE_BACKEND", "torch").lower())
+    parser.add_argument("--model", default=os.path.join("models", "hair-resnet18-model.pkl"))
+    parser.add_argument("--export-dir", default=os.getenv("MODEL_EXPORT_DIR", os.path.join("models", "export")))
+    parser.add_argument("--no-draft", action="store_true", help="decode JPEGs at full resolution")
+    parser.add_argument("--restart", action="store_true", help="ignore and overwrite existing output")
+    parser.add_argument("--report-every", type=float, default=10.0, help="seconds between progress lines")
+    args = parser.parse_args()
+
+    fmt = args.format or ("csv" if args.output.lower().endswith(".csv") else "jsonl")
+    if args.restart and os.path.exists(args.output):
+        os.remove(args.output)
+
+    paths = discover(args.inputs)
+    done = load_done(args.output, fmt)
+    todo = [p for p in paths if p not in done]
+    print(f"[Bulk] {len(paths)} images found, {len(paths) - len(todo)} already in {args.output}, "
+          f"{len(todo)} to classify.")
+    if not todo:
+        return
+
+    engine, _ = create_engine(args.backend, args.model, args.export_dir, max_batch_size=args.batch_size)
+    target = (engine.height, engine.width)
+    draft = not args.no_draft
+
+    def load(path: str):
+        try:
+            with open(path, "rb") as f:
+                return decode_image(f.read(), target, draft=draft)
+        except Exception as e:
+            return e
+
+    writer = ResultWriter(args.output, fmt, engine.vocab)
+    batches = [todo[i:i + args.batch_size] for i in range(0, len(todo), args.batch_size)]
+    processed = failed = 0
+    t_start = last_report = time.perf_counter()
+
+    def run_batch(batch_paths, futures):
+        nonlocal processed, failed
+        loaded = [f.result() for f in futures]
+        ok = [(p, img) for p, img in zip(batch_paths, loaded) if not isinstance(img, Exception)]
+        rows = [{"path": p, "error": f"{type(img).__name__}: {img}"}
+                for p, img in zip(batch_paths, loaded) if isinstance(img, Exception)]
+        if ok:
+            probs = engine.predict_proba([img for _, img in ok])
+            for (p, _), row in zip(ok, probs):
+                rows.append({
+                    "path": p,
+                    "hair_type": engine.vocab[int(row.argmax())],
+                    "probabilities": {label: round(float(v), 6) for label, v in zip(engine.vocab, row)},
+                })
+        writer.write(rows)
+        processed += len(batch_paths)
+        failed += len(batch_paths) - len(ok)
+
+    pool = ThreadPoolExecutor(max_workers=max(1, args.workers), thread_name_prefix="decode")
+    try:
+        pending = deque()
+        for batch_paths in batches:
+            pending.append((batch_paths, [pool.submit(load, p) for p in batch_paths]))
+            while len(pending) > args.prefetch:
+                run_batch(*pending.popleft())
+                now = time.perf_counter()
+                if now - last_report >= args.report_every:
+                    last_report = now
+                    print(f"[Bulk] {processed}/{len(todo)} images, "
+                          f"{processed / (now - t_start):.1f} img/s")
+        while pending:
+            run_batch(*pending.popleft())
+    except KeyboardInterrupt:
+        print(f"\n[Bulk] Interrupted after {processed} images; re-run the same command to resume.",
+              file=sys.stderr)
+        sys.exit(130)
+    finally:
+        # Don't decode prefetched batches nobody will classify
+        pool.shutdown(wait=False, cancel_futures=True)
+        writer.close()
+
+    elapsed = time.perf_counter() - t_start
+    print(f"[Bulk] Done: {processed} images ({failed} failed) in {elapsed:.1f}s, "
+          f"{processed / elapsed:.1f} img/s -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
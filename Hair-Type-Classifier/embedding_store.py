@@ -0,0 +1,418 @@
+"""
+Memory-mapped store of hair-image embeddings, with exact and approximate
+(IVF) nearest-neighbour search.
+
+A store is a directory holding:
+
+    store.json   dimension and dtype, fixed when the store is created
+    vectors.bin  one L2-normalized row per image (float16 by default, so a
+                 million 512-d embeddings take 1 GB), memory-mapped and paged
+                 in by the OS on demand
+    meta.txt     one `<image id>\\t<JSON metadata>` line per row, in row order
+
+Rows are append-only and the metadata line count is the row count: the
+vector is written before its line, so a crash in between leaves at most
+an unreferenced vector that the next append overwrites. Appends hold an
+flock on the directory, so pre-fork workers can share one store; each
+process picks up the others' rows in `refresh()`.
+"""
+import json
+import math
+import os
+import threading
+from array import array
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends are only serialized within the process
+    fcntl = None
+
+STORE_INFO = "store.json"
+VECTORS_FILE = "vectors.bin"
+META_FILE = "meta.txt"
+LOCK_FILE = ".lock"
+DTYPES = ("float16", "float32")
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class EmbeddingStore:
+    """
+    Append-only embedding rows keyed by image id (the prediction cache key).
+
+    Adding an id that is already stored returns its existing row. Reads
+    (`row`, `vector`, `meta`, `vectors`) never take the file lock.
+    """
+
+    def __init__(self, directory: str, dim: int, dtype: str = "float16", initial_capacity: int = 4096):
+        if dtype not in DTYPES:
+            raise ValueError(f"Unknown embedding dtype {dtype!r}; expected one of {DTYPES}.")
+        os.makedirs(directory, exist_ok=True)
+        info_path = os.path.join(directory, STORE_INFO)
+        if os.path.isfile(info_path):
+            with open(info_path, "r", encoding="utf-8") as f:
+                info = json.load(f)
+            if info["dim"] != dim or info["dtype"] != dtype:
+                raise ValueError(
+                    f"Embedding store at {directory} holds {info['dim']}-d {info['dtype']} vectors, "
+                    f"not {dim}-d {dtype}; point EMBEDDINGS_DIR somewhere else."
+                )
+        else:
+            with open(info_path, "w", encoding="utf-8") as f:
+                json.dump({"dim": dim, "dtype": dtype}, f)
+
+        self.directory = directory
+        self.dim = int(dim)
+        self.dtype = np.dtype(dtype)
+        self.initial_capacity = max(1, int(initial_capacity))
+        self._row_bytes = self.dim * self.dtype.itemsize
+        self._vectors_path = os.path.join(directory, VECTORS_FILE)
+        self._meta_path = os.path.join(directory, META_FILE)
+        self._lock_path = os.path.join(directory, LOCK_FILE)
+
+        self._lock = threading.RLock()
+        self._keys: Dict[bytes, int] = {}
+        self._offsets = array("q")  # byte offset of each row's metadata line
+        self._meta_end = 0  # bytes of meta.txt parsed so far
+        self._mm: Optional[np.memmap] = None
+        self._reader = None
+        self._reader_pid = None
+        self.refresh()
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    @contextmanager
+    def _file_lock(self):
+        with open(self._lock_path, "a+b") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def refresh(self) -> int:
+        """Pick up rows appended since the last call (by any process); returns the row count."""
+        with self._lock:
+            try:
+                size = os.path.getsize(self._meta_path)
+            except FileNotFoundError:
+                size = 0
+            if size > self._meta_end:
+                with open(self._meta_path, "rb") as f:
+                    f.seek(self._meta_end)
+                    chunk = f.read(size - self._meta_end)
+                pos = self._meta_end
+                for line in chunk.splitlines(keepends=True):
+                    if not line.endswith(b"\n"):
+                        break  # another process is mid-write
+                    self._keys.setdefault(line[:line.index(b"\t")], len(self._offsets))
+                    self._offsets.append(pos)
+                    pos += len(line)
+                self._meta_end = pos
+            return len(self._offsets)
+
+    def _mapped(self, rows: int) -> Optional[np.memmap]:
+        """A mapping of vectors.bin that covers at least `rows` rows."""
+        if rows and (self._mm is None or self._mm.shape[0] < rows):
+            capacity = os.path.getsize(self._vectors_path) // self._row_bytes
+            self._mm = np.memmap(self._vectors_path, dtype=self.dtype, mode="r+", shape=(capacity, self.dim))
+        return self._mm
+
+    def _reserve(self, rows: int) -> None:
+        # Grow by doubling; sparse until written
+        size = os.path.getsize(self._vectors_path) if os.path.exists(self._vectors_path) else 0
+        capacity = size // self._row_bytes
+        if capacity < rows:
+            capacity = max(rows, 2 * capacity, self.initial_capacity)
+            with open(self._vectors_path, "ab") as f:
+                f.truncate(capacity * self._row_bytes)
+
+    def add_many(self, items: Sequence[Tuple[str, np.ndarray, Dict[str, Any]]]) -> List[int]:
+        """Store `(image_id, vector, metadata)` items; returns their rows."""
+        if not items:
+            return []
+        vectors = _normalize(np.stack([np.asarray(v).reshape(-1) for _, v, _ in items]))
+        if vectors.shape[1] != self.dim:
+            raise ValueError(f"Expected {self.dim}-d embeddings, got {vectors.shape[1]}-d.")
+        keys = []
+        for key, _, _ in items:
+            if "\t" in key or "\n" in key:
+                raise ValueError(f"Image ids cannot contain tabs or newlines: {key!r}")
+            keys.append(key.encode("utf-8"))
+
+        with self._lock, self._file_lock():
+            n = self.refresh()
+            rows: List[int] = []
+            new: Dict[bytes, int] = {}
+            lines: List[bytes] = []
+            picked: List[int] = []
+            for i, ((_, _, meta), key) in enumerate(zip(items, keys)):
+                row = self._keys.get(key, new.get(key))
+                if row is None:
+                    row = new[key] = n + len(lines)
+                    lines.append(key + b"\t" + json.dumps(meta, separators=(",", ":")).encode("utf-8") + b"\n")
+                    picked.append(i)
+                rows.append(row)
+            if lines:
+                self._reserve(n + len(lines))
+                self._mapped(n + len(lines))[n:n + len(lines)] = vectors[picked]
+                with open(self._meta_path, "ab") as f:
+                    f.write(b"".join(lines))
+                self.refresh()
+            return rows
+
+    def add(self, image_id: str, vector: np.ndarray, meta: Dict[str, Any]) -> int:
+        return self.add_many([(image_id, vector, meta)])[0]
+
+    def row(self, image_id: str) -> Optional[int]:
+        key = image_id.encode("utf-8")
+        row = self._keys.get(key)
+        if row is None and self.refresh():
+            row = self._keys.get(key)
+        return row
+
+    def vectors(self) -> np.ndarray:
+        """All stored rows as a (len, dim) memmap view (no copy)."""
+        with self._lock:
+            n = len(self._offsets)
+            mm = self._mapped(n)
+        return mm[:n] if n else np.empty((0, self.dim), dtype=self.dtype)
+
+    def vector(self, row: int) -> np.ndarray:
+        return np.asarray(self.vectors()[row], dtype=np.float32)
+
+    def meta(self, row: int) -> Dict[str, Any]:
+        """`{"image_id": ..., **metadata}` for a row."""
+        with self._lock:
+            if self._reader is None or self._reader_pid != os.getpid():
+                self._reader = open(self._meta_path, "rb")
+                self._reader_pid = os.getpid()
+            self._reader.seek(self._offsets[row])
+            line = self._reader.readline()
+        key, _, payload = line.rstrip(b"\n").partition(b"\t")
+        return {"image_id": key.decode("utf-8"), **json.loads(payload)}
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "rows": len(self),
+            "dim": self.dim,
+            "dtype": self.dtype.name,
+            "bytes": len(self) * self._row_bytes,
+        }
+
+
+def _top_k(ids: np.ndarray, scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    if len(scores) > k:
+        keep = np.argpartition(-scores, k - 1)[:k]
+        ids, scores = ids[keep], scores[keep]
+    order = np.lexsort((ids, -scores))
+    return ids[order], scores[order]
+
+
+class ExactIndex:
+    """
+    Brute-force cosine search: one pass over every stored vector, streamed
+    from the memmap in chunks so float16 rows are widened a chunk at a time.
+    """
+
+    name = "exact"
+
+    def __init__(self, store: EmbeddingStore, chunk_rows: int = 2048):
+        self.store = store
+        self.chunk_rows = chunk_rows
+
+    def search(self, query: np.ndarray, k: int = 5, exclude: Optional[int] = None) -> List[Tuple[int, float]]:
+        """Best `k` (row, cosine similarity) pairs, best first; `exclude` skips one row (the query image)."""
+        self.store.refresh()
+        vectors = self.store.vectors()
+        q = _normalize(query).reshape(-1)
+        want = k + (exclude is not None)
+        best_ids = np.empty(0, dtype=np.int64)
+        best_scores = np.empty(0, dtype=np.float32)
+        for start in range(0, len(vectors), self.chunk_rows):
+            chunk = np.asarray(vectors[start:start + self.chunk_rows], dtype=np.float32)
+            scores = chunk @ q
+            ids = np.arange(start, start + len(scores), dtype=np.int64)
+            best_ids, best_scores = _top_k(
+                np.concatenate([best_ids, ids]), np.concatenate([best_scores, scores]), want
+            )
+        return [(int(i), float(s)) for i, s in zip(best_ids, best_scores) if i != exclude][:k]
+
+    def stats(self) -> Dict[str, Any]:
+        return {"index": self.name, "rows": len(self.store)}
+
+
+class IVFIndex:
+    """
+    Inverted-file approximate search. Vectors are bucketed by their nearest
+    of `nlist` spherical k-means centroids (sqrt(rows) by default), and a
+    query only scores the buckets of its `nprobe` nearest centroids: about
+    1.6% of the store at 1M rows.
+
+    Below `min_train` rows the index answers exactly. Once the store
+    passes it, and again whenever it has grown 4x since, k-means is
+    retrained on a sample of `train_sample` rows in a background thread;
+    queries keep using the previous state (or exact search) meanwhile. Rows
+    appended after training are assigned to their nearest centroid in
+    `sync()`; until the bucket lists are rebuilt (every 5% growth) they are
+    scored on every query.
+    """
+
+    name = "ivf"
+
+    def __init__(
+        self,
+        store: EmbeddingStore,
+        nlist: Optional[int] = None,
+        nprobe: int = 16,
+        min_train: int = 20000,
+        train_sample: int = 65536,
+        iters: int = 8,
+        seed: int = 0,
+        background: bool = True,
+    ):
+        self.store = store
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.min_train = min_train
+        self.train_sample = train_sample
+        self.iters = iters
+        self.seed = seed
+        self.background = background
+        self._exact = ExactIndex(store)
+        self._lock = threading.Lock()
+        self._training = False
+        self._centroids: Optional[np.ndarray] = None
+        self._trained_on = 0
+        self._assign = np.empty(0, dtype=np.int32)
+        self._assigned = 0  # rows with a centroid
+        self._listed = 0  # rows in the bucket lists
+        self._order = np.empty(0, dtype=np.int64)
+        self._starts = np.zeros(1, dtype=np.int64)
+        self.trainings = 0
+
+    @staticmethod
+    def _nearest(x: np.ndarray, centroids: np.ndarray, chunk_rows: int = 16384) -> np.ndarray:
+        out = np.empty(len(x), dtype=np.int32)
+        for start in range(0, len(x), chunk_rows):
+            chunk = np.asarray(x[start:start + chunk_rows], dtype=np.float32)
+            out[start:start + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+        return out
+
+    def _fit(self) -> Tuple[np.ndarray, np.ndarray]:
+        vectors = self.store.vectors()
+        n = len(vectors)
+        nlist = self.nlist or int(min(4096, max(16, math.sqrt(n))))
+        rng = np.random.default_rng(self.seed)
+        sample = np.sort(rng.choice(n, size=min(n, max(self.train_sample, nlist)), replace=False))
+        x = np.asarray(vectors[sample], dtype=np.float32)
+        centroids = x[rng.choice(len(x), size=nlist, replace=False)].copy()
+        for _ in range(self.iters):
+            assign = self._nearest(x, centroids)
+            order = np.argsort(assign, kind="stable")
+            counts = np.bincount(assign, minlength=nlist)
+            filled = np.flatnonzero(counts)
+            starts = np.concatenate([[0], np.cumsum(counts)[:-1]])[filled]
+            # Empty clusters keep their previous centroid
+            centroids[filled] = _normalize(np.add.reduceat(x[order], starts, axis=0))
+        return centroids, self._nearest(vectors, centroids)
+
+    def train(self) -> None:
+        """Fit the centroids and bucket every stored row (blocking)."""
+        try:
+            centroids, assign = self._fit()
+            with self._lock:
+                self._centroids = centroids
+                self._trained_on = len(assign)
+                self._assign = assign
+                self._assigned = len(assign)
+                self._build_lists()
+                self.trainings += 1
+        finally:
+            self._training = False
+
+    def _build_lists(self) -> None:
+        assign = self._assign[:self._assigned]
+        self._order = np.argsort(assign, kind="stable").astype(np.int64)
+        counts = np.bincount(assign, minlength=len(self._centroids))
+        self._starts = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        self._listed = self._assigned
+
+    def sync(self) -> int:
+        """Assign new rows, rebuild the bucket lists or start training as needed; returns the row count."""
+        train_now = False
+        with self._lock:
+            n = self.store.refresh()
+            if (
+                not self._training
+                and n >= self.min_train
+                and (self._centroids is None or n >= 4 * self._trained_on)
+            ):
+                self._training = True
+                if self.background:
+                    threading.Thread(target=self.train, name="ivf-train", daemon=True).start()
+                else:
+                    train_now = True
+            elif self._centroids is not None and n > self._assigned:
+                new = self._nearest(self.store.vectors()[self._assigned:n], self._centroids)
+                if n > len(self._assign):
+                    grown = np.empty(max(n, 2 * len(self._assign)), dtype=np.int32)
+                    grown[:self._assigned] = self._assign[:self._assigned]
+                    self._assign = grown
+                self._assign[self._assigned:n] = new
+                self._assigned = n
+                if self._assigned - self._listed > max(1024, self._listed // 20):
+                    self._build_lists()
+        if train_now:
+            self.train()
+        return n
+
+    def search(self, query: np.ndarray, k: int = 5, exclude: Optional[int] = None) -> List[Tuple[int, float]]:
+        """Approximate best `k` (row, cosine similarity) pairs, best first."""
+        self.sync()
+        with self._lock:
+            centroids, order, starts = self._centroids, self._order, self._starts
+            listed, assigned = self._listed, self._assigned
+        if centroids is None:
+            return self._exact.search(query, k, exclude)
+        q = _normalize(query).reshape(-1)
+        nprobe = min(self.nprobe, len(centroids))
+        probe = np.argpartition(-(centroids @ q), nprobe - 1)[:nprobe]
+        candidates = np.concatenate(
+            [order[starts[c]:starts[c + 1]] for c in probe] + [np.arange(listed, assigned, dtype=np.int64)]
+        )
+        candidates.sort()  # sequential memmap reads
+        scores = np.asarray(self.store.vectors()[candidates], dtype=np.float32) @ q
+        ids, scores = _top_k(candidates, scores, k + (exclude is not None))
+        return [(int(i), float(s)) for i, s in zip(ids, scores) if i != exclude][:k]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "index": self.name,
+            "rows": len(self.store),
+            "trained_on": self._trained_on,
+            "training": self._training,
+            "nlist": 0 if self._centroids is None else len(self._centroids),
+            "nprobe": self.nprobe,
+            "trainings": self.trainings,
+        }
+
+
+def create_index(kind: str, store: EmbeddingStore, nprobe: int = 16):
+    if kind == "exact":
+        return ExactIndex(store)
+    if kind == "ivf":
+        return IVFIndex(store, nprobe=nprobe)
+    raise ValueError(f"Unknown similarity index {kind!r}; expected 'exact' or 'ivf'.")
@@ -0,0 +1,183 @@
+"""
+Export the fastai Learner to pickle-free weights, ONNX and frozen
+TorchScript for CPU serving.
+
+    python export_model.py [--model models/hair-resnet18-model.pkl] [--out models/export]
+
+Writes `weights.npz`, `model.onnx`, `model.ts` and `metadata.json` (vocab,
+preprocessing and, for the weights, the architecture spec; see
+model_weights.py) to --out. Each exported model is checked against eager
+PyTorch on examples/*.jpg plus random inputs; if any probability differs
+by more than --atol the export fails with exit code 1 and nothing is kept
+for it.
+
+Serve an export with INFERENCE_BACKEND=weights, torchscript or onnx. This
+is the only step that needs fastai and the pickle.
+"""
+import argparse
+import copy
+import glob
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import torch
+from PIL import Image
+
+from backends import (
+    EXPORT_FILES,
+    EXPORT_METADATA,
+    OnnxBackend,
+    ProbabilitiesModel,
+    TorchBackend,
+    TorchScriptBackend,
+    WeightsBackend,
+)
+from fastai_compat import load_fastai_learner
+from inference import InferenceEngine
+from model_weights import describe_model, save_weights
+
+
+def plain_torch_copy(model: torch.nn.Module) -> torch.nn.Module:
+    """
+    Copy of the fastai model that tracers can handle: fastai's Flatten
+    returns a TensorBase subclass, torch's nn.Flatten(1) does the same
+    reshape on plain tensors.
+    """
+    model = copy.deepcopy(model).eval()
+    for parent in model.modules():
+        for name, child in parent.named_children():
+            if type(child).__name__ == "Flatten" and not isinstance(child, torch.nn.Flatten):
+                if getattr(child, "full", False):
+                    raise ValueError("Full Flatten layers are not supported by the exporter.")
+                setattr(parent, name, torch.nn.Flatten(1))
+    return model
+
+
+def _calibration_batch(engine: InferenceEngine, image_dir: str, n_random: int) -> np.ndarray:
+    paths = sorted(glob.glob(os.path.join(image_dir, "*.jpg")))
+    imgs = [Image.open(p).convert("RGB") for p in paths]
+    rng = np.random.default_rng(0)
+    for _ in range(n_random):
+        imgs.append(Image.fromarray(rng.integers(0, 256, (300, 400, 3), dtype=np.uint8)))
+    batches = [engine.preprocess(imgs[i:i + engine.max_batch_size])
+               for i in range(0, len(imgs), engine.max_batch_size)]
+    return np.concatenate(batches)
+
+
+def export_torchscript(model, example, path):
+    with torch.no_grad():
+        traced = torch.jit.trace(model, example)
+        frozen = torch.jit.freeze(traced.eval())
+    torch.jit.save(frozen, path)
+
+
+def _export_onnx(model, example, path, opset):
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            example,
+            path,
+            input_names=["input"],
+            output_names=["probabilities"],
+            dynamic_axes={"input": {0: "batch"}, "probabilities": {0: "batch"}},
+            opset_version=opset,
+            do_constant_folding=True,
+        )
+
+
+def _max_diff(backend, x, reference):
+    # Batch of one as well as the full batch: checks the dynamic batch axis
+    full = np.abs(backend(x) - reference).max()
+    single = np.abs(backend(x[:1]) - reference[:1]).max()
+    return float(max(full, single))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=os.path.join("models", "hair-resnet18-model.pkl"))
+    parser.add_argument("--out", default=os.path.join("models", "export"))
+    parser.add_argument("--formats", default="weights,torchscript,onnx")
+    parser.add_argument("--atol", type=float, default=1e-4,
+                        help="max allowed |probability difference| vs eager PyTorch")
+    parser.add_argument("--opset", type=int, default=17)
+    parser.add_argument("--images", default="examples", help="folder of .jpg images used for validation")
+    parser.add_argument("--random-images", type=int, default=8)
+    args = parser.parse_args()
+
+    formats = [f.strip() for f in args.formats.split(",") if f.strip()]
+    unknown = set(formats) - set(EXPORT_FILES)
+    if unknown:
+        raise SystemExit(f"Unknown export format(s): {', '.join(sorted(unknown))}")
+
+    learn = load_fastai_learner(args.model)
+    engine = InferenceEngine.from_learner(learn)
+    x = _calibration_batch(engine, args.images, args.random_images)
+    reference = TorchBackend(learn.model)(x)
+
+    model = ProbabilitiesModel(plain_torch_copy(learn.model)).eval()
+    example = torch.from_numpy(x[:2].copy())
+    os.makedirs(args.out, exist_ok=True)
+
+    files, checks, failed = {}, {}, []
+    architecture = None
+    for fmt in formats:
+        path = os.path.join(args.out, EXPORT_FILES[fmt])
+        t0 = time.perf_counter()
+        if fmt == "weights":
+            architecture = describe_model(learn.model)
+            save_weights(learn.model, path)
+            backend = WeightsBackend(path, architecture)
+        elif fmt == "torchscript":
+            export_torchscript(model, example, path)
+            backend = TorchScriptBackend(path)
+        else:
+            _export_onnx(model, example, path, args.opset)
+            backend = OnnxBackend(path)
+        diff = _max_diff(backend, x, reference)
+        ok = diff <= args.atol
+        print(f"[Export] {fmt}: {path} in {time.perf_counter() - t0:.1f}s, "
+              f"max|dp| vs eager = {diff:.2e} ({'ok' if ok else 'FAILED'})")
+        if ok:
+            files[fmt] = EXPORT_FILES[fmt]
+            checks[fmt] = diff
+        else:
+            failed.append(fmt)
+            os.remove(path)
+
+    if failed:
+        print(f"[Export] Outputs differ from eager PyTorch beyond atol={args.atol} "
+              f"for: {', '.join(failed)}. Not writing metadata.", file=sys.stderr)
+        sys.exit(1)
+
+    meta_path = os.path.join(args.out, EXPORT_METADATA)
+    if os.path.isfile(meta_path):
+        # Keep formats exported earlier into the same folder
+        with open(meta_path, "r", encoding="utf-8") as f:
+            previous = json.load(f)
+        files = {**previous.get("files", {}), **files}
+        checks = {**previous.get("max_abs_diff", {}), **checks}
+        if architecture is None:
+            architecture = previous.get("architecture")
+
+    meta = {
+        "format_version": 1,
+        "source_model": os.path.basename(args.model),
+        "exported_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "torch_version": torch.__version__,
+        **engine.metadata(),
+        "files": files,
+        "atol": args.atol,
+        "max_abs_diff": checks,
+    }
+    if architecture is not None:
+        meta["architecture"] = architecture
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    print(f"[Export] Wrote {meta_path}")
+
+
+if __name__ == "__main__":
+    main()
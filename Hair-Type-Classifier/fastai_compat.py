@@ -0,0 +1,178 @@
+"""
+Everything needed to unpickle `hair-resnet18-model.pkl` with `load_learner`.
+
+The Learner was exported from a notebook with an older albumentations and a
+custom `AlbumentationsTransform`, so loading it on a current stack needs a
+few monkeypatches. Importing this module applies them; the serving code only
+imports it when it actually has to read the pickle.
+"""
+import os
+import sys
+import inspect
+import pathlib
+
+import numpy as np
+
+# ===== Albucore / Albumentations compatibility shim =====
+# Some environments install a version of `albucore`
+# that does not define `preserve_channel_dim`, but the
+# `albumentations` version used when we trained the model
+# still expects it to exist. We recreate it here BEFORE
+# importing albumentations so that the import does not fail.
+try:
+    import albucore.utils as _acu
+    from typing import Callable
+    import numpy as _np
+
+    if not hasattr(_acu, "preserve_channel_dim"):
+
+        def preserve_channel_dim(
+            func: Callable[..., _np.ndarray]
+        ) -> Callable[..., _np.ndarray]:
+            """
+            Backwards-compat shim for old Albumentations code that expects
+            `albucore.utils.preserve_channel_dim`. Newer albucore removed it,
+            so we provide a tiny version that keeps the image channel dims.
+            """
+
+            def wrapper(image: _np.ndarray, *args, **kwargs) -> _np.ndarray:
+                orig_ndim = image.ndim
+                result = func(image, *args, **kwargs)
+                # If the number of dimensions changed, try to restore channels
+                if result.ndim == orig_ndim:
+                    return result
+                if orig_ndim == 3 and result.ndim == 2:
+                    # e.g. (H, W, C) -> (H, W); put channels back
+                    return result[..., None]
+                return result
+
+            return wrapper
+
+        # Attach our shim to albucore.utils so Albumentations can import it
+        _acu.preserve_channel_dim = preserve_channel_dim  # type: ignore[attr-defined]
+except Exception:
+    # If albucore isn't present yet during install, just ignore.
+    # When it is finally imported the above will already be defined.
+    pass
+
+# NOW it is safe to import albumentations
+import albumentations as A
+from fastai.vision.all import load_learner, PILImage, RandTransform
+
+# =========================================================
+# 0) Windows PosixPath pickle compatibility
+# =========================================================
+
+if os.name == "nt":
+    # Map PosixPath objects from pickle to WindowsPath
+    pathlib.PosixPath = pathlib.WindowsPath  # type: ignore
+    print("[Patch] Mapped pathlib.PosixPath -> WindowsPath for pickle loading on Windows.")
+
+# =========================================================
+# 1) Albumentations compatibility patches
+# =========================================================
+
+def _ensure_fastai_albu_compat(cls):
+    """
+    Ensure attributes/methods expected by the pickled fastai+albumentations pipeline exist.
+    Implemented as safe no-ops/defaults so newer Albumentations works with older pickles.
+    """
+    # apply_to_images: legacy API some pickles expect
+    if not hasattr(cls, "apply_to_images"):
+        def _apply_to_images(self, *args, **kwargs):
+            return self(*args, **kwargs)
+        setattr(cls, "apply_to_images", _apply_to_images)
+
+    # replay_mode: flag used internally in older versions
+    if not hasattr(cls, "replay_mode"):
+        setattr(cls, "replay_mode", False)
+
+    # deterministic: also touched in some older flows
+    if not hasattr(cls, "deterministic"):
+        setattr(cls, "deterministic", False)
+
+
+try:
+    from albumentations.core.transforms_interface import BasicTransform
+
+    for name in dir(A):
+        obj = getattr(A, name)
+        if inspect.isclass(obj) and issubclass(obj, BasicTransform):
+            _ensure_fastai_albu_compat(obj)
+except Exception:
+    # Fallback: best-effort patch for anything callable
+    for name in dir(A):
+        obj = getattr(A, name)
+        if inspect.isclass(obj) and hasattr(obj, "__call__"):
+            _ensure_fastai_albu_compat(obj)
+
+# Also patch Compose to always have additional_targets
+if hasattr(A, "Compose"):
+    Compose = A.Compose
+    if not hasattr(Compose, "additional_targets"):
+        Compose.additional_targets = {}
+
+    _old_init = Compose.__init__
+
+    def _new_init(self, *args, **kwargs):
+        if "additional_targets" not in kwargs:
+            kwargs["additional_targets"] = {}
+        _old_init(self, *args, **kwargs)
+
+    Compose.__init__ = _new_init  # type: ignore
+    print("[Patch] Added default additional_targets = {} to Albumentations Compose.")
+
+
+# =========================================================
+# 1b) AlbumentationsTransform stub for unpickling
+# =========================================================
+
+class AlbumentationsTransform(RandTransform):
+    """
+    Minimal compatible version of the AlbumentationsTransform class
+    that was used when training/saving the Learner.
+
+    It's only needed so `load_learner` can find this symbol during unpickling.
+    We don't rely on it explicitly in this serving script.
+    """
+    split_idx, order = None, 2
+
+    def __init__(self, train_aug=None, valid_aug=None):
+        super().__init__()
+        self.train_aug = train_aug
+        self.valid_aug = valid_aug
+        self.idx = 0
+
+    def before_call(self, b, split_idx):
+        self.idx = split_idx
+
+    def encodes(self, img: PILImage):
+        # Defensive: if aug is missing, just return the image unchanged
+        if self.idx == 0 and self.train_aug is not None:
+            aug_img = self.train_aug(image=np.array(img))["image"]
+            return PILImage.create(aug_img)
+        if self.idx == 1 and self.valid_aug is not None:
+            aug_img = self.valid_aug(image=np.array(img))["image"]
+            return PILImage.create(aug_img)
+        return img
+
+
+# 🔑 IMPORTANT: register stub on __main__ so torch.load can find it
+sys.modules["__main__"].AlbumentationsTransform = AlbumentationsTransform
+
+
+# =========================================================
+# 2) Load the pickled Learner
+# =========================================================
+
+def load_fastai_learner(model_path: str):
+    if not os.path.isfile(model_path):
+        raise FileNotFoundError(
+            f"Model file not found at {model_path}. "
+            f"Make sure 'hair-resnet18-model.pkl' is inside the 'models' folder."
+        )
+
+    print(f"[Info] Loading model from: {model_path}")
+    learn = load_learner(model_path)
+    print("[Info] Model loaded successfully.")
+    return learn
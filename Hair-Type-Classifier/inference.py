@@ -0,0 +1,220 @@
+import threading
+import time
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+import torch
+from PIL import Image
+
+from backends import TorchBackend, load_export_metadata, load_exported_backend
+
+BACKEND_NAMES = ("torch", "weights", "torchscript", "onnx", "int8")
+
+IMAGENET_MEAN = (0.485, 0.456, 0.406)
+IMAGENET_STD = (0.229, 0.224, 0.225)
+
+
+def _valid_resize(learn) -> Tuple[Tuple[int, int], int]:
+    """
+    Find the validation-time resize of the exported Learner.
+
+    The model was trained with an AlbumentationsTransform whose `valid_aug`
+    is `A.Compose([A.Resize(sz, sz)])`, i.e. a plain cv2 squish-resize.
+    """
+    for tfm in learn.dls.after_item.fs:
+        valid_aug = getattr(tfm, "valid_aug", None)
+        for t in getattr(valid_aug, "transforms", []) or []:
+            if hasattr(t, "height") and hasattr(t, "width"):
+                return (int(t.height), int(t.width)), int(getattr(t, "interpolation", cv2.INTER_LINEAR))
+    raise ValueError("Could not find the validation Resize in the learner's item transforms.")
+
+
+def _normalize_stats(learn) -> Tuple[Sequence[float], Sequence[float]]:
+    for tfm in learn.dls.after_batch.fs:
+        if hasattr(tfm, "mean") and hasattr(tfm, "std"):
+            mean = torch.as_tensor(tfm.mean).detach().cpu().reshape(-1).tolist()
+            std = torch.as_tensor(tfm.std).detach().cpu().reshape(-1).tolist()
+            return mean, std
+    return IMAGENET_MEAN, IMAGENET_STD
+
+
+class InferenceEngine:
+    """
+    Lean inference path that bypasses fastai's `Learner.predict`.
+
+    Everything the learner does at validation time (resize, /255, normalize,
+    softmax) is captured once at load time; images then go straight from
+    PIL into preallocated uint8/float32 buffers and through `backend`
+    (see backends.py), e.g. the bare torch model under `torch.inference_mode`.
+
+    Set `on_stage` to a `(stage, seconds)` callable to time "preprocess"
+    and "forward" for every chunk; it costs nothing while left as None.
+    """
+
+    def __init__(
+        self,
+        backend: Callable[[np.ndarray], np.ndarray],
+        vocab: Sequence[Any],
+        size: Tuple[int, int] = (224, 224),
+        mean: Sequence[float] = IMAGENET_MEAN,
+        std: Sequence[float] = IMAGENET_STD,
+        interpolation: int = cv2.INTER_LINEAR,
+        max_batch_size: int = 8,
+    ):
+        self.backend = backend
+        self.vocab: List[str] = [str(v) for v in vocab]
+        self.height, self.width = size
+        self.interpolation = interpolation
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.mean = np.asarray(mean, dtype=np.float32).reshape(1, 3, 1, 1)
+        self.std = np.asarray(std, dtype=np.float32).reshape(1, 3, 1, 1)
+
+        # Reused for every call; guarded by the lock below
+        self._pixels = np.empty((self.max_batch_size, self.height, self.width, 3), dtype=np.uint8)
+        self._input = np.empty((self.max_batch_size, 3, self.height, self.width), dtype=np.float32)
+        self._lock = threading.Lock()
+        self.on_stage: Optional[Callable[[str, float], None]] = None
+
+    @classmethod
+    def from_learner(cls, learn, max_batch_size: int = 8) -> "InferenceEngine":
+        size, interpolation = _valid_resize(learn)
+        mean, std = _normalize_stats(learn)
+        return cls(
+            TorchBackend(learn.model),
+            learn.dls.vocab,
+            size=size,
+            mean=mean,
+            std=std,
+            interpolation=interpolation,
+            max_batch_size=max_batch_size,
+        )
+
+    @classmethod
+    def from_export(cls, export_dir: str, backend: str, max_batch_size: int = 8) -> "InferenceEngine":
+        """Engine over an artifact written by export_model.py; no fastai needed."""
+        meta = load_export_metadata(export_dir)
+        return cls(
+            load_exported_backend(backend, export_dir, meta),
+            meta["vocab"],
+            size=tuple(meta["size"]),
+            mean=meta["mean"],
+            std=meta["std"],
+            interpolation=int(meta.get("interpolation", cv2.INTER_LINEAR)),
+            max_batch_size=max_batch_size,
+        )
+
+    def metadata(self) -> dict:
+        """Preprocessing config, as stored next to exported models."""
+        return {
+            "vocab": self.vocab,
+            "size": [self.height, self.width],
+            "mean": self.mean.reshape(-1).tolist(),
+            "std": self.std.reshape(-1).tolist(),
+            "interpolation": self.interpolation,
+        }
+
+    def share_memory(self) -> None:
+        share = getattr(self.backend, "share_memory", None)
+        if share is not None:
+            share()
+
+    def _preprocess(self, imgs: Sequence[Image.Image]) -> np.ndarray:
+        n = len(imgs)
+        for i, img in enumerate(imgs):
+            arr = np.asarray(img.convert("RGB") if img.mode != "RGB" else img)
+            cv2.resize(arr, (self.width, self.height), dst=self._pixels[i], interpolation=self.interpolation)
+
+        x = self._input[:n]
+        np.copyto(x, self._pixels[:n].transpose(0, 3, 1, 2))
+        x /= 255
+        x -= self.mean
+        x /= self.std
+        return x
+
+    def _run(self, fn: Callable[[np.ndarray], Any], chunk: Sequence[Image.Image]) -> Any:
+        """`fn` over the preprocessed chunk, timing both stages when `on_stage` is set."""
+        on_stage = self.on_stage
+        if on_stage is None:
+            return fn(self._preprocess(chunk))
+        t0 = time.perf_counter()
+        x = self._preprocess(chunk)
+        t1 = time.perf_counter()
+        out = fn(x)
+        on_stage("preprocess", t1 - t0)
+        on_stage("forward", time.perf_counter() - t1)
+        return out
+
+    def preprocess(self, imgs: Sequence[Image.Image]) -> np.ndarray:
+        """Normalized NCHW float32 batch, as fed to the backend (a copy)."""
+        with self._lock:
+            return self._preprocess(imgs[:self.max_batch_size]).copy()
+
+    def predict_proba(self, imgs: Sequence[Image.Image]) -> np.ndarray:
+        """Class probabilities, shape (len(imgs), len(vocab))."""
+        out = []
+        with self._lock:
+            for start in range(0, len(imgs), self.max_batch_size):
+                chunk = imgs[start:start + self.max_batch_size]
+                out.append(self._run(self.backend, chunk))
+        if not out:
+            return np.empty((0, len(self.vocab)), dtype=np.float32)
+        return np.concatenate(out)
+
+    @property
+    def supports_embeddings(self) -> bool:
+        """True when the backend can also return penultimate-layer features (torch only)."""
+        return callable(getattr(self.backend, "embed", None))
+
+    @property
+    def embedding_dim(self) -> int:
+        if not self.supports_embeddings:
+            raise ValueError(f"The {getattr(self.backend, 'name', 'current')} backend does not expose embeddings.")
+        return int(self.backend.embedding_dim)
+
+    def predict_with_embeddings(self, imgs: Sequence[Image.Image]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Probabilities and penultimate-layer embeddings from the same forward
+        pass: shapes (len(imgs), len(vocab)) and (len(imgs), embedding_dim).
+        """
+        if not self.supports_embeddings:
+            raise ValueError(f"The {getattr(self.backend, 'name', 'current')} backend does not expose embeddings.")
+        probs, feats = [], []
+        with self._lock:
+            for start in range(0, len(imgs), self.max_batch_size):
+                chunk = imgs[start:start + self.max_batch_size]
+                p, f = self._run(self.backend.embed, chunk)
+                probs.append(p)
+                feats.append(f)
+        if not probs:
+            return (np.empty((0, len(self.vocab)), dtype=np.float32),
+                    np.empty((0, self.embedding_dim), dtype=np.float32))
+        return np.concatenate(probs), np.concatenate(feats)
+
+    def predict(self, img: Image.Image) -> Tuple[str, np.ndarray]:
+        probs = self.predict_proba([img])[0]
+        return self.vocab[int(probs.argmax())], probs
+
+
+def create_engine(
+    backend: str = "torch",
+    model_path: Optional[str] = None,
+    export_dir: Optional[str] = None,
+    max_batch_size: int = 8,
+) -> Tuple[InferenceEngine, Any]:
+    """
+    Build the engine for `backend` and return `(engine, learn)`.
+
+    Only the "torch" backend unpickles the fastai Learner (and so needs
+    fastai/albumentations); `learn` is None for the exported backends.
+    """
+    if backend not in BACKEND_NAMES:
+        raise ValueError(f"Unknown INFERENCE_BACKEND {backend!r}; expected one of {BACKEND_NAMES}.")
+    if backend == "torch":
+        from fastai_compat import load_fastai_learner
+
+        learn = load_fastai_learner(model_path)
+        return InferenceEngine.from_learner(learn, max_batch_size=max_batch_size), learn
+
+    print(f"[Info] Loading {backend} model from: {export_dir}")
+    return InferenceEngine.from_export(export_dir, backend, max_batch_size=max_batch_size), None
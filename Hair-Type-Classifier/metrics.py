@@ -0,0 +1,313 @@
+"""
+In-process metrics in the Prometheus text format (no client library or
+exporter needed; GET /metrics renders a `Registry`).
+
+Three kinds of metric, picked for what they cost on the hot path:
+
+  Histogram   fixed buckets; `observe()` is a bisect plus two additions
+              under an uncontended lock (well under a microsecond)
+  Counter     `inc()` under the same kind of lock (Gauge adds `dec()`)
+  Callback    a gauge or counter read at scrape time from state the app
+              already keeps (queue depths, cache hit counters, ...), so it
+              costs nothing per request
+
+    registry = Registry()
+    stage = registry.histogram("app_stage_seconds", "Time per stage.", labelnames=("stage",))
+    with stage.labels("decode").time():
+        ...
+    registry.gauge_callback("app_queue_depth", "Jobs waiting.", lambda: {("decode",): pool.queue_depth},
+                            labelnames=("queue",))
+    registry.render()
+"""
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+# Seconds; spans a cache hit (tens of microseconds) to a slow upstream call
+DEFAULT_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+Sample = Tuple[str, Dict[str, str], float]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(str(v))}"' for k, v in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Timer:
+    __slots__ = ("_child", "_t0")
+
+    def __init__(self, child: "_HistogramChild"):
+        self._child = child
+
+    def __enter__(self) -> "_Timer":
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._child.observe(time.perf_counter() - self._t0)
+
+
+class _HistogramChild:
+    __slots__ = ("_bounds", "_counts", "_sum", "_lock")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self._bounds = bounds
+        self._counts = [0] * (len(bounds) + 1)  # last slot: above every bound
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        i = bisect_left(self._bounds, value)  # first bound >= value, i.e. `le` semantics
+        with self._lock:
+            self._counts[i] += 1
+            self._sum += value
+
+    def time(self) -> _Timer:
+        """Context manager observing the wall time of its block, in seconds."""
+        return _Timer(self)
+
+    def snapshot(self) -> Tuple[List[int], float]:
+        with self._lock:
+            return list(self._counts), self._sum
+
+
+class _CounterChild:
+    __slots__ = ("_value", "_lock")
+
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self._value -= amount
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._default = self.labels()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values: str):
+        """The series for these label values (created on first use, then cached)."""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} takes labels {self.labelnames}, got {values}.")
+            with self._lock:
+                child = self._children.setdefault(tuple(str(v) for v in values), self._new_child())
+        return child
+
+    def _series(self) -> Iterator[Tuple[Dict[str, str], object]]:
+        for values, child in list(self._children.items()):
+            yield dict(zip(self.labelnames, values)), child
+
+    def samples(self) -> Iterator[Sample]:
+        raise NotImplementedError
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(float(b) for b in buckets))
+        super().__init__(name, help, labelnames)
+
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self._default.observe(value)
+
+    def time(self) -> _Timer:
+        return self._default.time()
+
+    def samples(self) -> Iterator[Sample]:
+        for labels, child in self._series():
+            counts, total = child.snapshot()
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                yield f"{self.name}_bucket", {**labels, "le": _format_value(bound)}, cumulative
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, cumulative
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self) -> _CounterChild:
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._default.inc(amount)
+
+    def samples(self) -> Iterator[Sample]:
+        for labels, child in self._series():
+            yield f"{self.name}_total", labels, child.value
+
+
+class Gauge(Counter):
+    """A value that goes up and down (`inc()` / `dec()`)."""
+
+    kind = "gauge"
+
+    def dec(self, amount: float = 1.0) -> None:
+        self._default.dec(amount)
+
+    def samples(self) -> Iterator[Sample]:
+        for labels, child in self._series():
+            yield self.name, labels, child.value
+
+
+CallbackValue = Union[float, Dict[Tuple[str, ...], float]]
+
+
+class Callback(_Metric):
+    """
+    Gauge or counter whose value is read from `fn` at scrape time. `fn`
+    returns a number, or `{label values: number}` when there are labels.
+    """
+
+    def __init__(self, name: str, help: str, fn: Callable[[], CallbackValue], kind: str = "gauge",
+                 labelnames: Sequence[str] = ()):
+        self.kind = kind
+        self.fn = fn
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+
+    def samples(self) -> Iterator[Sample]:
+        name = f"{self.name}_total" if self.kind == "counter" else self.name
+        try:
+            value = self.fn()
+        except Exception as e:
+            print(f"[Warn] Metric {self.name} could not be read: {e}")
+            return
+        if value is None:
+            return
+        if not isinstance(value, dict):
+            yield name, {}, float(value)
+            return
+        for values, v in value.items():
+            yield name, dict(zip(self.labelnames, values)), float(v)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        if any(m.name == metric.name for m in self._metrics):
+            raise ValueError(f"Metric {metric.name} is already registered.")
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        """`name` without the `_total` suffix; it is added on output."""
+        return self.register(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, help, labelnames))
+
+    def gauge_callback(self, name: str, help: str, fn: Callable[[], CallbackValue],
+                       labelnames: Sequence[str] = ()) -> Callback:
+        return self.register(Callback(name, help, fn, "gauge", labelnames))
+
+    def counter_callback(self, name: str, help: str, fn: Callable[[], CallbackValue],
+                         labelnames: Sequence[str] = ()) -> Callback:
+        return self.register(Callback(name, help, fn, "counter", labelnames))
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return next((m for m in self._metrics if m.name == name), None)
+
+    def render(self) -> str:
+        """Every metric in the Prometheus text exposition format (version 0.0.4)."""
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {_escape(metric.help)}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class InFlightMiddleware:
+    """
+    Pure ASGI middleware tracking HTTP requests currently being handled
+    (`in_flight` gauge) and finished ones by method, route and status
+    (`requests` counter). `route` maps a path to a bounded label (e.g.
+    "/similar/{image_id}"), or None to count it as "other", so ids in URLs
+    can't blow up the number of series.
+    """
+
+    def __init__(self, app, requests: Counter, in_flight: Gauge, route: Callable[[str], Optional[str]]):
+        self.app = app
+        self.requests = requests
+        self.in_flight = in_flight
+        self.route = route
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        self.in_flight.inc()
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            self.in_flight.dec()
+            route = self.route(scope.get("path", "")) or "other"
+            self.requests.labels(scope.get("method", ""), route, str(status)).inc()
@@ -0,0 +1,152 @@
+"""
+Background model loading and warmup for the serving apps.
+
+`ModelLoader.start()` loads the model on a background thread, so the server
+accepts connections (and answers liveness probes) straight away. It then
+runs synthetic forward passes at the production batch sizes. By the time
+the readiness probe passes, the allocator has grown, kernels are selected
+and the thread pools are up, so the first real request costs what every
+later one does.
+
+    model = ModelLoader(lambda: create_engine(...), on_loaded=..., warmup=...)
+    model.start()   # background load + warmup
+    model.load()    # or: load now, in this thread (e.g. before fork()); start() then only warms up
+
+States: pending -> loading -> loaded -> warming -> ready, or failed.
+"""
+import threading
+import time
+import traceback
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from PIL import Image
+
+
+class ModelLoader:
+    def __init__(
+        self,
+        load: Callable[[], Any],
+        on_loaded: Optional[Callable[[Any], None]] = None,
+        warmup: Optional[Callable[[List[Image.Image]], Any]] = None,
+        warmup_batch_sizes: Sequence[int] = (1,),
+        warmup_rounds: int = 3,
+        warmup_image_size: Tuple[int, int] = (480, 640),
+    ):
+        self._load = load
+        self._on_loaded = on_loaded
+        self._warmup = warmup
+        self.warmup_batch_sizes = [int(b) for b in warmup_batch_sizes if int(b) > 0]
+        self.warmup_rounds = max(0, int(warmup_rounds))
+        self.warmup_image_size = warmup_image_size
+
+        self.state = "pending"
+        self.error: Optional[str] = None
+        self.load_s: Optional[float] = None
+        self.warmup_s: Optional[float] = None
+        self.warmup_ms: Dict[int, List[float]] = {}
+        self._started_at = time.time()
+        self._lock = threading.Lock()
+        self._loaded = threading.Event()
+        self._done = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def loaded(self) -> bool:
+        """The model can serve requests (warmup may still be running)."""
+        return self.state in ("loaded", "warming", "ready")
+
+    @property
+    def ready(self) -> bool:
+        """Loaded and warmed up."""
+        return self.state == "ready"
+
+    def _fail(self, stage: str, e: BaseException) -> None:
+        self.error = f"{stage} failed: {type(e).__name__}: {e}"
+        self.state = "failed"
+        print(f"[Error] Model {self.error}")
+        traceback.print_exc()
+        self._loaded.set()
+        self._done.set()
+
+    def load(self) -> bool:
+        """Load in the calling thread (no warmup); waits if another thread is already loading."""
+        with self._lock:
+            if self.state != "pending":
+                owner = False
+            else:
+                self.state = "loading"
+                owner = True
+        if not owner:
+            self._loaded.wait()
+            return self.loaded
+
+        t0 = time.perf_counter()
+        try:
+            result = self._load()
+            if self._on_loaded is not None:
+                self._on_loaded(result)
+        except Exception as e:
+            self._fail("load", e)
+            return False
+        self.load_s = time.perf_counter() - t0
+        self.state = "loaded"
+        self._loaded.set()
+        print(f"[Info] Model loaded in {self.load_s:.2f}s.")
+        return True
+
+    def warm_up(self) -> bool:
+        """Synthetic forward passes at each warmup batch size; then the model is ready."""
+        if self.state != "loaded":
+            return self.ready
+        self.state = "warming"
+        t0 = time.perf_counter()
+        try:
+            if self._warmup is not None and self.warmup_rounds:
+                rng = np.random.default_rng(0)
+                h, w = self.warmup_image_size
+                for batch_size in self.warmup_batch_sizes:
+                    imgs = [Image.fromarray(rng.integers(0, 256, (h, w, 3), dtype=np.uint8))
+                            for _ in range(batch_size)]
+                    timings = self.warmup_ms.setdefault(batch_size, [])
+                    for _ in range(self.warmup_rounds):
+                        t = time.perf_counter()
+                        self._warmup(imgs)
+                        timings.append(round((time.perf_counter() - t) * 1000, 2))
+        except Exception as e:
+            self._fail("warmup", e)
+            return False
+        self.warmup_s = time.perf_counter() - t0
+        self.state = "ready"
+        self._done.set()
+        print(f"[Info] Model warmed up in {self.warmup_s:.2f}s "
+              f"(batch sizes {self.warmup_batch_sizes}, {self.warmup_rounds} rounds).")
+        return True
+
+    def _run(self) -> None:
+        if self.load():
+            self.warm_up()
+
+    def start(self) -> None:
+        """Load (unless already loaded) and warm up on a background thread."""
+        with self._lock:
+            if self._thread is not None or self.state in ("ready", "failed"):
+                return
+            self._thread = threading.Thread(target=self._run, name="model-loader", daemon=True)
+        self._thread.start()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until ready or failed; True when ready."""
+        self._done.wait(timeout)
+        return self.ready
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "ready": self.ready,
+            "load_s": None if self.load_s is None else round(self.load_s, 3),
+            "warmup_s": None if self.warmup_s is None else round(self.warmup_s, 3),
+            "warmup_ms": {str(b): t for b, t in self.warmup_ms.items()},
+            "uptime_s": round(time.time() - self._started_at, 1),
+            "error": self.error,
+        }
@@ -0,0 +1,145 @@
+"""
+Pickle-free model artifact: plain weights plus an architecture spec.
+
+`export_model.py --formats weights` converts the fastai Learner once. It
+writes the state dict as a NumPy `.npz` file (read with
+`allow_pickle=False`) and describes the network in `metadata.json` next to
+the vocab and preprocessing:
+
+    "architecture": {
+        "format_version": 1,
+        "body": "resnet18",                       # torchvision constructor
+        "head": [{"type": "AdaptiveConcatPool2d", "size": 1}, {"type": "Flatten"},
+                 {"type": "BatchNorm1d", ...}, {"type": "Linear", ...}, ...]
+    }
+
+`load_weights_model` rebuilds the same `Sequential(body, head)` with
+torch/torchvision alone, so INFERENCE_BACKEND=weights serves the eager
+model (embeddings included) without fastai, albumentations or the
+compatibility patches in fastai_compat.py.
+"""
+from typing import Any, Dict, List
+
+import numpy as np
+import torch
+from torch import nn
+
+ARCHITECTURE_VERSION = 1
+RESNET_BODIES = ("resnet18", "resnet34", "resnet50", "resnet101", "resnet152")
+
+
+class AdaptiveConcatPool2d(nn.Module):
+    """Max and average pooling, concatenated on the channel axis (as fastai's layer)."""
+
+    def __init__(self, size: int = 1):
+        super().__init__()
+        self.size = size
+        self.ap = nn.AdaptiveAvgPool2d(size)
+        self.mp = nn.AdaptiveMaxPool2d(size)
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        return torch.cat([self.mp(x), self.ap(x)], 1)
+
+
+def _resnet_body(name: str) -> nn.Sequential:
+    import torchvision
+
+    if name not in RESNET_BODIES:
+        raise ValueError(f"Unsupported body {name!r}; expected one of {RESNET_BODIES}.")
+    resnet = getattr(torchvision.models, name)(weights=None)
+    # fastai's cnn_learner cuts off avgpool + fc
+    return nn.Sequential(*list(resnet.children())[:-2])
+
+
+def _shapes(module: nn.Module) -> Dict[str, tuple]:
+    return {k: tuple(v.shape) for k, v in module.state_dict().items()}
+
+
+def describe_body(body: nn.Module) -> str:
+    """Name of the torchvision ResNet whose layers match `body` exactly."""
+    shapes = _shapes(body)
+    for name in RESNET_BODIES:
+        if _shapes(_resnet_body(name)) == shapes:
+            return name
+    raise ValueError("The model body does not match any torchvision ResNet; cannot write a weights artifact.")
+
+
+def describe_head(head: nn.Module) -> List[Dict[str, Any]]:
+    """Layer-by-layer spec of a fastai head (matched by class name, so fastai is not imported)."""
+    spec: List[Dict[str, Any]] = []
+    for layer in head.children():
+        kind = type(layer).__name__
+        if kind == "AdaptiveConcatPool2d":
+            spec.append({"type": kind, "size": layer.size})
+        elif kind == "Flatten":
+            if getattr(layer, "full", False):
+                raise ValueError("Full Flatten layers are not supported in a weights artifact.")
+            spec.append({"type": kind})
+        elif isinstance(layer, nn.BatchNorm1d):
+            spec.append({"type": "BatchNorm1d", "num_features": layer.num_features,
+                         "eps": layer.eps, "momentum": layer.momentum, "affine": layer.affine})
+        elif isinstance(layer, nn.Dropout):
+            spec.append({"type": "Dropout", "p": layer.p})
+        elif isinstance(layer, nn.Linear):
+            spec.append({"type": "Linear", "in_features": layer.in_features,
+                         "out_features": layer.out_features, "bias": layer.bias is not None})
+        elif isinstance(layer, nn.ReLU):
+            spec.append({"type": "ReLU"})
+        else:
+            raise ValueError(f"Unsupported head layer {kind}; cannot write a weights artifact.")
+    return spec
+
+
+def describe_model(model: nn.Module) -> Dict[str, Any]:
+    if not (isinstance(model, nn.Sequential) and len(model) == 2):
+        raise ValueError("Expected a fastai Sequential(body, head) model.")
+    return {
+        "format_version": ARCHITECTURE_VERSION,
+        "body": describe_body(model[0]),
+        "head": describe_head(model[1]),
+    }
+
+
+def _head_layer(layer: Dict[str, Any]) -> nn.Module:
+    kind = layer["type"]
+    if kind == "AdaptiveConcatPool2d":
+        return AdaptiveConcatPool2d(layer.get("size", 1))
+    if kind == "Flatten":
+        return nn.Flatten(1)
+    if kind == "BatchNorm1d":
+        return nn.BatchNorm1d(layer["num_features"], eps=layer["eps"], momentum=layer["momentum"],
+                              affine=layer["affine"])
+    if kind == "Dropout":
+        return nn.Dropout(layer["p"])
+    if kind == "Linear":
+        return nn.Linear(layer["in_features"], layer["out_features"], bias=layer["bias"])
+    if kind == "ReLU":
+        return nn.ReLU(inplace=True)
+    raise ValueError(f"Unknown head layer type {kind!r} in the weights artifact.")
+
+
+def build_model(architecture: Dict[str, Any]) -> nn.Sequential:
+    """Untrained `Sequential(body, head)` for an architecture spec."""
+    version = architecture.get("format_version", 1)
+    if version > ARCHITECTURE_VERSION:
+        raise ValueError(
+            f"Weights artifact format {version} is newer than this server supports "
+            f"({ARCHITECTURE_VERSION}); update the code or re-export."
+        )
+    head = nn.Sequential(*[_head_layer(layer) for layer in architecture["head"]])
+    return nn.Sequential(_resnet_body(architecture["body"]), head)
+
+
+def save_weights(model: nn.Module, path: str) -> None:
+    state = {k: v.detach().cpu().numpy() for k, v in model.state_dict().items()}
+    with open(path, "wb") as f:
+        np.savez(f, **state)
+
+
+def load_weights_model(path: str, architecture: Dict[str, Any]) -> nn.Sequential:
+    """Rebuild the model from an architecture spec and load `path` into it (strict)."""
+    model = build_model(architecture)
+    with np.load(path, allow_pickle=False) as data:
+        state = {k: torch.from_numpy(data[k]) for k in data.files}
+    model.load_state_dict(state, strict=True)
+    return model.eval()
@@ -0,0 +1,206 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Tuple
+
+
+class DiskCacheTier:
+    """
+    Optional second cache tier: one small JSON file per key, so a warm cache
+    survives restarts. Any object with the same `get` / `set` methods can be
+    plugged into PredictionCache instead (e.g. a Redis-backed tier). Both are
+    blocking; PredictionCache calls them from worker threads.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def get(self, key: str) -> Optional[Tuple[Any, float]]:
+        """Return `(value, stored_at)` or None."""
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                record = json.load(f)
+            return record["value"], float(record["stored_at"])
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def set(self, key: str, value: Any, stored_at: float) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Per thread: write-behind may store the same key twice at once
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"value": value, "stored_at": stored_at}, f)
+            # Atomic, so concurrent readers never see half a file
+            os.replace(tmp, path)
+        except OSError:
+            pass
+
+
+class PredictionCache:
+    """
+    Content-addressed LRU + TTL cache for predictions.
+
+    Keys are a SHA-256 of the uploaded bytes. The in-memory tier is bounded
+    both in entries and in (approximate, JSON-encoded) bytes; the oldest
+    entries are evicted first. Concurrent `get_or_compute` calls for the
+    same key are coalesced: only the first runs `compute`, the others await
+    its result.
+
+    The disk tier never blocks the event loop: lookups that miss in memory
+    read it in a worker thread, and `set` writes it behind, in the
+    background, once the value is already in memory.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        max_bytes: int = 16 * 2**20,
+        ttl_s: float = 3600.0,
+        disk_tier: Optional[DiskCacheTier] = None,
+        namespace: str = "",
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_s = ttl_s
+        self.disk_tier = disk_tier
+        self.namespace = namespace.encode("utf-8")
+
+        self._entries: "OrderedDict[str, Tuple[Any, float, int]]" = OrderedDict()
+        self._bytes = 0
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._writes: Set[asyncio.Future] = set()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def key(self, data: bytes) -> str:
+        h = hashlib.sha256(self.namespace)
+        h.update(b"\0")
+        h.update(data)
+        return h.hexdigest()
+
+    def _fresh(self, stored_at: float) -> bool:
+        return self.ttl_s <= 0 or time.time() - stored_at < self.ttl_s
+
+    def _get_memory(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, stored_at, size = entry
+            if self._fresh(stored_at):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._entries[key]
+            self._bytes -= size
+            self.expirations += 1
+        return None
+
+    async def get(self, key: str) -> Optional[Any]:
+        value = self._get_memory(key)
+        if value is not None or self.disk_tier is None:
+            return value
+
+        record = await asyncio.to_thread(self.disk_tier.get, key)
+        if record is not None and self._fresh(record[1]):
+            self._store(key, record[0], record[1])
+            self.disk_hits += 1
+            return record[0]
+        return None
+
+    def set(self, key: str, value: Any) -> None:
+        stored_at = time.time()
+        self._store(key, value, stored_at)
+        if self.disk_tier is None:
+            return
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            # No event loop to stall (scripts, tests)
+            self.disk_tier.set(key, value, stored_at)
+            return
+        write = asyncio.ensure_future(asyncio.to_thread(self.disk_tier.set, key, value, stored_at))
+        self._writes.add(write)
+        write.add_done_callback(self._writes.discard)
+
+    async def flush(self) -> None:
+        """Wait for the pending disk writes."""
+        if self._writes:
+            await asyncio.gather(*self._writes, return_exceptions=True)
+
+    def _store(self, key: str, value: Any, stored_at: float) -> None:
+        size = len(key) + len(json.dumps(value, separators=(",", ":")))
+        if size > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= old[2]
+        self._entries[key] = (value, stored_at, size)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            _, (_, _, evicted_size) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+            self.evictions += 1
+
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable[Any]]) -> Any:
+        if not self.enabled:
+            return await compute()
+
+        value = await self.get(key)
+        if value is not None:
+            return value
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.coalesced += 1
+            # shield: one waiter going away must not cancel the shared work
+            return await asyncio.shield(inflight)
+
+        self.misses += 1
+        task = asyncio.ensure_future(self._compute_and_store(key, compute))
+        # Mark a failure as retrieved even if every waiter has gone away
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        self._inflight[key] = task
+        return await asyncio.shield(task)
+
+    async def _compute_and_store(self, key: str, compute: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            value = await compute()
+            self.set(key, value)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "ttl_s": self.ttl_s,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "disk_tier": self.disk_tier is not None,
+            "pending_disk_writes": len(self._writes),
+        }
@@ -0,0 +1,434 @@
+"""
+Persistent product catalog shared by the FastAPI service and the Gradio app.
+
+Products live in a SQLite database (standard library only) with indexes on
+hair type, brand and actives. Each app keeps its products under its own
+`catalog` name. Every write bumps that catalog's version counter (via
+triggers, so writes from other processes count too). Recommenders never
+query SQLite per request. They read a `CatalogSnapshot`: an immutable
+in-memory copy of one catalog with lookup indexes, refreshed only when the
+version has moved. When products were only added, the new snapshot shares
+the previous one's data and only the new rows are read and indexed; any
+other change re-reads the catalog.
+
+    store = ProductStore("products.db")
+    store.seed("api", PRODUCT_CATALOG)        # only if the catalog is empty
+    store.add("api", {"name": ..., "hair_types": [...], "actives": [...]})
+    snap = store.snapshot("api")              # cheap; refreshes on change
+    snap.matching("curly")                    # product positions, catalog order
+"""
+import bisect
+import heapq
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "products.db")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS products (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    catalog TEXT NOT NULL,
+    name TEXT NOT NULL,
+    brand TEXT NOT NULL DEFAULT '',
+    score_boost REAL NOT NULL DEFAULT 0,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_products_catalog_brand ON products (catalog, brand COLLATE NOCASE);
+
+CREATE TABLE IF NOT EXISTS product_hair_types (
+    product_id INTEGER NOT NULL REFERENCES products (id) ON DELETE CASCADE,
+    hair_type TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_hair_types ON product_hair_types (hair_type, product_id);
+
+CREATE TABLE IF NOT EXISTS product_actives (
+    product_id INTEGER NOT NULL REFERENCES products (id) ON DELETE CASCADE,
+    active TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_actives ON product_actives (active, product_id);
+
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+
+CREATE TRIGGER IF NOT EXISTS products_version_insert AFTER INSERT ON products
+BEGIN
+    INSERT INTO meta (key, value) VALUES ('version:' || NEW.catalog, 1)
+    ON CONFLICT (key) DO UPDATE SET value = value + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS products_version_update AFTER UPDATE ON products
+BEGIN
+    INSERT INTO meta (key, value) VALUES ('version:' || NEW.catalog, 1)
+    ON CONFLICT (key) DO UPDATE SET value = value + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS products_version_delete AFTER DELETE ON products
+BEGIN
+    INSERT INTO meta (key, value) VALUES ('version:' || OLD.catalog, 1)
+    ON CONFLICT (key) DO UPDATE SET value = value + 1;
+END;
+"""
+
+
+def _key(value: str) -> str:
+    return " ".join(str(value).split()).casefold()
+
+
+def _boost_key(position: int, product: Dict[str, Any]) -> Tuple[float, float, int]:
+    return (-float(product.get("score_boost", 0.0)), random.random(), position)
+
+
+class _Prefix(Sequence):
+    """Read-only view of the first `n` items of an append-only list shared between snapshots."""
+
+    __slots__ = ("_items", "_n")
+
+    def __init__(self, items: list, n: int):
+        self._items = items
+        self._n = n
+
+    def __len__(self) -> int:
+        return self._n
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return self._items[slice(*i.indices(self._n))]
+        if i < 0:
+            i += self._n
+        if not 0 <= i < self._n:
+            raise IndexError("snapshot index out of range")
+        return self._items[i]
+
+    def __iter__(self) -> Iterator:
+        return islice(self._items, self._n)
+
+
+# Keys per chunk of a _SortedChunks
+_CHUNK = 512
+
+
+class _SortedChunks:
+    """
+    Sorted keys split into chunks of at most _CHUNK. `inserted(key)`
+    returns a new instance that shares every chunk but the one the key
+    lands in, so an insert copies one chunk plus the chunk list.
+    """
+
+    __slots__ = ("chunks", "maxes")
+
+    def __init__(self, keys: Sequence = ()):
+        self.chunks = [list(keys[i:i + _CHUNK]) for i in range(0, len(keys), _CHUNK)]
+        self.maxes = [chunk[-1] for chunk in self.chunks]
+
+    def inserted(self, key) -> "_SortedChunks":
+        new = _SortedChunks()
+        if not self.chunks:
+            new.chunks, new.maxes = [[key]], [key]
+            return new
+        c = min(bisect.bisect_left(self.maxes, key), len(self.chunks) - 1)
+        chunk = list(self.chunks[c])
+        bisect.insort(chunk, key)
+        new.chunks, new.maxes = list(self.chunks), list(self.maxes)
+        if len(chunk) > _CHUNK:
+            half = len(chunk) // 2
+            new.chunks[c:c + 1] = [chunk[:half], chunk[half:]]
+            new.maxes[c:c + 1] = [chunk[half - 1], chunk[-1]]
+        else:
+            new.chunks[c] = chunk
+            new.maxes[c] = chunk[-1]
+        return new
+
+    def head(self, limit: int) -> list:
+        out: list = []
+        for chunk in self.chunks:
+            if len(out) >= limit:
+                break
+            out.extend(chunk[:limit - len(out)])
+        return out
+
+
+class CatalogSnapshot:
+    """
+    Immutable view of one catalog at one store version.
+
+    `products` keeps insertion order. Index lookups return positions into
+    it: `matching(hair_type)` in catalog order, `by_brand` / `by_active` in
+    catalog order, and `top_by_boost(hair_types, limit)` by descending
+    `score_boost`, with ties in a random order fixed when a product is
+    first indexed.
+
+    `appended(version, products)` returns a newer snapshot that shares this
+    one's storage. The product list and the position lists only ever grow
+    at the end, and each snapshot reads them up to its own length, so an
+    append adds to them in place (amortized O(1) per product and index
+    entry) without older snapshots seeing it; `extends(older)` tells whether
+    two snapshots are related that way. The score_boost order is
+    copy-on-write in chunks: per added product and hair type, one chunk of
+    up to 512 keys and the list of chunk references are copied, i.e.
+    O(512 + n / 512) pointer copies rather than O(n).
+    """
+
+    def __init__(self, catalog: str, version: int, products: List[Dict[str, Any]]):
+        self.catalog = catalog
+        self.version = version
+        self._items: List[Dict[str, Any]] = list(products)
+        self._n = len(self._items)
+        self.products: Sequence[Dict[str, Any]] = _Prefix(self._items, self._n)
+
+        self._hair_types: Dict[str, List[int]] = {}
+        self._brands: Dict[str, List[int]] = {}
+        self._actives: Dict[str, List[int]] = {}
+        # (-score_boost, random tie-break, position) of every product, kept
+        # sorted overall and per hair type, so the best `limit` products
+        # over several hair types are a k-way merge of short prefixes.
+        by_boost: List[Tuple[float, float, int]] = []
+        boost_keys: Dict[str, List[Tuple[float, float, int]]] = {}
+        for i, p in enumerate(self._items):
+            key = _boost_key(i, p)
+            by_boost.append(key)
+            for t in {_key(t) for t in p.get("hair_types", [])}:
+                self._hair_types.setdefault(t, []).append(i)
+                boost_keys.setdefault(t, []).append(key)
+            self._index_text(i, p)
+        self._by_boost = _SortedChunks(sorted(by_boost))
+        self._boost_keys = {t: _SortedChunks(sorted(keys)) for t, keys in boost_keys.items()}
+
+    def _index_text(self, i: int, p: Dict[str, Any]) -> None:
+        self._brands.setdefault(_key(p.get("brand", "")), []).append(i)
+        for a in {_key(a) for a in p.get("actives", [])}:
+            self._actives.setdefault(a, []).append(i)
+
+    def appended(self, version: int, products: Sequence[Dict[str, Any]]) -> "CatalogSnapshot":
+        """This snapshot with `products` added at the end, as `version`; `self` is unchanged."""
+        if len(self._items) != self._n:
+            # Storage was already extended past this snapshot by another
+            # branch of history: start over from a private copy
+            return CatalogSnapshot(self.catalog, version, list(self.products) + list(products))
+
+        snap = object.__new__(CatalogSnapshot)
+        snap.catalog = self.catalog
+        snap.version = version
+        snap._items = self._items
+        snap._hair_types = self._hair_types
+        snap._brands = self._brands
+        snap._actives = self._actives
+        snap._by_boost = self._by_boost
+        snap._boost_keys = dict(self._boost_keys)
+        for p in products:
+            i = len(snap._items)
+            snap._items.append(p)
+            key = _boost_key(i, p)
+            snap._by_boost = snap._by_boost.inserted(key)
+            for t in {_key(t) for t in p.get("hair_types", [])}:
+                snap._hair_types.setdefault(t, []).append(i)
+                snap._boost_keys[t] = snap._boost_keys.get(t, _SortedChunks()).inserted(key)
+            snap._index_text(i, p)
+        snap._n = len(snap._items)
+        snap.products = _Prefix(snap._items, snap._n)
+        return snap
+
+    def extends(self, other: "CatalogSnapshot") -> bool:
+        """
+        True if this snapshot is `other` with zero or more products appended
+        (positions below `len(other)` mean the same products in both).
+        """
+        return self._items is other._items and self._n >= other._n
+
+    def _positions(self, table: Dict[str, List[int]], value: str) -> Sequence[int]:
+        positions = table.get(_key(value))
+        if not positions:
+            return ()
+        # Later snapshots may have appended positions past this one's end
+        return _Prefix(positions, bisect.bisect_left(positions, self._n))
+
+    def __len__(self) -> int:
+        return len(self.products)
+
+    def matching(self, hair_type: str) -> Sequence[int]:
+        return self._positions(self._hair_types, hair_type)
+
+    def by_brand(self, brand: str) -> Sequence[int]:
+        return self._positions(self._brands, brand)
+
+    def by_active(self, active: str) -> Sequence[int]:
+        return self._positions(self._actives, active)
+
+    def top_by_boost(self, hair_types: Sequence[str], limit: int) -> List[int]:
+        """Best `limit` products for any of `hair_types` by score_boost; all products if none match."""
+        lists = [self._boost_keys[k] for k in {_key(t) for t in hair_types} if k in self._boost_keys]
+        if not lists:
+            return [key[2] for key in self._by_boost.head(limit)]
+        out: List[int] = []
+        last = None
+        for key in heapq.merge(*(keys.head(limit) for keys in lists)):
+            if key != last:
+                out.append(key[2])
+                last = key
+                if len(out) == limit:
+                    break
+        return out
+
+
+class ProductStore:
+    """
+    SQLite-backed product store with cached, versioned snapshots.
+
+    `snapshot(catalog)` re-reads the version counter at most every
+    `refresh_interval_s` (0 = on every call) and refreshes the snapshot only
+    when it changed. Writes made through this store invalidate its
+    snapshots immediately.
+    """
+
+    def __init__(self, path: str = DEFAULT_DB_PATH, refresh_interval_s: float = 1.0):
+        self.path = path
+        self.refresh_interval_s = refresh_interval_s
+        self._lock = threading.RLock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        self._snapshots: Dict[str, CatalogSnapshot] = {}
+        self._checked_at: Dict[str, float] = {}
+        self._conn.executescript(_SCHEMA)
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        # A SQLite connection must not be used across fork(): pre-fork
+        # workers each open their own (snapshots are inherited as-is).
+        if self._db is None or self._pid != os.getpid():
+            self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA foreign_keys=ON")
+            self._pid = os.getpid()
+        return self._db
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None and self._pid == os.getpid():
+                self._db.close()
+            self._db = None
+
+    # ---------- writes ----------
+
+    def _insert(self, catalog: str, product: Dict[str, Any]) -> int:
+        cur = self._conn.execute(
+            "INSERT INTO products (catalog, name, brand, score_boost, data) VALUES (?, ?, ?, ?, ?)",
+            (
+                catalog,
+                product["name"],
+                product.get("brand", "").strip(),
+                float(product.get("score_boost", 0.0)),
+                json.dumps(product, ensure_ascii=False),
+            ),
+        )
+        product_id = cur.lastrowid
+        self._conn.executemany(
+            "INSERT INTO product_hair_types (product_id, hair_type) VALUES (?, ?)",
+            [(product_id, t) for t in {_key(t) for t in product.get("hair_types", [])}],
+        )
+        self._conn.executemany(
+            "INSERT INTO product_actives (product_id, active) VALUES (?, ?)",
+            [(product_id, a) for a in {_key(a) for a in product.get("actives", [])}],
+        )
+        return product_id
+
+    def add_many(self, catalog: str, products: Iterable[Dict[str, Any]]) -> List[int]:
+        """Insert products in one transaction; returns their ids."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                ids = [self._insert(catalog, p) for p in products]
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._checked_at.pop(catalog, None)
+            return ids
+
+    def add(self, catalog: str, product: Dict[str, Any]) -> int:
+        return self.add_many(catalog, [product])[0]
+
+    def delete(self, catalog: str, product_id: int) -> bool:
+        with self._lock:
+            cur = self._conn.execute("DELETE FROM products WHERE catalog = ? AND id = ?", (catalog, product_id))
+            self._checked_at.pop(catalog, None)
+            return cur.rowcount > 0
+
+    def seed(self, catalog: str, products: Iterable[Dict[str, Any]]) -> bool:
+        """Load `products` into `catalog` if it is empty (first run); True if it did."""
+        with self._lock:
+            if self.count(catalog):
+                return False
+            self.add_many(catalog, products)
+            return True
+
+    # ---------- reads ----------
+
+    def version(self, catalog: str) -> int:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (f"version:{catalog}",)).fetchone()
+        return row[0] if row else 0
+
+    def count(self, catalog: str) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM products WHERE catalog = ?", (catalog,)).fetchone()[0]
+
+    def _rows(self, sql: str, params: Tuple) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [{**json.loads(data), "id": product_id} for product_id, data in rows]
+
+    def find(
+        self,
+        catalog: str,
+        hair_type: Optional[str] = None,
+        brand: Optional[str] = None,
+        active: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """Indexed lookup straight from SQLite (admin / reporting use)."""
+        sql = "SELECT p.id, p.data FROM products p"
+        where, params = ["p.catalog = ?"], [catalog]
+        if hair_type is not None:
+            sql += " JOIN product_hair_types h ON h.product_id = p.id"
+            where.append("h.hair_type = ?")
+            params.append(_key(hair_type))
+        if active is not None:
+            sql += " JOIN product_actives a ON a.product_id = p.id"
+            where.append("a.active = ?")
+            params.append(_key(active))
+        if brand is not None:
+            where.append("p.brand = ? COLLATE NOCASE")
+            params.append(brand.strip())
+        return self._rows(f"{sql} WHERE {' AND '.join(where)} ORDER BY p.id", tuple(params))
+
+    def snapshot(self, catalog: str) -> CatalogSnapshot:
+        now = time.monotonic()
+        snap = self._snapshots.get(catalog)
+        if snap is not None and now - self._checked_at.get(catalog, -1e18) < self.refresh_interval_s:
+            return snap
+
+        with self._lock:
+            version = self.version(catalog)
+            snap = self._snapshots.get(catalog)
+            if snap is None or snap.version != version:
+                snap = self._load(catalog, snap, version)
+                self._snapshots[catalog] = snap
+            self._checked_at[catalog] = now
+            return snap
+
+    def _load(self, catalog: str, old: Optional[CatalogSnapshot], version: int) -> CatalogSnapshot:
+        # Every insert bumps the version once, so if the rows past `old`'s
+        # last id account for the whole version change, nothing else was
+        # updated or deleted and `old` can simply be extended with them.
+        if old is not None and version > old.version:
+            last_id = old.products[-1]["id"] if len(old) else 0
+            # "+catalog" keeps SQLite on the id range instead of scanning the
+            # whole catalog through the (catalog, brand) index
+            rows = self._rows(
+                "SELECT id, data FROM products WHERE +catalog = ? AND id > ? ORDER BY id", (catalog, last_id)
+            )
+            if len(rows) == version - old.version:
+                return old.appended(version, rows)
+        products = self._rows("SELECT id, data FROM products WHERE catalog = ? ORDER BY id", (catalog,))
+        return CatalogSnapshot(catalog, version, products)
@@ -0,0 +1,181 @@
+"""
+Opt-in per-request profiling for /predict.
+
+Off unless PROFILE_SAMPLE_RATE > 0 or PROFILE_TOKENS is set; app.py then
+keeps `profiler = None` and a request pays for one `is not None` check.
+
+A request is profiled when it is sampled (PROFILE_SAMPLE_RATE) or sends
+`X-Profile: <token>` with a token from PROFILE_TOKENS. Its decode, preprocess,
+forward pass and product ranking then run in one worker thread, unbatched
+and bypassing the prediction cache, under `cProfile` with `torch.profiler`
+around the forward pass. Each profile is written to its own directory under
+PROFILE_DIR, and only the newest PROFILE_MAX_FILES are kept:
+
+    <PROFILE_DIR>/20261017-101502-123456-ab12cd/
+        meta.json       request, image size, reason, per-stage timings (ms)
+        cprofile.pstats Python call profile (load with pstats / snakeviz)
+        torch_ops.json  per-operator CPU time from torch.profiler
+        torch_ops.txt   the same as a table
+
+`python summarize_profiles.py profiles/` aggregates them into a hot-spot report.
+Only one request is profiled at a time (cProfile is process-wide on
+Python 3.12+); others arriving meanwhile are served normally.
+"""
+import cProfile
+import json
+import os
+import random
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Sequence
+
+PROFILE_HEADER = "x-profile"
+
+
+class StageTimer:
+    """Wall time per named stage, in milliseconds."""
+
+    def __init__(self):
+        self.ms: Dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.ms[name] = round(self.ms.get(name, 0.0) + (time.perf_counter() - t0) * 1000, 3)
+
+
+class ProfileRun:
+    """One profiled request: cProfile while active, torch.profiler inside `torch_ops()`."""
+
+    def __init__(self, profiler: "RequestProfiler", reason: str):
+        self._owner = profiler
+        self.reason = reason
+        self.timer = StageTimer()
+        self.meta: Dict[str, Any] = {}
+        self._cprofile = cProfile.Profile()
+        self._torch = None
+
+    def __enter__(self) -> "ProfileRun":
+        self._started = time.time()
+        self._t0 = time.perf_counter()
+        self._cprofile.enable()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self._cprofile.disable()
+        self.timer.ms["total"] = round((time.perf_counter() - self._t0) * 1000, 3)
+        try:
+            if exc_type is None:
+                self._owner._save(self)
+        finally:
+            self._owner._release()
+
+    @contextmanager
+    def torch_ops(self) -> Iterator[None]:
+        """Record torch operator timings for the enclosed block (the forward pass)."""
+        if not self._owner.torch_profile:
+            yield
+            return
+        from torch.profiler import ProfilerActivity, profile
+
+        with profile(activities=[ProfilerActivity.CPU], record_shapes=True) as prof:
+            yield
+        self._torch = prof
+
+
+class RequestProfiler:
+    def __init__(
+        self,
+        directory: str,
+        sample_rate: float = 0.0,
+        tokens: Sequence[str] = (),
+        max_files: int = 50,
+        torch_profile: bool = True,
+    ):
+        self.directory = directory
+        self.sample_rate = max(0.0, min(1.0, float(sample_rate)))
+        self.tokens = frozenset(t for t in tokens if t)
+        self.max_files = max(1, int(max_files))
+        self.torch_profile = torch_profile
+        self._busy = threading.Lock()
+        self.profiled = 0
+        self.skipped_busy = 0
+        os.makedirs(directory, exist_ok=True)
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate > 0 or bool(self.tokens)
+
+    def reason(self, header_value: Optional[str]) -> Optional[str]:
+        """"header" or "sampled" when this request should be profiled, else None."""
+        if header_value is not None and header_value in self.tokens:
+            return "header"
+        if self.sample_rate and random.random() < self.sample_rate:
+            return "sampled"
+        return None
+
+    def start(self, reason: str) -> Optional[ProfileRun]:
+        """A ProfileRun to use as a context manager, or None if another request is being profiled."""
+        if not self._busy.acquire(blocking=False):
+            self.skipped_busy += 1
+            return None
+        return ProfileRun(self, reason)
+
+    def _release(self) -> None:
+        self._busy.release()
+
+    def _save(self, run: ProfileRun) -> None:
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(run._started))
+        name = f"{stamp}-{int(run._started * 1e6) % 1_000_000:06d}-{uuid.uuid4().hex[:6]}"
+        path = os.path.join(self.directory, name)
+        os.makedirs(path)
+        run._cprofile.dump_stats(os.path.join(path, "cprofile.pstats"))
+        if run._torch is not None:
+            averages = run._torch.key_averages()
+            ops = [
+                {
+                    "name": e.key,
+                    "count": e.count,
+                    "self_cpu_ms": round(e.self_cpu_time_total / 1000, 4),
+                    "cpu_ms": round(e.cpu_time_total / 1000, 4),
+                }
+                for e in averages
+            ]
+            with open(os.path.join(path, "torch_ops.json"), "w") as f:
+                json.dump(sorted(ops, key=lambda o: -o["self_cpu_ms"]), f, indent=1)
+            with open(os.path.join(path, "torch_ops.txt"), "w") as f:
+                f.write(averages.table(sort_by="self_cpu_time_total", row_limit=40))
+        meta = {
+            "time": run._started,
+            "reason": run.reason,
+            "timings_ms": run.timer.ms,
+            **run.meta,
+        }
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump(meta, f, indent=2)
+        self.profiled += 1
+        print(f"[Info] Profiled request ({run.reason}, {run.timer.ms['total']:.1f} ms) -> {path}")
+        self._rotate()
+
+    def _rotate(self) -> None:
+        runs = sorted(d for d in os.listdir(self.directory)
+                      if os.path.isfile(os.path.join(self.directory, d, "meta.json")))
+        for old in runs[:-self.max_files]:
+            shutil.rmtree(os.path.join(self.directory, old), ignore_errors=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "directory": self.directory,
+            "sample_rate": self.sample_rate,
+            "header_tokens": len(self.tokens),
+            "torch_profile": self.torch_profile,
+            "max_files": self.max_files,
+            "profiled": self.profiled,
+            "skipped_busy": self.skipped_busy,
+        }
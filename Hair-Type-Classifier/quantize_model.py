@@ -0,0 +1,169 @@
+"""
+Build an INT8 version of the hair classifier for CPU serving.
+
+    python quantize_model.py --mode static --calib examples [--out models/export]
+
+static   post-training static quantization (FX graph mode) of the ResNet18
+         body: conv/bn/relu are fused and run in INT8, activations are
+         calibrated on the images in --calib. The small fastai head stays fp32.
+dynamic  dynamic quantization of the Linear layers only. Cheap, but most of
+         ResNet18's time is in the convolutions, so expect a small gain.
+
+The result is saved as frozen TorchScript (`model-int8.ts`) next to the
+other exports and served with INFERENCE_BACKEND=int8. The script prints,
+and writes to `quantization_report.json`, the top-1 agreement with the
+fp32 model, the size on disk of both, and their latency / throughput, so
+each deployment can decide whether the accuracy trade-off is acceptable.
+"""
+import argparse
+import glob
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+import torch
+from PIL import Image
+
+from backends import EXPORT_METADATA, QUANTIZED_FILE, TorchBackend, TorchScriptBackend, ProbabilitiesModel
+from export_model import export_torchscript, plain_torch_copy
+from fastai_compat import load_fastai_learner
+from inference import InferenceEngine
+
+IMAGE_EXTENSIONS = ("*.jpg", "*.jpeg", "*.png", "*.webp")
+
+
+def _load_images(folder):
+    paths = []
+    for ext in IMAGE_EXTENSIONS:
+        paths += glob.glob(os.path.join(folder, "**", ext), recursive=True)
+    paths = sorted(paths)
+    if not paths:
+        raise SystemExit(f"No images found in {folder}.")
+    return paths, [Image.open(p).convert("RGB") for p in paths]
+
+
+def _batches(engine, imgs):
+    return [engine.preprocess(imgs[i:i + engine.max_batch_size])
+            for i in range(0, len(imgs), engine.max_batch_size)]
+
+
+def quantize_static(model, calib_batches):
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+    body, head = model[0], model[1]
+    example = (torch.from_numpy(calib_batches[0]),)
+    prepared = prepare_fx(body, get_default_qconfig_mapping(torch.backends.quantized.engine), example)
+    with torch.no_grad():
+        for x in calib_batches:
+            prepared(torch.from_numpy(x))
+    return torch.nn.Sequential(convert_fx(prepared), head).eval()
+
+
+def quantize_dynamic(model):
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8).eval()
+
+
+def _latency_ms(backend, x, repeats):
+    backend(x)
+    times = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        backend(x)
+        times.append((time.perf_counter() - t0) * 1000)
+    return float(np.median(times))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=os.path.join("models", "hair-resnet18-model.pkl"))
+    parser.add_argument("--out", default=os.path.join("models", "export"))
+    parser.add_argument("--mode", choices=("static", "dynamic"), default="static")
+    parser.add_argument("--calib", default="examples", help="folder of sample hair images for calibration")
+    parser.add_argument("--eval", default=None, help="folder used for the agreement report (default: --calib)")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    learn = load_fastai_learner(args.model)
+    engine = InferenceEngine.from_learner(learn, max_batch_size=args.batch_size)
+    _, calib_imgs = _load_images(args.calib)
+    _, eval_imgs = _load_images(args.eval or args.calib)
+    calib_batches = _batches(engine, calib_imgs)
+
+    fp32 = plain_torch_copy(learn.model)
+    t0 = time.perf_counter()
+    # FX fusion rewrites modules, so quantize a separate copy
+    to_quantize = plain_torch_copy(learn.model)
+    if args.mode == "static":
+        int8 = quantize_static(to_quantize, calib_batches)
+    else:
+        int8 = quantize_dynamic(to_quantize)
+    print(f"[Quantize] {args.mode} INT8 model built in {time.perf_counter() - t0:.1f}s")
+
+    os.makedirs(args.out, exist_ok=True)
+    int8_path = os.path.join(args.out, QUANTIZED_FILE)
+    example = torch.from_numpy(calib_batches[0][:2].copy())
+    export_torchscript(ProbabilitiesModel(int8).eval(), example, int8_path)
+
+    # Size on disk of the fp32 model in the same (TorchScript) format
+    with tempfile.TemporaryDirectory() as tmp:
+        fp32_path = os.path.join(tmp, "model-fp32.ts")
+        export_torchscript(ProbabilitiesModel(fp32).eval(), example, fp32_path)
+        fp32_size = os.path.getsize(fp32_path)
+    int8_size = os.path.getsize(int8_path)
+
+    fp32_backend = TorchBackend(learn.model)
+    int8_backend = TorchScriptBackend(int8_path)
+    eval_batches = _batches(engine, eval_imgs)
+    ref = np.concatenate([fp32_backend(x) for x in eval_batches])
+    out = np.concatenate([int8_backend(x) for x in eval_batches])
+    agreement = float((ref.argmax(1) == out.argmax(1)).mean())
+
+    single = eval_batches[0][:1]
+    batch = np.concatenate(eval_batches)[:args.batch_size]
+    fp32_ms = _latency_ms(fp32_backend, single, args.repeats)
+    int8_ms = _latency_ms(int8_backend, single, args.repeats)
+    fp32_ips = len(batch) / (_latency_ms(fp32_backend, batch, args.repeats) / 1000)
+    int8_ips = len(batch) / (_latency_ms(int8_backend, batch, args.repeats) / 1000)
+
+    report = {
+        "mode": args.mode,
+        "quantized_engine": torch.backends.quantized.engine,
+        "eval_images": len(eval_imgs),
+        "top1_agreement": round(agreement, 4),
+        "max_abs_prob_diff": round(float(np.abs(ref - out).max()), 4),
+        "size_mb": {"fp32": round(fp32_size / 2**20, 2), "int8": round(int8_size / 2**20, 2)},
+        "single_image_ms": {"fp32": round(fp32_ms, 2), "int8": round(int8_ms, 2)},
+        f"batch{len(batch)}_images_per_s": {"fp32": round(fp32_ips, 1), "int8": round(int8_ips, 1)},
+    }
+
+    print(f"[Quantize] top-1 agreement with fp32: {agreement:.1%} on {len(eval_imgs)} images")
+    print(f"[Quantize] size on disk: {report['size_mb']['fp32']} MB -> {report['size_mb']['int8']} MB")
+    print(f"[Quantize] 1-image latency: {fp32_ms:.2f} ms -> {int8_ms:.2f} ms "
+          f"({fp32_ms / int8_ms:.2f}x)")
+    print(f"[Quantize] batch-{len(batch)} throughput: {fp32_ips:.1f} -> {int8_ips:.1f} img/s "
+          f"({int8_ips / fp32_ips:.2f}x)")
+
+    with open(os.path.join(args.out, "quantization_report.json"), "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    # Register the INT8 model next to any other exports
+    meta_path = os.path.join(args.out, EXPORT_METADATA)
+    meta = {}
+    if os.path.isfile(meta_path):
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+    meta.update(engine.metadata())
+    meta.setdefault("format_version", 1)
+    meta.setdefault("files", {})["int8"] = QUANTIZED_FILE
+    meta["int8"] = {"mode": args.mode, "top1_agreement": report["top1_agreement"]}
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    print(f"[Quantize] Wrote {int8_path}; serve it with INFERENCE_BACKEND=int8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Vectorized product scoring for the API recommender.
+
+The catalog is compiled into a products x hair-type affinity matrix: 1.0
+where a product targets that hair type, `soft` (0.45) elsewhere. A
+prediction is scored against every product with one matrix-vector product
+over the full probability vector, so a 55% curly / 40% wavy photo favours
+products for both over products for curly alone. The top k come from
+`np.argpartition`, without sorting the whole catalog.
+"""
+import bisect
+import threading
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from product_store import CatalogSnapshot
+
+
+class AffinityIndex:
+    """
+    Affinity matrix for one label vocabulary, kept in sync with a catalog.
+
+    `sync(snapshot)` appends rows for products added since the last sync
+    when `snapshot` extends the synced one (storage grows by doubling, so
+    appends are amortized O(new products)); any other change, e.g. an update
+    or a deletion, rebuilds the matrix. Snapshots older than the last one
+    synced are ignored, so threads holding different versions don't rebuild
+    it back and forth.
+
+    The matrix is published together with the snapshot it was built for, as
+    one pair, and appends only write rows past the published ones. Readers
+    pass their own snapshot to `top_k`: if the published one extends it, the
+    first `len(snapshot)` rows are exactly its products; if not (the matrix
+    was rebuilt after a change the reader's snapshot predates), rows are
+    computed for that snapshot alone, so scores never land on the wrong
+    products.
+    """
+
+    def __init__(self, labels: Sequence[str], soft: float = 0.45):
+        self.labels = list(labels)
+        self.soft = soft
+        self._lock = threading.Lock()
+        self._matrix = np.empty((0, len(self.labels)), dtype=np.float32)
+        self._published: Tuple[np.ndarray, Optional[CatalogSnapshot]] = (self._matrix, None)
+        self.rebuilds = 0
+        self.stale_reads = 0
+
+    def __len__(self) -> int:
+        return len(self._published[0])
+
+    @property
+    def matrix(self) -> np.ndarray:
+        return self._published[0]
+
+    @property
+    def version(self) -> Optional[int]:
+        synced = self._published[1]
+        return None if synced is None else synced.version
+
+    def _rows(self, snapshot: CatalogSnapshot, start: int) -> np.ndarray:
+        rows = np.full((len(snapshot) - start, len(self.labels)), self.soft, dtype=np.float32)
+        for c, label in enumerate(self.labels):
+            matches = snapshot.matching(label)
+            # Positions are ascending: only the tail belongs to new products
+            lo = bisect.bisect_left(matches, start)
+            rows[np.asarray(matches[lo:], dtype=np.int64) - start, c] = 1.0
+        return rows
+
+    def sync(self, snapshot: CatalogSnapshot) -> None:
+        if snapshot is self._published[1]:
+            return
+        with self._lock:
+            synced = self._published[1]
+            if synced is not None and snapshot.version <= synced.version:
+                return
+            n = len(snapshot)
+            appended = synced is not None and snapshot.extends(synced)
+            start = len(synced) if appended else 0
+            new_rows = self._rows(snapshot, start)
+            if not appended:
+                self._matrix = new_rows
+                self.rebuilds += 1
+            elif n > self._matrix.shape[0]:
+                grown = np.empty((max(n, 2 * self._matrix.shape[0]), len(self.labels)), dtype=np.float32)
+                grown[:start] = self._matrix[:start]
+                grown[start:n] = new_rows
+                self._matrix = grown
+            else:
+                self._matrix[start:n] = new_rows
+            self._published = (self._matrix[:n], snapshot)
+
+    def matrix_for(self, snapshot: CatalogSnapshot) -> np.ndarray:
+        """Affinity rows of exactly `snapshot`'s products, in its order."""
+        matrix, synced = self._published
+        if synced is not None and synced.extends(snapshot):
+            return matrix[:len(snapshot)]
+        self.stale_reads += 1
+        return self._rows(snapshot, 0)
+
+    def scores(self, probs: np.ndarray, snapshot: CatalogSnapshot) -> np.ndarray:
+        """Affinity score in [0, 100] of every product in `snapshot` for a probability vector in `labels` order."""
+        return (self.matrix_for(snapshot) @ np.asarray(probs, dtype=np.float32)) * 100.0
+
+    def top_k(self, probs: np.ndarray, k: int, snapshot: CatalogSnapshot) -> Tuple[List[int], List[float]]:
+        """Positions in `snapshot` and scores of the k best products, best first (ties: catalog order)."""
+        scores = self.scores(probs, snapshot)
+        k = min(k, len(scores))
+        if k <= 0:
+            return [], []
+        if k < len(scores):
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.lexsort((top, -scores[top]))]
+        return top.tolist(), scores[top].tolist()
@@ -0,0 +1,137 @@
+"""
+Pre-fork serving mode for the Trichofy API.
+
+The parent process imports `app` and loads the model once, synchronously
+(albumentations patches, load_learner, inference engine), moves the model
+weights into shared memory and only then forks the uvicorn workers. Every worker maps the same weight pages instead
+of unpickling its own copy, so adding workers adds little RSS and no model
+load time.
+
+    python serve_prefork.py --workers 4 --threads-per-worker 2 --port 8000
+
+Each worker gets its own torch thread budget (default: CPUs / workers) so
+workers don't oversubscribe the machine. Crashed workers are re-forked from
+the parent, which still holds the loaded model. Each worker runs its own
+warmup passes at startup (app.py, MODEL_WARMUP_*) and reports ready on
+/readyz once they are done.
+"""
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+from typing import Dict
+
+
+def _bind_socket(host: str, port: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _run_worker(app_module, sock: socket.socket, threads: int, log_level: str) -> None:
+    import torch
+    import uvicorn
+
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        # Already fixed for this process; not fatal
+        pass
+
+    config = uvicorn.Config(app_module.app, log_level=log_level)
+    server = uvicorn.Server(config)
+    server.run(sockets=[sock])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", "2")))
+    parser.add_argument("--threads-per-worker", type=int, default=0,
+                        help="torch intra-op threads per worker (default: CPUs / workers)")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    workers = max(1, args.workers)
+    threads = args.threads_per_worker or max(1, (os.cpu_count() or 1) // workers)
+
+    # Load everything once, before forking. No forward pass may run in the
+    # parent: an initialised OpenMP pool does not survive fork().
+    t0 = time.perf_counter()
+    import app as app_module
+    if not app_module.model.load():
+        sys.exit(f"[Prefork] Model failed to load: {app_module.model.error}")
+    app_module.engine.share_memory()
+    print(f"[Prefork] Model loaded in parent in {time.perf_counter() - t0:.1f}s "
+          f"(weights in shared memory).")
+
+    # Objects created so far are never collected in the workers; keeping the
+    # GC away from them stops refcount/GC writes from un-sharing their pages.
+    gc.collect()
+    gc.freeze()
+
+    sock = _bind_socket(args.host, args.port)
+    children: Dict[int, int] = {}
+    stopping = False
+
+    def spawn(slot: int) -> None:
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            code = 0
+            try:
+                _run_worker(app_module, sock, threads, args.log_level)
+            except BaseException as e:
+                print(f"[Prefork] Worker {slot} crashed: {e}", file=sys.stderr)
+                code = 1
+            finally:
+                os._exit(code)
+        children[pid] = slot
+        print(f"[Prefork] Worker {slot} started (pid {pid}, {threads} torch threads).")
+
+    def shutdown(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
+
+    print(f"[Prefork] Listening on http://{args.host}:{args.port} with {workers} workers.")
+    for slot in range(workers):
+        spawn(slot)
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        slot = children.pop(pid, None)
+        if slot is None:
+            continue
+        if not stopping:
+            print(f"[Prefork] Worker {slot} (pid {pid}) exited with status {status}; restarting.")
+            time.sleep(0.5)
+            spawn(slot)
+
+    sock.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Hot-spot report over the request profiles written by profiling.py.
+
+    python summarize_profiles.py profiles/ [--top 25] [--sort tottime] [--since 2026-10-17]
+
+Prints, across every profile in the directory:
+  stages     p50 / p95 / max per stage (upload_read, decode, preprocess,
+             forward, recommend, total), plus image sizes seen
+  python     the merged cProfile stats, top --top functions by --sort
+  torch      operators by total self CPU time, summed over all profiles
+"""
+import argparse
+import io
+import json
+import os
+import pstats
+import statistics
+import time
+from collections import defaultdict
+from typing import Any, Dict, List
+
+STAGES = ("upload_read", "decode", "preprocess", "forward", "recommend", "total")
+
+
+def load_runs(directory: str, since: float = 0.0) -> List[Dict[str, Any]]:
+    runs = []
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        meta_path = os.path.join(path, "meta.json")
+        if not os.path.isfile(meta_path):
+            continue
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if meta.get("time", 0) < since:
+            continue
+        meta["path"] = path
+        runs.append(meta)
+    return runs
+
+
+def _pct(values: List[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def stage_report(runs: List[Dict[str, Any]]) -> str:
+    timings: Dict[str, List[float]] = defaultdict(list)
+    for run in runs:
+        for stage, ms in run.get("timings_ms", {}).items():
+            timings[stage].append(ms)
+    out = [f"{'stage':<12} {'n':>5} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9} {'share':>6}"]
+    total = statistics.median(timings["total"]) if timings.get("total") else 0.0
+    for stage in list(STAGES) + sorted(set(timings) - set(STAGES)):
+        values = timings.get(stage)
+        if not values:
+            continue
+        p50 = statistics.median(values)
+        share = f"{p50 / total:6.0%}" if total and stage != "total" else ""
+        out.append(f"{stage:<12} {len(values):>5} {p50:>9.2f} {_pct(values, 0.95):>9.2f} {max(values):>9.2f} {share:>6}")
+
+    sizes = defaultdict(int)
+    reasons = defaultdict(int)
+    for run in runs:
+        image = run.get("image") or {}
+        if image.get("size"):
+            sizes[f"{image.get('format')} {image['size'][0]}x{image['size'][1]}"] += 1
+        reasons[run.get("reason", "?")] += 1
+    out.append("")
+    out.append("profiles by reason: " + ", ".join(f"{k} {v}" for k, v in sorted(reasons.items())))
+    out.append("images: " + ", ".join(f"{k} ({v})" for k, v in sorted(sizes.items(), key=lambda kv: -kv[1])[:10]))
+    return "\n".join(out)
+
+
+def python_report(runs: List[Dict[str, Any]], sort: str, top: int) -> str:
+    files = [os.path.join(r["path"], "cprofile.pstats") for r in runs]
+    files = [f for f in files if os.path.isfile(f)]
+    if not files:
+        return "(no cProfile data)"
+    buf = io.StringIO()
+    stats = pstats.Stats(files[0], stream=buf)
+    for f in files[1:]:
+        stats.add(f)
+    stats.strip_dirs().sort_stats(sort).print_stats(top)
+    # Drop pstats' preamble (file list), keep the summary line and the table
+    lines = buf.getvalue().splitlines()
+    start = next((i for i, line in enumerate(lines) if "function calls" in line), 0)
+    return "\n".join(line for line in lines[start:] if line.strip())
+
+
+def torch_report(runs: List[Dict[str, Any]], top: int) -> str:
+    totals: Dict[str, Dict[str, float]] = defaultdict(lambda: {"count": 0, "self_cpu_ms": 0.0})
+    n = 0
+    for run in runs:
+        path = os.path.join(run["path"], "torch_ops.json")
+        if not os.path.isfile(path):
+            continue
+        n += 1
+        with open(path) as f:
+            for op in json.load(f):
+                totals[op["name"]]["count"] += op["count"]
+                totals[op["name"]]["self_cpu_ms"] += op["self_cpu_ms"]
+    if not n:
+        return "(no torch.profiler data)"
+    grand = sum(t["self_cpu_ms"] for t in totals.values()) or 1.0
+    out = [f"{'operator':<40} {'calls':>8} {'self ms/profile':>16} {'share':>6}"]
+    for name, t in sorted(totals.items(), key=lambda kv: -kv[1]["self_cpu_ms"])[:top]:
+        out.append(f"{name[:40]:<40} {t['count']:>8} {t['self_cpu_ms'] / n:>16.3f} {t['self_cpu_ms'] / grand:>6.1%}")
+    return "\n".join(out)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory", nargs="?", default="profiles")
+    parser.add_argument("--top", type=int, default=25)
+    parser.add_argument("--sort", default="tottime", help="pstats sort key: tottime, cumulative, ncalls, ...")
+    parser.add_argument("--since", help="only profiles from this date (YYYY-MM-DD) on")
+    args = parser.parse_args()
+
+    since = time.mktime(time.strptime(args.since, "%Y-%m-%d")) if args.since else 0.0
+    runs = load_runs(args.directory, since)
+    if not runs:
+        raise SystemExit(f"No profiles found in {args.directory}/.")
+
+    print(f"{len(runs)} profiles in {args.directory}/\n")
+    print("== stages ==")
+    print(stage_report(runs))
+    print(f"\n== python (cProfile, top {args.top} by {args.sort}) ==")
+    print(python_report(runs, args.sort, args.top))
+    print(f"\n== torch operators (top {args.top} by self CPU time) ==")
+    print(torch_report(runs, args.top))
+
+
+if __name__ == "__main__":
+    main()
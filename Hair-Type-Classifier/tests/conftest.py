@@ -0,0 +1,31 @@
+import os
+import sys
+
+import pytest
+
+# The service modules live flat in the project root
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+class FakeClock:
+    """Stands in for the `time` module; only moves when told to."""
+
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+
+@pytest.fixture
+def fake_clock(monkeypatch):
+    """TTLs and cooldowns in weather.py run on a clock the test controls."""
+    import weather
+
+    clock = FakeClock()
+    monkeypatch.setattr(weather, "time", clock)
+    return clock
@@ -0,0 +1,123 @@
+"""
+"Analyze & Recommend" in the Gradio app (../app(real).py) when clicks from
+differently signed-in sessions end up in one batch. Needs gradio; the model
+is replaced by a stub.
+"""
+import asyncio
+import importlib.util
+import os
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from PIL import Image
+
+gr = pytest.importorskip("gradio")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH = os.path.join(os.path.dirname(ROOT), "app(real).py")
+LABELS = ["Curly", "Dreadlocks", "Kinky", "Straight", "Wavy"]
+
+SIGNED_IN = {"logged_in": True, "role": "User", "name": "Ada"}
+SIGNED_OUT = {"logged_in": False, "role": None, "name": ""}
+PROVIDER = {"logged_in": True, "role": "Product Provider", "name": "Acme"}
+
+
+class StubEngine:
+    def predict_proba(self, imgs):
+        return np.tile(np.array([0.7, 0.05, 0.05, 0.05, 0.15], dtype=np.float32), (len(imgs), 1))
+
+
+@pytest.fixture(scope="module")
+def gapp(tmp_path_factory):
+    tmp = tmp_path_factory.mktemp("gradio-app")
+    env = {
+        "PRODUCT_DB_PATH": str(tmp / "products.db"),
+        # No model on disk: the background load fails fast; a stub stands in
+        "INFERENCE_BACKEND": "weights",
+        "MODEL_EXPORT_DIR": str(tmp / "no-export"),
+    }
+    saved = {k: os.environ.get(k) for k in env}
+    os.environ.update(env)
+    try:
+        spec = importlib.util.spec_from_file_location("gradio_app", APP_PATH)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    finally:
+        for k, v in saved.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
+    module.model._thread.join()
+    module.engine = StubEngine()
+    module.HAIR_LABELS[:] = LABELS
+    module.model = SimpleNamespace(loaded=True, state="ready", error=None)
+    yield module
+    module.product_store.close()
+
+
+def photo():
+    return Image.new("RGB", (64, 48), (120, 80, 40))
+
+
+def dependency(gapp, fn):
+    return next(d for d in gapp.demo.fns.values() if d.fn is fn)
+
+
+def run_clicks(gapp, auths):
+    """One click per session: the per-session check, then all of them in one batch."""
+    imgs = [photo() for _ in auths]
+    checked = [gapp.check_analysis(img, auth) for img, auth in zip(imgs, auths)]
+
+    async def batch():
+        try:
+            return await gapp.analyze_and_recommend_batch(imgs, [""] * len(auths), [c[3] for c in checked])
+        finally:
+            await gapp.batcher.stop()
+
+    summaries, _, _ = asyncio.run(batch())
+    # What each session ends up showing: the batch's answer, or the
+    # check's where the batch left it unchanged
+    return [
+        c[0] if s == gr.update() else s
+        for c, s in zip(checked, summaries)
+    ]
+
+
+def test_batched_step_reads_no_session_state(gapp):
+    check = dependency(gapp, gapp.check_analysis)
+    batched = dependency(gapp, gapp.analyze_and_recommend_batch)
+
+    assert not check.batch
+    assert any(block.stateful for block in check.inputs)
+    assert batched.batch
+    assert not any(block.stateful for block in batched.inputs)
+
+
+@pytest.mark.parametrize("auths", [
+    [SIGNED_OUT, SIGNED_IN],
+    [SIGNED_IN, SIGNED_OUT],
+    [PROVIDER, SIGNED_IN, SIGNED_OUT],
+], ids=["signed-out-first", "signed-in-first", "provider-first"])
+def test_sessions_with_different_auth_state_in_one_batch(gapp, auths):
+    shown = run_clicks(gapp, auths)
+
+    for auth, summary in zip(auths, shown):
+        if auth is SIGNED_IN:
+            assert summary.startswith("### Predicted hair type: **Curly**")
+        else:
+            assert summary.startswith("Please sign in as a **User**")
+
+
+def test_single_click_wrapper_checks_auth(gapp):
+    async def click(auth):
+        try:
+            return await gapp.analyze_and_recommend(photo(), "reduce frizz", auth)
+        finally:
+            await gapp.batcher.stop()
+
+    assert asyncio.run(click(SIGNED_OUT))[0].startswith("Please sign in")
+    summary, probs, _ = asyncio.run(click(SIGNED_IN))
+    assert summary.startswith("### Predicted hair type: **Curly**")
+    assert max(probs, key=probs.get) == "Curly"
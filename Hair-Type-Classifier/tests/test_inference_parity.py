@@ -0,0 +1,61 @@
+"""
+The lean InferenceEngine must give the same answer as fastai's
+`Learner.predict` on the example photos.
+
+Needs fastai and models/hair-resnet18-model.pkl; skipped otherwise.
+"""
+import glob
+import os
+
+import numpy as np
+import pytest
+from PIL import Image
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODEL_PATH = os.path.join(ROOT, "models", "hair-resnet18-model.pkl")
+EXAMPLES = sorted(glob.glob(os.path.join(ROOT, "examples", "*.jpg")))
+ATOL = 1e-5
+
+pytestmark = pytest.mark.skipif(not os.path.isfile(MODEL_PATH), reason=f"{MODEL_PATH} not found")
+
+
+@pytest.fixture(scope="module")
+def engine_and_learn():
+    pytest.importorskip("fastai")
+    from inference import create_engine
+
+    return create_engine("torch", model_path=MODEL_PATH)
+
+
+@pytest.fixture(scope="module")
+def examples():
+    assert EXAMPLES, "no example images in examples/"
+    return [Image.open(p).convert("RGB") for p in EXAMPLES]
+
+
+def learn_predict(learn, img):
+    from fastai.vision.all import PILImage
+
+    label, _, probs = learn.predict(PILImage.create(np.array(img)))
+    return str(label), probs.numpy()
+
+
+@pytest.mark.parametrize("index", range(len(EXAMPLES)), ids=[os.path.basename(p) for p in EXAMPLES])
+def test_single_image_matches_learn_predict(engine_and_learn, examples, index):
+    engine, learn = engine_and_learn
+    ref_label, ref_probs = learn_predict(learn, examples[index])
+
+    label, probs = engine.predict(examples[index])
+
+    assert label == ref_label
+    np.testing.assert_allclose(probs, ref_probs, atol=ATOL)
+
+
+def test_batch_matches_learn_predict(engine_and_learn, examples):
+    engine, learn = engine_and_learn
+    refs = [learn_predict(learn, img) for img in examples]
+
+    batch = engine.predict_proba(examples)
+
+    assert [engine.vocab[int(p.argmax())] for p in batch] == [label for label, _ in refs]
+    np.testing.assert_allclose(batch, np.stack([probs for _, probs in refs]), atol=ATOL)
@@ -0,0 +1,53 @@
+import asyncio
+import threading
+
+from prediction_cache import DiskCacheTier, PredictionCache
+
+
+class GatedDiskTier(DiskCacheTier):
+    """Disk tier whose reads and writes block until `gate` is set."""
+
+    def __init__(self, directory):
+        super().__init__(directory)
+        self.gate = threading.Event()
+
+    def get(self, key):
+        assert self.gate.wait(5)
+        return super().get(key)
+
+    def set(self, key, value, stored_at):
+        assert self.gate.wait(5)
+        super().set(key, value, stored_at)
+
+
+def test_disk_tier_does_not_block_the_event_loop(tmp_path):
+    async def main():
+        tier = GatedDiskTier(str(tmp_path))
+        cache = PredictionCache(disk_tier=tier)
+
+        async def compute():
+            return {"hair_type": "curly"}
+
+        lookup = asyncio.ensure_future(cache.get_or_compute("ab01", compute))
+        # The loop keeps running while the disk read is stuck
+        await asyncio.sleep(0.05)
+        assert not lookup.done()
+        tier.gate.set()
+        assert await lookup == {"hair_type": "curly"}
+        await cache.flush()
+        return cache
+
+    cache = asyncio.run(main())
+    assert cache.misses == 1
+
+    # A fresh cache finds the written-behind entry on disk
+    reloaded = PredictionCache(disk_tier=DiskCacheTier(str(tmp_path)))
+    assert asyncio.run(reloaded.get("ab01")) == {"hair_type": "curly"}
+    assert reloaded.disk_hits == 1
+
+
+def test_set_outside_an_event_loop_writes_through(tmp_path):
+    cache = PredictionCache(disk_tier=DiskCacheTier(str(tmp_path)))
+    cache.set("cd02", {"hair_type": "wavy"})
+
+    assert DiskCacheTier(str(tmp_path)).get("cd02")[0] == {"hair_type": "wavy"}
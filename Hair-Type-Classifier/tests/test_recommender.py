@@ -0,0 +1,102 @@
+import numpy as np
+import pytest
+
+from product_store import ProductStore
+from recommender import AffinityIndex
+
+LABELS = ["curly", "wavy", "straight"]
+CATALOG = "test"
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ProductStore(str(tmp_path / "products.db"), refresh_interval_s=0)
+    yield store
+    store.close()
+
+
+def product(name, *hair_types):
+    return {"name": name, "brand": "Test", "hair_types": list(hair_types)}
+
+
+def expected_top(snapshot, probs, k):
+    """Reference ranking computed straight from `snapshot`'s products."""
+    scored = []
+    for i, p in enumerate(snapshot.products):
+        row = [1.0 if label in p["hair_types"] else 0.45 for label in LABELS]
+        scored.append((-float(np.dot(row, probs)) * 100.0, i))
+    return [snapshot.products[i]["name"] for _, i in sorted(scored)[:k]]
+
+
+def names(snapshot, positions):
+    return [snapshot.products[i]["name"] for i in positions]
+
+
+def test_appends_extend_the_matrix(store):
+    store.add_many(CATALOG, [product("a", "curly"), product("b", "wavy")])
+    index = AffinityIndex(LABELS)
+    old = store.snapshot(CATALOG)
+    index.sync(old)
+
+    store.add(CATALOG, product("c", "straight"))
+    new = store.snapshot(CATALOG)
+    index.sync(new)
+
+    assert index.rebuilds == 1
+    assert index.version == new.version
+    probs = np.array([0.1, 0.1, 0.8], dtype=np.float32)
+    top, _ = index.top_k(probs, 3, new)
+    assert names(new, top) == expected_top(new, probs, 3)
+    # The older snapshot is served from the prefix of the shared matrix
+    top, _ = index.top_k(probs, 3, old)
+    assert names(old, top) == expected_top(old, probs, 3)
+    assert index.stale_reads == 0
+
+
+def test_delete_while_an_older_snapshot_is_in_use(store):
+    ids = store.add_many(CATALOG, [
+        product("curl cream", "curly"),
+        product("wave spray", "wavy"),
+        product("flat serum", "straight"),
+        product("curl gel", "curly"),
+    ])
+    index = AffinityIndex(LABELS)
+    old = store.snapshot(CATALOG)
+    index.sync(old)
+
+    # Another request deletes a product and syncs the rebuilt catalog
+    # while this one still holds `old`
+    store.delete(CATALOG, ids[0])
+    new = store.snapshot(CATALOG)
+    index.sync(new)
+    assert index.rebuilds == 2
+    index.sync(old)  # stale: ignored
+    assert index.version == new.version
+
+    probs = np.array([0.9, 0.05, 0.05], dtype=np.float32)
+    top, scores = index.top_k(probs, 2, old)
+    assert names(old, top) == ["curl cream", "curl gel"]
+    assert scores == pytest.approx([94.5, 94.5])
+    assert index.stale_reads == 1
+
+    top, _ = index.top_k(probs, 2, new)
+    assert names(new, top) == ["curl gel", "wave spray"]
+
+
+def test_update_rebuilds_the_matrix(store):
+    ids = store.add_many(CATALOG, [product("a", "curly"), product("b", "curly")])
+    index = AffinityIndex(LABELS)
+    index.sync(store.snapshot(CATALOG))
+
+    with store._lock:
+        store._conn.execute(
+            "UPDATE products SET data = json_set(data, '$.hair_types', json_array('wavy')) WHERE id = ?", (ids[1],)
+        )
+    new = store.snapshot(CATALOG)
+    index.sync(new)
+
+    assert index.rebuilds == 2
+    probs = np.array([0.0, 1.0, 0.0], dtype=np.float32)
+    top, scores = index.top_k(probs, 1, new)
+    assert names(new, top) == ["b"]
+    assert scores == pytest.approx([100.0])
@@ -0,0 +1,76 @@
+import pytest
+
+from product_store import ProductStore
+from text_search import BM25Index, tokenize
+
+CATALOG = "test"
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ProductStore(str(tmp_path / "products.db"), refresh_interval_s=0)
+    yield store
+    store.close()
+
+
+def product(name, description=""):
+    return {"name": name, "brand": "Test", "hair_types": ["curly"], "description": description}
+
+
+def test_tokenize_stems_and_drops_stopwords():
+    assert tokenize("Reduce the frizz and define my curls") == ["reduc", "frizz", "defin", "curl"]
+
+
+def test_search_ranks_matching_products():
+    index = BM25Index()
+    for p in [product("Argan oil"), product("Frizz control serum", "tames frizz"), product("Curl cream")]:
+        index.add(p)
+
+    hits = index.search("frizzy hair", limit=5)
+
+    assert [doc for doc, _ in hits] == [1]
+    assert index.score_docs("frizzy hair", [0, 1, 2, 7]) == pytest.approx([0.0, hits[0][1], 0.0, 0.0])
+
+
+def test_older_snapshot_is_scored_after_appends(store):
+    store.add_many(CATALOG, [product("Curl cream"), product("Frizz serum")])
+    index = BM25Index()
+    old = store.snapshot(CATALOG)
+    index.sync(old)
+
+    store.add(CATALOG, product("Frizz shield spray"))
+    new = store.snapshot(CATALOG)
+    index.sync(new)
+
+    assert index.rebuilds == 1
+    scores = index.score_docs("frizz", [0, 1], old)
+    assert scores[0] == 0.0 and scores[1] > 0
+    # The product appended after `old` is outside it
+    assert [doc for doc, _ in index.search("frizz", 5, old)] == [1]
+    assert sorted(doc for doc, _ in index.search("frizz", 5, new)) == [1, 2]
+
+
+def test_delete_while_an_older_snapshot_is_in_use(store):
+    ids = store.add_many(CATALOG, [product("Curl cream"), product("Frizz serum"), product("Shine oil")])
+    index = BM25Index()
+    old = store.snapshot(CATALOG)
+    index.sync(old)
+
+    # Another request deletes a product and syncs the rebuilt catalog
+    # while this one still holds `old`
+    store.delete(CATALOG, ids[0])
+    new = store.snapshot(CATALOG)
+    index.sync(new)
+    index.sync(old)  # stale: ignored
+    assert index.rebuilds == 2
+    assert index.version == new.version
+
+    # Doc 1 is "Frizz serum" in `old` but "Shine oil" in the rebuilt index
+    assert index.score_docs("frizz", [1, 2], old) is None
+    assert index.search("frizz", 5, old) is None
+
+    # A fresh snapshot matches again
+    fresh = store.snapshot(CATALOG)
+    scores = index.score_docs("frizz", [0, 1], fresh)
+    assert [fresh.products[0]["name"], fresh.products[1]["name"]] == ["Frizz serum", "Shine oil"]
+    assert scores[0] > 0 and scores[1] == 0.0
@@ -0,0 +1,141 @@
+import asyncio
+
+import pytest
+
+from weather import WeatherCache, WeatherError
+
+TTL_S = 600.0
+STALE_TTL_S = 3600.0
+
+
+class FakeFetch:
+    """Upstream stand-in: counts calls, can be held open, can fail."""
+
+    def __init__(self):
+        self.calls = 0
+        self.fail = False
+        self.release = None
+
+    async def __call__(self, city, country):
+        self.calls += 1
+        if self.release is not None:
+            await self.release.wait()
+        if self.fail:
+            raise WeatherError({"error": "Weather API returned an error.", "status_code": 503})
+        return {"city": city, "version": self.calls}
+
+
+def make_cache(fetch):
+    return WeatherCache(fetch, ttl_s=TTL_S, stale_ttl_s=STALE_TTL_S)
+
+
+async def settle():
+    """Let background refreshes run to completion."""
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_fresh_hit_skips_upstream(fake_clock):
+    async def main():
+        fetch = FakeFetch()
+        cache = make_cache(fetch)
+        first = await cache.get("Johannesburg", "ZA")
+        fake_clock.advance(TTL_S - 1)
+        again = await cache.get("johannesburg", "za")
+        return fetch, cache, first, again
+
+    fetch, cache, first, again = asyncio.run(main())
+    assert again is first
+    assert fetch.calls == 1
+    assert (cache.misses, cache.hits) == (1, 1)
+
+
+def test_location_spellings_share_an_entry(fake_clock):
+    async def main():
+        fetch = FakeFetch()
+        cache = make_cache(fetch)
+        await cache.get(" cape  town", "za")
+        await cache.get("Cape Town", "ZA ")
+        return fetch
+
+    assert asyncio.run(main()).calls == 1
+
+
+def test_concurrent_misses_share_one_call(fake_clock):
+    async def main():
+        fetch = FakeFetch()
+        fetch.release = asyncio.Event()
+        cache = make_cache(fetch)
+        pending = asyncio.gather(*(cache.get("Nairobi", "KE") for _ in range(10)))
+        await settle()
+        fetch.release.set()
+        return fetch, cache, await pending
+
+    fetch, cache, results = asyncio.run(main())
+    assert fetch.calls == 1
+    assert all(r is results[0] for r in results)
+    assert (cache.misses, cache.coalesced) == (1, 9)
+
+
+def test_stale_value_is_served_while_exactly_one_refresh_runs(fake_clock):
+    async def main():
+        fetch = FakeFetch()
+        cache = make_cache(fetch)
+        old = await cache.get("Lagos", "NG")
+
+        fake_clock.advance(TTL_S + 1)
+        fetch.release = asyncio.Event()
+        # The refresh is held open: every caller gets the stale value meanwhile
+        stale = await asyncio.gather(*(cache.get("Lagos", "NG") for _ in range(10)))
+        await settle()
+        assert all(s is old for s in stale)
+        assert fetch.calls == 2
+        assert cache.refreshes == 1
+        assert cache.stats()["in_flight"] == 1
+
+        fetch.release.set()
+        await settle()
+        return fetch, cache, old, await cache.get("Lagos", "NG")
+
+    fetch, cache, old, refreshed = asyncio.run(main())
+    assert refreshed["version"] == 2 and refreshed is not old
+    assert fetch.calls == 2
+    assert cache.stale_hits == 10
+    assert cache.stats()["in_flight"] == 0
+
+
+def test_failed_refresh_keeps_serving_stale(fake_clock):
+    async def main():
+        fetch = FakeFetch()
+        cache = make_cache(fetch)
+        old = await cache.get("Accra", "GH")
+
+        fake_clock.advance(TTL_S + 1)
+        fetch.fail = True
+        served = await cache.get("Accra", "GH")
+        await settle()
+        after = await cache.get("Accra", "GH")
+        await settle()
+        return fetch, cache, old, served, after
+
+    fetch, cache, old, served, after = asyncio.run(main())
+    assert served is old and after is old
+    # Each stale hit with no refresh running starts one; both failed
+    assert fetch.calls == 3
+    assert cache.refresh_errors == 2
+    assert cache.stale_hits == 2
+
+
+def test_entry_past_the_stale_window_is_a_miss(fake_clock):
+    async def main():
+        fetch = FakeFetch()
+        cache = make_cache(fetch)
+        await cache.get("Cairo", "EG")
+        fake_clock.advance(TTL_S + STALE_TTL_S + 1)
+        fetch.fail = True
+        with pytest.raises(WeatherError):
+            await cache.get("Cairo", "EG")
+        return cache
+
+    cache = asyncio.run(main())
+    assert cache.misses == 2
@@ -0,0 +1,207 @@
+import asyncio
+
+import httpx
+import pytest
+
+from weather import CircuitBreaker, CircuitOpenError, WeatherClient, WeatherError
+
+COOLDOWN_S = 30.0
+OK_BODY = {
+    "name": "Durban",
+    "main": {"temp": 24.5, "feels_like": 25.1, "humidity": 78},
+    "weather": [{"main": "Clouds", "description": "broken clouds", "icon": "04d"}],
+}
+
+
+class Upstream:
+    """MockTransport handler; `respond` decides each answer."""
+
+    def __init__(self):
+        self.calls = 0
+        self.respond = lambda request: httpx.Response(200, json=OK_BODY)
+
+    def __call__(self, request):
+        self.calls += 1
+        return self.respond(request)
+
+
+def make_client(upstream, threshold=2):
+    client = WeatherClient(
+        "dummy",
+        url="http://weather.test/data/2.5/weather",
+        breaker=CircuitBreaker(failure_threshold=threshold, cooldown_s=COOLDOWN_S),
+    )
+    # Same transport for the whole test; fetch() creates nothing else
+    client._client = httpx.AsyncClient(transport=httpx.MockTransport(upstream))
+    return client
+
+
+def fetch(client):
+    return asyncio.run(client.fetch("Durban", "ZA"))
+
+
+def test_ok_response_is_parsed():
+    upstream = Upstream()
+    client = make_client(upstream)
+
+    assert fetch(client) == {
+        "city": "Durban",
+        "temp": 24.5,
+        "feels_like": 25.1,
+        "humidity": 78,
+        "condition": "Clouds",
+        "description": "broken clouds",
+        "icon": "04d",
+    }
+    request_params = {}
+
+    def capture(request):
+        request_params.update(request.url.params)
+        return httpx.Response(200, json=OK_BODY)
+
+    upstream.respond = capture
+    fetch(client)
+    assert request_params == {"q": "Durban,ZA", "appid": "dummy", "units": "metric"}
+
+
+def test_breaker_opens_half_opens_and_closes(fake_clock):
+    upstream = Upstream()
+    client = make_client(upstream, threshold=2)
+    breaker = client.breaker
+    upstream.respond = lambda request: httpx.Response(503, text="down")
+
+    for _ in range(2):
+        with pytest.raises(WeatherError) as exc:
+            fetch(client)
+        assert exc.value.payload["status_code"] == 503
+    assert breaker.state == "open"
+    assert breaker.opens == 1
+
+    # Open: refused without calling upstream
+    with pytest.raises(CircuitOpenError) as exc:
+        fetch(client)
+    assert upstream.calls == 2
+    assert breaker.rejected == 1
+    assert exc.value.payload["retry_after"] == COOLDOWN_S
+
+    # Half-open: one trial call; it succeeds and closes the circuit
+    fake_clock.advance(COOLDOWN_S)
+    assert breaker.state == "half_open"
+    upstream.respond = lambda request: httpx.Response(200, json=OK_BODY)
+    assert fetch(client)["city"] == "Durban"
+    assert breaker.state == "closed"
+    assert breaker.failures == 0
+    assert upstream.calls == 3
+
+
+def test_failed_trial_reopens_the_circuit(fake_clock):
+    upstream = Upstream()
+    client = make_client(upstream, threshold=1)
+    upstream.respond = lambda request: httpx.Response(500)
+
+    with pytest.raises(WeatherError):
+        fetch(client)
+    fake_clock.advance(COOLDOWN_S)
+    with pytest.raises(WeatherError) as exc:
+        fetch(client)
+
+    assert not isinstance(exc.value, CircuitOpenError)
+    assert client.breaker.state == "open"
+    assert client.breaker.opens == 2
+    with pytest.raises(CircuitOpenError):
+        fetch(client)
+    assert upstream.calls == 2
+
+
+def test_half_open_lets_a_single_trial_through(fake_clock):
+    upstream = Upstream()
+    client = make_client(upstream, threshold=1)
+    upstream.respond = lambda request: httpx.Response(500)
+    with pytest.raises(WeatherError):
+        fetch(client)
+    fake_clock.advance(COOLDOWN_S)
+
+    async def concurrent():
+        release = asyncio.Event()
+
+        async def slow_ok(request):
+            await release.wait()
+            return httpx.Response(200, json=OK_BODY)
+
+        # Async handler: the trial stays in flight until released
+        client._client = httpx.AsyncClient(transport=httpx.MockTransport(slow_ok))
+        calls = [asyncio.ensure_future(client.fetch("Durban", "ZA")) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        release.set()
+        return await asyncio.gather(*calls, return_exceptions=True)
+
+    results = asyncio.run(concurrent())
+    assert sum(isinstance(r, dict) for r in results) == 1
+    assert sum(isinstance(r, CircuitOpenError) for r in results) == 2
+    assert client.breaker.state == "closed"
+
+
+@pytest.mark.parametrize("status, counts", [(429, True), (502, True), (404, False), (401, False)])
+def test_which_status_codes_count_as_failures(status, counts):
+    upstream = Upstream()
+    client = make_client(upstream, threshold=5)
+    upstream.respond = lambda request: httpx.Response(status, text="nope")
+
+    with pytest.raises(WeatherError) as exc:
+        fetch(client)
+
+    assert exc.value.payload == {"error": "Weather API returned an error.", "status_code": status, "details": "nope"}
+    assert client.breaker.failures == (1 if counts else 0)
+
+
+def test_timeout_maps_to_weather_error():
+    upstream = Upstream()
+    client = make_client(upstream)
+
+    def timeout(request):
+        raise httpx.ReadTimeout("read timed out", request=request)
+
+    upstream.respond = timeout
+    with pytest.raises(WeatherError) as exc:
+        fetch(client)
+
+    assert exc.value.payload["error"] == "Weather service timed out."
+    assert isinstance(exc.value.__cause__, httpx.TimeoutException)
+    assert client.breaker.failures == 1
+
+
+def test_transport_error_maps_to_weather_error():
+    upstream = Upstream()
+    client = make_client(upstream)
+
+    def refused(request):
+        raise httpx.ConnectError("connection refused", request=request)
+
+    upstream.respond = refused
+    with pytest.raises(WeatherError) as exc:
+        fetch(client)
+
+    assert exc.value.payload["error"] == "Failed to reach weather service."
+    assert client.breaker.failures == 1
+
+
+@pytest.mark.parametrize("body", [
+    b"{}",
+    b"not json",
+    b"[]",
+    b'{"main": null, "weather": []}',
+    b'{"main": {"temp": 20, "feels_like": 19, "humidity": 50}, "weather": []}',
+], ids=["empty", "not-json", "list", "null-main", "no-weather"])
+def test_unparseable_body_counts_as_upstream_failure(body):
+    upstream = Upstream()
+    client = make_client(upstream, threshold=2)
+    upstream.respond = lambda request: httpx.Response(200, content=body)
+
+    with pytest.raises(WeatherError) as exc:
+        fetch(client)
+    assert exc.value.payload == {"error": "Weather API returned an unexpected response."}
+    assert client.breaker.failures == 1
+
+    with pytest.raises(WeatherError):
+        fetch(client)
+    assert client.breaker.state == "open"
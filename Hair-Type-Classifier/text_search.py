@@ -0,0 +1,272 @@
+"""
+Tokenized BM25 search over product text, for free-text hair goals.
+
+"reduce frizz and define curls" is split into terms ("reduc", "frizz",
+"defin", "curl") that are matched against an inverted index over each
+product's name, description and actives. Each term is scored with BM25;
+name and actives terms count more than description terms. Products are
+added one at a time, so provider additions update the index in place.
+"""
+import bisect
+import math
+import re
+import threading
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have i in into is it its my of on or so that the "
+    "to too very want with without me more less hair".split()
+)
+
+# Longest suffix first; the stem must keep at least 3 characters
+_SUFFIXES = ("ations", "ation", "ness", "ing", "ies", "ed", "es", "er", "s", "y", "e")
+
+
+def stem(word: str) -> str:
+    for suffix in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            word = word[: -len(suffix)]
+            break
+    return word
+
+
+def tokenize(text: str) -> List[str]:
+    return [stem(t) for t in _TOKEN_RE.findall(text.casefold()) if t not in STOPWORDS]
+
+
+class _IndexView:
+    """
+    The index as published after one update. Readers take `index._view`
+    once and use only that, so a concurrent append or rebuild can't hand
+    them half-updated state. Postings and doc lengths are shared with later
+    views of the same build (they only grow at the end); `n` bounds what
+    this view may see. `snapshot` is the catalog snapshot it was synced to
+    (None when built with `add`).
+    """
+
+    __slots__ = ("postings", "doc_len", "n", "total_len", "arrays", "doc_len_array", "snapshot")
+
+    def __init__(
+        self,
+        postings: Dict[str, List[Tuple[int, float]]],
+        doc_len: List[float],
+        total_len: float,
+        arrays: Dict[str, Tuple[np.ndarray, np.ndarray]],
+        snapshot=None,
+    ):
+        self.postings = postings
+        self.doc_len = doc_len
+        self.n = len(doc_len)
+        self.total_len = total_len
+        # NumPy copies of postings, shared by the views of one build and
+        # filled lazily by `search`
+        self.arrays = arrays
+        self.doc_len_array: Optional[np.ndarray] = None
+        self.snapshot = snapshot
+
+    @property
+    def avg_len(self) -> float:
+        return self.total_len / self.n if self.n else 1.0
+
+    def term(self, term: str) -> Optional[Tuple[List[Tuple[int, float]], int]]:
+        """The postings of `term` and how many of them belong to this view (its df)."""
+        postings = self.postings.get(term)
+        if not postings:
+            return None
+        df = len(postings)
+        if df and postings[-1][0] >= self.n:
+            df = bisect.bisect_left(postings, (self.n, -math.inf))
+        return (postings, df) if df else None
+
+
+class BM25Index:
+    """
+    Inverted index with BM25 scoring and per-field weights.
+
+    Documents are identified by their position, added in order with `add`.
+    Postings are per-term lists of `(doc, weighted term frequency)` in doc
+    order. `search` only touches documents that share a term with the
+    query, vectorized over NumPy copies of the postings that are refreshed
+    lazily after appends. `score_docs` scores a given candidate list by binary search in
+    the postings, so its cost does not depend on the catalog size. Terms
+    found in more than `max_df` of a large index carry almost no BM25 weight
+    and are skipped.
+
+    Writes (`add`, `sync`) are serialized and publish a new `_IndexView` in
+    one assignment; reads take no lock. Readers that pass their catalog
+    snapshot get None instead of scores when the index no longer matches it
+    (it was rebuilt after an update or deletion that snapshot predates):
+    doc numbers would then point at other products, so the caller should
+    take a fresh snapshot and ask again.
+    """
+
+    def __init__(
+        self,
+        field_weights: Dict[str, float] = None,
+        k1: float = 1.2,
+        b: float = 0.75,
+        max_df: float = 0.5,
+    ):
+        self.field_weights = field_weights or {"name": 2.0, "actives": 1.5, "description": 1.0}
+        self.k1 = k1
+        self.b = b
+        self.max_df = max_df
+        self._view = _IndexView({}, [], 0.0, {})
+        self._lock = threading.Lock()
+        self.rebuilds = 0
+
+    def __len__(self) -> int:
+        return self._view.n
+
+    @property
+    def version(self) -> Optional[int]:
+        snapshot = self._view.snapshot
+        return None if snapshot is None else snapshot.version
+
+    def _fields(self, product: Dict) -> Iterable[Tuple[str, str]]:
+        for field in self.field_weights:
+            value = product.get(field, "")
+            if isinstance(value, (list, tuple)):
+                value = " ".join(str(v) for v in value)
+            yield field, str(value or "")
+
+    def _index(self, postings: Dict[str, List[Tuple[int, float]]], doc_len: List[float], product: Dict) -> float:
+        doc = len(doc_len)
+        tf: Dict[str, float] = {}
+        length = 0.0
+        for field, text in self._fields(product):
+            weight = self.field_weights[field]
+            for term in tokenize(text):
+                tf[term] = tf.get(term, 0.0) + weight
+                length += weight
+        for term, freq in tf.items():
+            postings.setdefault(term, []).append((doc, freq))
+        doc_len.append(length)
+        return length
+
+    def add(self, product: Dict) -> int:
+        """Index one product (name / description / actives); returns its doc number."""
+        with self._lock:
+            view = self._view
+            total = view.total_len + self._index(view.postings, view.doc_len, product)
+            self._view = _IndexView(view.postings, view.doc_len, total, view.arrays)
+            return view.n
+
+    def sync(self, snapshot) -> None:
+        """
+        Follow a product_store.CatalogSnapshot: if it extends the one last
+        synced, the products appended since are added; any other change
+        rebuilds the index. Snapshots older than the last one synced are
+        ignored, so concurrent readers on different versions don't rebuild
+        it back and forth.
+        """
+        if snapshot is self._view.snapshot:
+            return
+        with self._lock:
+            view = self._view
+            synced = view.snapshot
+            if synced is not None and snapshot.version <= synced.version:
+                return
+            if synced is not None and snapshot.extends(synced):
+                postings, doc_len, total, arrays = view.postings, view.doc_len, view.total_len, view.arrays
+            else:
+                postings, doc_len, total, arrays = {}, [], 0.0, {}
+                self.rebuilds += 1
+            for product in snapshot.products[len(doc_len):]:
+                total += self._index(postings, doc_len, product)
+            self._view = _IndexView(postings, doc_len, total, arrays, snapshot)
+
+    def _view_for(self, snapshot) -> Optional[Tuple[_IndexView, int]]:
+        """The current view and how many of its docs `snapshot` has; None if it doesn't match `snapshot`."""
+        view = self._view
+        if snapshot is None:
+            return view, view.n
+        if view.snapshot is not None and view.snapshot.extends(snapshot):
+            return view, len(snapshot)
+        return None
+
+    def _idf(self, df: int, n: int) -> float:
+        return math.log(1.0 + (n - df + 0.5) / (df + 0.5))
+
+    def _query_terms(self, view: _IndexView, query: str) -> List[Tuple[str, List[Tuple[int, float]], int, float]]:
+        terms = []
+        for term in set(tokenize(query)):
+            found = view.term(term)
+            if found is None:
+                continue
+            postings, df = found
+            if view.n >= 1000 and df > self.max_df * view.n:
+                continue
+            terms.append((term, postings, df, self._idf(df, view.n)))
+        return terms
+
+    def _term_score(self, doc_len: List[float], freq: float, doc: int, idf: float, avg_len: float) -> float:
+        norm = self.k1 * (1.0 - self.b + self.b * doc_len[doc] / avg_len)
+        return idf * freq * (self.k1 + 1.0) / (freq + norm)
+
+    def _posting_arrays(
+        self, view: _IndexView, term: str, postings: List[Tuple[int, float]], df: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        cached = view.arrays.get(term)
+        if cached is None or len(cached[0]) < df:
+            docs, freqs = zip(*postings[:df])
+            cached = (np.asarray(docs, dtype=np.int64), np.asarray(freqs, dtype=np.float32))
+            view.arrays[term] = cached
+        return cached[0][:df], cached[1][:df]
+
+    def search(self, query: str, limit: int = 10, snapshot=None) -> Optional[List[Tuple[int, float]]]:
+        """
+        Best `limit` (doc, score) pairs for `query`, best first, among the
+        docs of `snapshot` if given (None if the index doesn't match it).
+        """
+        found = self._view_for(snapshot)
+        if found is None:
+            return None
+        view, n = found
+        if not view.n:
+            return []
+        if view.doc_len_array is None:
+            view.doc_len_array = np.asarray(view.doc_len[:view.n], dtype=np.float32)
+        avg_len = view.avg_len
+        scores = np.zeros(view.n, dtype=np.float32)
+        for term, postings, df, idf in self._query_terms(view, query):
+            docs, freqs = self._posting_arrays(view, term, postings, df)
+            norm = self.k1 * (1.0 - self.b + self.b * view.doc_len_array[docs] / avg_len)
+            # A term appears once per doc in its postings: plain fancy-index add is safe
+            scores[docs] += idf * freqs * (self.k1 + 1.0) / (freqs + norm)
+        scores = scores[:n]
+        hits = np.flatnonzero(scores)
+        if len(hits) > limit:
+            hits = hits[np.argpartition(-scores[hits], limit - 1)[:limit]]
+        hits = hits[np.lexsort((hits, -scores[hits]))]
+        return [(int(d), float(scores[d])) for d in hits]
+
+    def score_docs(self, query: str, docs: Sequence[int], snapshot=None) -> Optional[List[float]]:
+        """
+        BM25 score of `query` for each of `docs` (0.0 where nothing matches
+        or past the index); `docs` are positions in `snapshot` if given, and
+        the result is None if the index doesn't match it.
+        """
+        found = self._view_for(snapshot)
+        if found is None:
+            return None
+        view, n = found
+        if not view.n:
+            return [0.0] * len(docs)
+        avg_len = view.avg_len
+        out = []
+        terms = self._query_terms(view, query)
+        for doc in docs:
+            score = 0.0
+            if doc < n:
+                for _, postings, df, idf in terms:
+                    # Postings are in doc order: binary search instead of a scan
+                    i = bisect.bisect_left(postings, (doc, -math.inf), 0, df)
+                    if i < df and postings[i][0] == doc:
+                        score += self._term_score(view.doc_len, postings[i][1], doc, idf, avg_len)
+            out.append(score)
+        return out
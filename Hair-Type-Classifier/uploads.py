@@ -0,0 +1,171 @@
+import os
+import zipfile
+from io import BytesIO
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, UploadFile
+from fastapi.responses import JSONResponse
+from PIL import Image
+
+UPLOAD_CHUNK_BYTES = 64 * 1024
+
+# Magic numbers of the image types we accept; checked before any decoding
+_SIGNATURES = (
+    (b"\xff\xd8\xff", "jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"GIF87a", "gif"),
+    (b"GIF89a", "gif"),
+    (b"BM", "bmp"),
+)
+# Checked separately: "RIFF" <size> "WEBP"
+_WEBP = "webp"
+
+_TYPE_NAMES = {"jpeg": "JPEG", "png": "PNG", "gif": "GIF", "bmp": "BMP", "webp": "WebP"}
+
+
+def accepted_types_text() -> str:
+    """The image types sniff_image_type accepts, for messages: "JPEG, PNG, GIF, BMP or WebP"."""
+    names = [_TYPE_NAMES[kind] for kind in dict.fromkeys([kind for _, kind in _SIGNATURES] + [_WEBP])]
+    return f"{', '.join(names[:-1])} or {names[-1]}"
+
+
+class UploadTooLarge(HTTPException):
+    def __init__(self, max_bytes: int):
+        super().__init__(status_code=413, detail=f"Upload exceeds the {max_bytes // 2**20} MB limit.")
+        self.max_bytes = max_bytes
+
+
+def too_large_response(max_bytes: int) -> JSONResponse:
+    return JSONResponse(
+        status_code=413,
+        content={"error": f"Upload exceeds the {max_bytes // 2**20} MB limit."},
+    )
+
+
+class UploadLimitMiddleware:
+    """
+    Hard byte cap on request bodies for the given paths.
+
+    A declared Content-Length over the limit is rejected before any of the
+    body is read. Otherwise the body is counted as it streams in, and the
+    request fails with 413 as soon as it crosses the limit, without
+    buffering the rest of an oversized upload.
+    """
+
+    def __init__(self, app, limits: Dict[str, int]):
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope, receive, send):
+        max_bytes = self.limits.get(scope.get("path", "")) if scope["type"] == "http" else None
+        if max_bytes is None:
+            await self.app(scope, receive, send)
+            return
+
+        for name, value in scope.get("headers", []):
+            if name == b"content-length":
+                try:
+                    declared = int(value)
+                except ValueError:
+                    break
+                if declared > max_bytes:
+                    await too_large_response(max_bytes)(scope, receive, send)
+                    return
+                break
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_bytes:
+                    # Re-raised by FastAPI's body parsing, turned into a 413 by
+                    # the UploadTooLarge exception handler
+                    raise UploadTooLarge(max_bytes)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+async def read_upload(file: UploadFile, max_bytes: int) -> bytes:
+    """Read an uploaded file in chunks, giving up as soon as it exceeds `max_bytes`."""
+    buf = bytearray()
+    while True:
+        chunk = await file.read(UPLOAD_CHUNK_BYTES)
+        if not chunk:
+            return bytes(buf)
+        buf += chunk
+        if len(buf) > max_bytes:
+            raise UploadTooLarge(max_bytes)
+
+
+def sniff_image_type(data: bytes) -> Optional[str]:
+    """Image type from the file header, or None if it isn't one we accept."""
+    for magic, kind in _SIGNATURES:
+        if data.startswith(magic):
+            return kind
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return _WEBP
+    return None
+
+
+def decode_image(data: bytes, target_size: Optional[Tuple[int, int]] = None, draft: bool = True) -> Image.Image:
+    """
+    Decode an upload to RGB.
+
+    With `draft`, JPEGs are decoded straight at a reduced scale (1/2, 1/4 or
+    1/8, done by libjpeg during the IDCT) that is still at least
+    `target_size` (height, width), so a 12 MP phone photo never exists at
+    full resolution in memory when the model only needs 224x224.
+    """
+    img = Image.open(BytesIO(data))
+    if draft and target_size is not None and img.format == "JPEG":
+        height, width = target_size
+        img.draft("RGB", (width, height))
+    return img.convert("RGB")
+
+
+def is_zip(data: bytes) -> bool:
+    return data[:4] == b"PK\x03\x04"
+
+
+def expand_zip(data: bytes, max_member_bytes: int, max_items: int) -> List[Tuple[str, Optional[bytes], Optional[str]]]:
+    """
+    Unpack an uploaded zip archive into `(name, bytes, error)` items.
+
+    Directories and hidden / macOS metadata files are skipped. Members
+    over `max_member_bytes` are reported as errors without being
+    decompressed, and at most `max_items + 1` members are returned, so the
+    caller can detect an archive with too many images without inflating it.
+    """
+    items: List[Tuple[str, Optional[bytes], Optional[str]]] = []
+    try:
+        archive = zipfile.ZipFile(BytesIO(data))
+    except zipfile.BadZipFile:
+        return [("archive.zip", None, "Invalid zip archive.")]
+
+    with archive:
+        for info in archive.infolist():
+            name = info.filename
+            base = os.path.basename(name)
+            if info.is_dir() or not base or base.startswith(".") or name.startswith("__MACOSX/"):
+                continue
+            if len(items) > max_items:
+                break
+            if info.file_size > max_member_bytes:
+                items.append((name, None, f"File exceeds the {max_member_bytes // 2**20} MB limit."))
+                continue
+            try:
+                with archive.open(info) as member:
+                    # Don't trust the header's size: stop reading past the cap
+                    content = member.read(max_member_bytes + 1)
+            except (zipfile.BadZipFile, OSError, RuntimeError, NotImplementedError):
+                items.append((name, None, "Could not extract file from archive."))
+                continue
+            if len(content) > max_member_bytes:
+                items.append((name, None, f"File exceeds the {max_member_bytes // 2**20} MB limit."))
+            else:
+                items.append((name, content, None))
+    return items
@@ -0,0 +1,332 @@
+"""
+Current-weather lookups for the seasonal hair adjustments.
+
+`WeatherClient` calls OpenWeatherMap (or any server speaking its
+`/data/2.5/weather` API, set via WEATHER_API_URL) and reduces the answer to
+the fields the frontend shows. `WeatherCache` sits in front of it so that
+repeated lookups for the same city don't each pay the upstream round trip
+and API quota.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+import httpx
+
+OPENWEATHERMAP_URL = "https://api.openweathermap.org/data/2.5/weather"
+
+
+class WeatherError(Exception):
+    """Upstream failure; `payload` is the error body returned to the client."""
+
+    def __init__(self, payload: Dict[str, Any]):
+        super().__init__(payload.get("error", "Weather lookup failed."))
+        self.payload = payload
+
+
+def parse_weather(data: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "city": data.get("name"),
+        "temp": data["main"]["temp"],
+        "feels_like": data["main"]["feels_like"],
+        "humidity": data["main"]["humidity"],
+        "condition": data["weather"][0]["main"],
+        "description": data["weather"][0]["description"],
+        "icon": data["weather"][0]["icon"],
+    }
+
+
+class CircuitOpenError(WeatherError):
+    """Raised without calling upstream while the circuit breaker is open."""
+
+    def __init__(self, retry_after: float):
+        super().__init__({
+            "error": "Weather service temporarily unavailable.",
+            "retry_after": round(retry_after, 1),
+        })
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Fails fast after repeated upstream errors.
+
+    After `failure_threshold` consecutive failures the circuit opens and
+    every call is refused for `cooldown_s`. Then a single trial call is let
+    through (half-open): success closes the circuit, failure opens it for
+    another cooldown.
+    """
+
+    def __init__(self, failure_threshold: int = 5, cooldown_s: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown_s = cooldown_s
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_running = False
+
+        self.opens = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.cooldown_s:
+            return "open"
+        return "half_open"
+
+    def before_call(self) -> None:
+        """Raise CircuitOpenError unless a call may go upstream now."""
+        state = self.state
+        if state == "closed":
+            return
+        if state == "half_open" and not self._trial_running:
+            self._trial_running = True
+            return
+        self.rejected += 1
+        remaining = self.cooldown_s - (time.monotonic() - self.opened_at)
+        raise CircuitOpenError(max(remaining, 0.0))
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self._trial_running or (self.opened_at is None and self.failures >= self.failure_threshold):
+            self.opens += 1
+            self.opened_at = time.monotonic()
+        self._trial_running = False
+
+    def release_trial(self) -> None:
+        """The trial call ended without a verdict (e.g. it was cancelled)."""
+        self._trial_running = False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "failure_threshold": self.failure_threshold,
+            "cooldown_s": self.cooldown_s,
+            "opens": self.opens,
+            "rejected": self.rejected,
+        }
+
+
+class WeatherClient:
+    """
+    Async OpenWeatherMap client on one pooled, keep-alive `httpx.AsyncClient`.
+
+    Connect and read timeouts are separate, so an unreachable host fails
+    within `connect_timeout_s` while a slow answer may take up to
+    `read_timeout_s`. Timeouts, transport errors, 429 and 5xx answers, and
+    200s whose body can't be parsed count as failures for the circuit
+    breaker; other 4xx (e.g. unknown city) don't.
+    The underlying client is created on first use, inside the running event
+    loop (i.e. per worker process), and closed with `aclose()`.
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str],
+        url: str = OPENWEATHERMAP_URL,
+        connect_timeout_s: float = 2.0,
+        read_timeout_s: float = 5.0,
+        max_connections: int = 20,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.api_key = api_key
+        self.url = url
+        self.connect_timeout_s = connect_timeout_s
+        self.read_timeout_s = read_timeout_s
+        self.max_connections = max_connections
+        self.breaker = breaker or CircuitBreaker()
+        self._client = None
+
+    def _get_client(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(
+                    connect=self.connect_timeout_s,
+                    read=self.read_timeout_s,
+                    write=self.read_timeout_s,
+                    pool=self.connect_timeout_s,
+                ),
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+            )
+        return self._client
+
+    async def fetch(self, city: str, country: str) -> Dict[str, Any]:
+        self.breaker.before_call()
+        params = {
+            "q": f"{city},{country}",
+            "appid": self.api_key,
+            "units": "metric",
+        }
+
+        try:
+            response = await self._get_client().get(self.url, params=params)
+        except httpx.TimeoutException as e:
+            self.breaker.record_failure()
+            raise WeatherError({"error": "Weather service timed out.", "details": repr(e)}) from e
+        except httpx.HTTPError as e:
+            self.breaker.record_failure()
+            raise WeatherError({"error": "Failed to reach weather service.", "details": str(e)}) from e
+        except BaseException:
+            self.breaker.release_trial()
+            raise
+
+        if response.status_code != 200:
+            if response.status_code == 429 or response.status_code >= 500:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            raise WeatherError({
+                "error": "Weather API returned an error.",
+                "status_code": response.status_code,
+                "details": response.text,
+            })
+
+        try:
+            weather = parse_weather(response.json())
+        except (AttributeError, KeyError, IndexError, TypeError, ValueError) as e:
+            # A 200 with a body we can't read is as broken as a 5xx
+            self.breaker.record_failure()
+            raise WeatherError({"error": "Weather API returned an unexpected response."}) from e
+        self.breaker.record_success()
+        return weather
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "connect_timeout_s": self.connect_timeout_s,
+            "read_timeout_s": self.read_timeout_s,
+            "max_connections": self.max_connections,
+            "circuit": self.breaker.stats(),
+        }
+
+
+def normalize_location(city: str, country: str) -> Tuple[str, str]:
+    """Cache key: "  cape   Town" / "za" and "Cape Town" / "ZA" are the same place."""
+    return " ".join(city.split()).casefold(), country.strip().upper()
+
+
+class WeatherCache:
+    """
+    TTL cache with stale-while-revalidate for weather lookups.
+
+    Entries younger than `ttl_s` are served as-is. Entries up to
+    `ttl_s + stale_ttl_s` old are still served immediately, while a single
+    background refresh per location replaces them; if that refresh fails the
+    stale entry is kept. Older entries, and locations never seen, are a
+    miss: concurrent misses for the same location share one upstream call.
+    Errors are never cached.
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[str, str], Awaitable[Dict[str, Any]]],
+        ttl_s: float = 600.0,
+        stale_ttl_s: float = 3600.0,
+        max_entries: int = 256,
+    ):
+        self.fetch = fetch
+        self.ttl_s = ttl_s
+        self.stale_ttl_s = stale_ttl_s
+        self.max_entries = max_entries
+
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[Dict[str, Any], float]]" = OrderedDict()
+        self._inflight: Dict[Tuple[str, str], asyncio.Future] = {}
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_s > 0 and self.max_entries > 0
+
+    async def get(self, city: str, country: str) -> Dict[str, Any]:
+        if not self.enabled:
+            return await self.fetch(city, country)
+
+        key = normalize_location(city, country)
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, stored_at = entry
+            age = time.monotonic() - stored_at
+            if age < self.ttl_s:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            if age < self.ttl_s + self.stale_ttl_s:
+                self._entries.move_to_end(key)
+                self.stale_hits += 1
+                if key not in self._inflight:
+                    self.refreshes += 1
+                    self._start_fetch(key, city, country, background=True)
+                return value
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.coalesced += 1
+            # shield: one client going away must not cancel the shared call
+            return await asyncio.shield(inflight)
+
+        self.misses += 1
+        return await asyncio.shield(self._start_fetch(key, city, country))
+
+    def _start_fetch(self, key: Tuple[str, str], city: str, country: str, background: bool = False) -> asyncio.Future:
+        task = asyncio.ensure_future(self._fetch_and_store(key, city, country, background))
+        # Mark a failure as retrieved even if nobody is waiting for it
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        self._inflight[key] = task
+        return task
+
+    async def _fetch_and_store(self, key: Tuple[str, str], city: str, country: str, background: bool) -> Dict[str, Any]:
+        try:
+            value = await self.fetch(city, country)
+        except Exception as e:
+            if background:
+                self.refresh_errors += 1
+                print(f"[Warn] Background weather refresh for {city},{country} failed: {e}")
+            raise
+        else:
+            self._store(key, value)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    def _store(self, key: Tuple[str, str], value: Dict[str, Any]) -> None:
+        self._entries[key] = (value, time.monotonic())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_s": self.ttl_s,
+            "stale_ttl_s": self.stale_ttl_s,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "refreshes": self.refreshes,
+            "refresh_errors": self.refresh_errors,
+            "in_flight": len(self._inflight),
+        }
@@ -1,99 +1,18 @@
+import asyncio
 import os
-import pathlib
-import inspect
-import random
-from typing import Dict, Any, List
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Tuple
 
-import numpy as np
 import gradio as gr
-from fastai.vision.all import *
-import albumentations as A
 
 # ============================================================
-# 0) Cross-platform + legacy compatibility patches
+# 0) Compatibility patches
 # ============================================================
 
-# --- Fix for loading Linux/macOS pickled Learner on Windows ---
-# The model was saved with PosixPath; on Windows unpickling that breaks.
-if os.name == "nt":
-    pathlib.PosixPath = pathlib.WindowsPath  # type: ignore[attr-defined]
-    print("[Patch] Mapped pathlib.PosixPath -> WindowsPath for pickle loading on Windows.")
-
-
-# --- Albumentations compatibility for old saved pipelines ----
-def _ensure_fastai_albu_compat(cls):
-    """
-    Ensure attributes / methods expected by the pickled fastai+albumentations
-    pipeline exist, implemented as safe fallbacks.
-    """
-    # Some old pickles expect apply_to_images
-    if not hasattr(cls, "apply_to_images"):
-        def _apply_to_images(self, *args, **kwargs):
-            return self(*args, **kwargs)
-        setattr(cls, "apply_to_images", _apply_to_images)
-
-    # Some internal flags touched by older code paths
-    if not hasattr(cls, "replay_mode"):
-        setattr(cls, "replay_mode", False)
-    if not hasattr(cls, "deterministic"):
-        setattr(cls, "deterministic", False)
-
-
-try:
-    from albumentations.core.transforms_interface import BasicTransform
-    from albumentations.core.composition import Compose
-except Exception:
-    BasicTransform, Compose = None, None
-
-# Ensure Compose has an additional_targets attribute
-if Compose is not None and not hasattr(Compose, "additional_targets"):
-    setattr(Compose, "additional_targets", {})
-    print("[Patch] Added default additional_targets = {} to Albumentations Compose.")
-
-# Patch all Albumentations transforms that look like fastai might touch them
-if BasicTransform is not None:
-    for _name in dir(A):
-        obj = getattr(A, _name)
-        if inspect.isclass(obj) and issubclass(obj, BasicTransform):
-            _ensure_fastai_albu_compat(obj)
-
-
-# --- AlbumentationsTransform stub for unpickling ---
-class AlbumentationsTransform(RandTransform):
-    """
-    Compatibility wrapper expected by the saved Learner.
-
-    The original training code used an Albumentations pipeline wrapped
-    in this class. For inference we just need a compatible interface so
-    unpickling works. Implementation is safe and minimal.
-    """
-    split_idx, order = None, 2
-
-    def __init__(self, train_aug=None, valid_aug=None):
-        # Saved pickle will restore these attrs
-        self.train_aug = train_aug
-        self.valid_aug = valid_aug
-        self.idx = 0
-
-    def before_call(self, b, split_idx):
-        self.idx = split_idx
-
-    def encodes(self, img: PILImage):
-        # If transforms weren’t restored, just return img
-        if self.train_aug is None and self.valid_aug is None:
-            return img
-
-        aug = self.train_aug if self.idx in (0, None) else self.valid_aug
-        if aug is None:
-            aug = self.train_aug or self.valid_aug
-        if aug is None:
-            return img
-
-        arr = np.array(img)
-        out = aug(image=arr)
-        arr2 = out.get("image", arr)
-        return PILImage.create(arr2)
-
+# The fastai / albumentations patches needed to unpickle the Learner live in
+# Hair-Type-Classifier/fastai_compat.py and are only imported for
+# INFERENCE_BACKEND=torch.
 
 # --- Gradio / gradio_client schema safety patch ---
 try:
@@ -120,23 +39,80 @@ except Exception as e:
 # 1) Load model
 # ============================================================
 
-MODEL_PATH = os.path.join("models", "hair-resnet18-model.pkl")
-
-if not os.path.isfile(MODEL_PATH):
-    raise FileNotFoundError(
-        f"Model file not found at {MODEL_PATH}.\n"
-        f"Make sure 'hair-resnet18-model.pkl' is inside the 'models' folder."
-    )
-
-print(f"[Info] Loading model from: {MODEL_PATH}")
-learn = load_learner(MODEL_PATH)
-print("[Info] Model loaded successfully.")
+# The inference engine / backends are shared with the FastAPI service
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "Hair-Type-Classifier"))
+from batching import MicroBatcher  # noqa: E402
+from inference import create_engine  # noqa: E402
+from model_loader import ModelLoader  # noqa: E402
+from product_store import DEFAULT_DB_PATH, ProductStore  # noqa: E402
+from text_search import BM25Index  # noqa: E402
 
-HAIR_LABELS = list(learn.dls.vocab)
+MODEL_PATH = os.path.join("models", "hair-resnet18-model.pkl")
+MODEL_EXPORT_DIR = os.getenv("MODEL_EXPORT_DIR", os.path.join("models", "export"))
+# torch (default, unpickles the fastai Learner) | weights | torchscript | onnx | int8
+# -- see Hair-Type-Classifier/export_model.py and Hair-Type-Classifier/quantize_model.py.
+# Every backend but torch starts without importing fastai or albumentations.
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "torch").lower()
+
+# The model loads and warms up (MODEL_WARMUP_ROUNDS synthetic forward passes)
+# on a background thread while the UI starts; until it is loaded the
+# analysis answers "still loading" instead of blocking startup.
+MODEL_WARMUP_ROUNDS = int(os.getenv("MODEL_WARMUP_ROUNDS", "3"))
+
+# All sessions share one engine. Analyze clicks go through Gradio's queue
+# (at most GRADIO_MAX_QUEUE waiting; users see their position) in batched
+# mode, and up to GRADIO_CONCURRENCY of those batches run at once. Their
+# images are merged again by a MicroBatcher that waits up to
+# GRADIO_MAX_WAIT_MS for company, so one inference thread runs forward
+# passes of up to GRADIO_MAX_BATCH_SIZE images instead of every click
+# fighting over the torch threads.
+GRADIO_MAX_BATCH_SIZE = int(os.getenv("GRADIO_MAX_BATCH_SIZE", "8"))
+GRADIO_MAX_WAIT_MS = float(os.getenv("GRADIO_MAX_WAIT_MS", "5"))
+GRADIO_CONCURRENCY = int(os.getenv("GRADIO_CONCURRENCY", "4"))
+GRADIO_MAX_QUEUE = int(os.getenv("GRADIO_MAX_QUEUE", "64"))
+
+engine = None
+learn = None
+HAIR_LABELS: List[str] = []
+
+
+def _on_model_loaded(result) -> None:
+    global engine, learn
+    engine, learn = result
+    HAIR_LABELS[:] = engine.vocab
+    print(f"[Info] Inference backend: {INFERENCE_BACKEND}")
+
+
+def _predict_rows(imgs) -> List[Any]:
+    return list(engine.predict_proba(imgs))
+
+
+inference_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="gradio-inference")
+batcher = MicroBatcher(
+    _predict_rows,
+    max_batch_size=GRADIO_MAX_BATCH_SIZE,
+    max_wait_ms=GRADIO_MAX_WAIT_MS,
+    executor=inference_executor,
+)
+
+model = ModelLoader(
+    lambda: create_engine(
+        INFERENCE_BACKEND,
+        model_path=MODEL_PATH,
+        export_dir=MODEL_EXPORT_DIR,
+        max_batch_size=GRADIO_MAX_BATCH_SIZE,
+    ),
+    on_loaded=_on_model_loaded,
+    # On the inference thread itself, as real batches run
+    warmup=lambda imgs: inference_executor.submit(_predict_rows, imgs).result(),
+    warmup_batch_sizes=sorted({1, GRADIO_MAX_BATCH_SIZE}),
+    warmup_rounds=MODEL_WARMUP_ROUNDS,
+)
+model.start()
 
 
 # ============================================================
-# 2) In-memory Product Store & Recommender
+# 2) Product Store & Recommender
 # ============================================================
 
 DEFAULT_PRODUCTS: List[Dict[str, Any]] = [
@@ -189,45 +165,78 @@ def _normalize_hair_label(label: str) -> str:
     return label
 
 
+# Shared SQLite store (same file as the FastAPI service, separate catalog).
+# DEFAULT_PRODUCTS only seeds it on first run; products added by providers
+# persist across restarts.
+PRODUCT_DB_PATH = os.getenv("PRODUCT_DB_PATH", DEFAULT_DB_PATH)
+PRODUCT_CATALOG_NAME = "gradio"
+
+product_store = ProductStore(PRODUCT_DB_PATH, refresh_interval_s=float(os.getenv("PRODUCT_REFRESH_S", "1")))
+if product_store.seed(PRODUCT_CATALOG_NAME, DEFAULT_PRODUCTS):
+    print(f"[Info] Seeded product store {PRODUCT_DB_PATH} with {len(DEFAULT_PRODUCTS)} products.")
+
+
+# BM25 index over name / description / actives for the free-text goal;
+# products added by providers are appended to it, not re-indexed
+goal_index = BM25Index()
+
+# How many of the best hair-type matches (by score_boost) the goal can
+# re-rank into the top 8
+GOAL_CANDIDATES = 32
+
+
 def recommend_products(
     top_label: str,
     probs: List[float],
-    products: List[Dict[str, Any]],
     user_goal: str = ""
 ) -> List[Dict[str, Any]]:
     """
     Build a ranked list of product recommendations with probabilities
     biased by the top predicted hair type and (optionally) the user's goal.
     """
-    if not products or top_label is None:
+    snapshot = product_store.snapshot(PRODUCT_CATALOG_NAME)
+    if not len(snapshot) or top_label is None:
         return []
 
     friendly = _normalize_hair_label(top_label)
-
-    relevant = [
-        p for p in products
-        if friendly in p.get("hair_types", [])
-        or top_label in p.get("hair_types", [])
-        or "All" in p.get("hair_types", [])
-    ]
-    if not relevant:
-        relevant = products[:]
-
-    random.shuffle(relevant)
-    relevant.sort(key=lambda p: p.get("score_boost", 0.0), reverse=True)
+    hair_types = [friendly, top_label, "All"]
+
+    # Best candidates by score_boost among products for this hair type (or
+    # "All"), straight from the snapshot index; all products if none match
+    candidates = snapshot.top_by_boost(hair_types, GOAL_CANDIDATES)
+
+    # Goal relevance in [0, 1], relative to the best-matching candidate
+    relevance = [0.0] * len(candidates)
+    if user_goal and user_goal.strip():
+        goal_index.sync(snapshot)
+        scores = goal_index.score_docs(user_goal, candidates, snapshot)
+        while scores is None:
+            # The index was rebuilt for a newer catalog (a product was
+            # updated or deleted since `snapshot`): rank that one instead
+            snapshot = product_store.snapshot(PRODUCT_CATALOG_NAME)
+            candidates = snapshot.top_by_boost(hair_types, GOAL_CANDIDATES)
+            goal_index.sync(snapshot)
+            scores = goal_index.score_docs(user_goal, candidates, snapshot)
+        best = max(scores, default=0.0)
+        relevance = [s / best for s in scores] if best > 0 else [0.0] * len(candidates)
+
+    ranked = sorted(
+        zip(candidates, relevance),
+        key=lambda c: snapshot.products[c[0]].get("score_boost", 0.0) + 0.1 * c[1],
+        reverse=True,
+    )[:8]
 
     max_prob = max(float(x) for x in probs) if probs else 0.7
     base = max(0.6, min(max_prob + 0.15, 0.95))
 
     recs = []
-    for rank, p in enumerate(relevant[:8]):
+    for rank, (i, rel) in enumerate(ranked):
+        p = snapshot.products[i]
         prob = base - rank * 0.06
         prob = max(0.12, min(prob, 0.98))
 
-        if user_goal and user_goal.lower() in (
-            (p.get("description", "") + p.get("name", "")).lower()
-        ):
-            prob = min(prob + 0.05, 0.99)
+        if rel > 0:
+            prob = min(prob + 0.05 * rel, 0.99)
 
         recs.append({
             "name": p["name"],
@@ -279,19 +288,22 @@ def render_recommendations_html(recs: List[Dict[str, Any]]) -> str:
 # 3) Prediction wrapper
 # ============================================================
 
-def analyze_and_recommend(
-    img,
-    user_goal: str,
-    auth: Dict[str, Any],
-    products: List[Dict[str, Any]]
-):
+AnalysisOutput = Tuple[str, Dict[str, float], str]
+
+
+def _not_signed_in(auth: Dict[str, Any]) -> Optional[AnalysisOutput]:
+    """The answer for a click from a session not signed in as a User, else None."""
     if not auth.get("logged_in") or auth.get("role") != "User":
         return (
             "Please sign in as a **User** to run the hair analysis.",
             {},
             "<div class='cards-empty'>Not authenticated as User.</div>",
         )
+    return None
+
 
+def _not_ready(img) -> Optional[AnalysisOutput]:
+    """The answer for a click that can't be analyzed (no photo, model not loaded), else None."""
     if img is None:
         return (
             "Upload or capture a clear hair photo to start your analysis.",
@@ -299,35 +311,114 @@ def analyze_and_recommend(
             "<div class='cards-empty'>No image provided.</div>",
         )
 
-    try:
-        pred, pred_idx, probs = learn.predict(img)
-        probs = probs.tolist()
-        label_probs = {HAIR_LABELS[i]: float(probs[i]) for i in range(len(HAIR_LABELS))}
-        sorted_items = sorted(label_probs.items(), key=lambda x: x[1], reverse=True)
-        top_label, _ = sorted_items[0]
-
-        md_lines = [
-            f"### Predicted hair type: **{_normalize_hair_label(top_label)}**",
-            "",
-            "Confidence breakdown:",
-        ]
-        for lbl, p in sorted_items:
-            md_lines.append(f"- **{lbl}**: {p:.2%}")
-        if user_goal:
-            md_lines.append(f"\nGoal noted: _{user_goal}_")
-
-        recs = recommend_products(top_label, probs, products, user_goal)
-        recs_html = render_recommendations_html(recs)
-
-        return "\n".join(md_lines), label_probs, recs_html
-
-    except Exception as e:
-        print(f"[Error] Prediction failed: {e}")
+    if not model.loaded:
+        if model.state == "failed":
+            return (
+                f"The hair model failed to load: `{model.error}`",
+                {},
+                "<div class='cards-empty'>Model unavailable. Check logs.</div>",
+            )
         return (
-            f"Error during prediction: `{e}`",
+            "The hair model is still loading. Please try again in a few seconds.",
             {},
-            "<div class='cards-empty'>Prediction error. Check logs.</div>",
+            "<div class='cards-empty'>Model loading…</div>",
         )
+    return None
+
+
+def _prediction_error(e: BaseException) -> AnalysisOutput:
+    print(f"[Error] Prediction failed: {e}")
+    return (
+        f"Error during prediction: `{e}`",
+        {},
+        "<div class='cards-empty'>Prediction error. Check logs.</div>",
+    )
+
+
+def _present(probs: List[float], user_goal: str) -> AnalysisOutput:
+    """Markdown summary, label confidences and product cards for one prediction."""
+    label_probs = {HAIR_LABELS[i]: float(probs[i]) for i in range(len(HAIR_LABELS))}
+    sorted_items = sorted(label_probs.items(), key=lambda x: x[1], reverse=True)
+    top_label, _ = sorted_items[0]
+
+    md_lines = [
+        f"### Predicted hair type: **{_normalize_hair_label(top_label)}**",
+        "",
+        "Confidence breakdown:",
+    ]
+    for lbl, p in sorted_items:
+        md_lines.append(f"- **{lbl}**: {p:.2%}")
+    if user_goal:
+        md_lines.append(f"\nGoal noted: _{user_goal}_")
+
+    recs = recommend_products(top_label, probs, user_goal)
+    recs_html = render_recommendations_html(recs)
+
+    return "\n".join(md_lines), label_probs, recs_html
+
+
+def check_analysis(img, auth: Dict[str, Any]) -> Tuple[Any, Any, Any, bool]:
+    """
+    First, per-session step of "Analyze & Recommend". Gradio gives a
+    batched function the session state of the first click in the batch
+    only, so `auth_state` is checked here, unbatched, and the verdict is
+    handed to analyze_and_recommend_batch as a plain component value.
+    Returns the answer for a click that can't be analyzed and False, or
+    no-op updates and True.
+    """
+    out = _not_signed_in(auth) or _not_ready(img)
+    if out is not None:
+        return (*out, False)
+    return gr.update(), gr.update(), gr.update(), True
+
+
+async def analyze_and_recommend_batch(
+    imgs: List[Any],
+    user_goals: List[str],
+    allowed: List[bool],
+) -> Tuple[List[Any], List[Any], List[Any]]:
+    """
+    Gradio batched handler: one list per input, one list per output. The
+    photos go through the shared micro-batcher together with those of any
+    other batch in flight. Reads no session state: `allowed` is
+    check_analysis' verdict per click, and clicks it turned away keep the
+    answer it already showed.
+    """
+    outputs: List[Optional[AnalysisOutput]] = [
+        _not_ready(img) if ok else (gr.update(), gr.update(), gr.update())
+        for img, ok in zip(imgs, allowed)
+    ]
+    todo = [i for i, out in enumerate(outputs) if out is None]
+    if todo:
+        try:
+            rows = await batcher.submit_many([imgs[i] for i in todo])
+        except Exception as e:
+            rows = [e] * len(todo)
+
+        def present_all() -> None:
+            for i, row in zip(todo, rows):
+                if isinstance(row, BaseException):
+                    outputs[i] = _prediction_error(row)
+                    continue
+                try:
+                    outputs[i] = _present(row.tolist(), user_goals[i])
+                except Exception as e:
+                    outputs[i] = _prediction_error(e)
+
+        # Product ranking + HTML off the event loop
+        await asyncio.to_thread(present_all)
+
+    summaries, probs, cards = zip(*outputs)
+    return list(summaries), list(probs), list(cards)
+
+
+async def analyze_and_recommend(img, user_goal: str, auth: Dict[str, Any]) -> AnalysisOutput:
+    """Single-click version of check_analysis + analyze_and_recommend_batch (for scripts and tests)."""
+    out = _not_signed_in(auth)
+    if out is not None:
+        return out
+    summaries, probs, cards = await analyze_and_recommend_batch([img], [user_goal], [True])
+    return summaries[0], probs[0], cards[0]
 
 
 # ============================================================
@@ -372,15 +463,15 @@ def add_product(
     hair_types: str,
     image_url: str,
     description: str,
+    actives: str,
     auth: Dict[str, Any],
-    products: List[Dict[str, Any]],
 ):
     if not auth.get("logged_in") or auth.get("role") != "Product Provider":
-        return "Please sign in as a **Product Provider** to add products.", products
+        return "Please sign in as a **Product Provider** to add products."
 
     name = (name or "").strip()
     if not name:
-        return "Product name is required.", products
+        return "Product name is required."
 
     brand = (brand or "").strip()
     description = (description or "").strip()
@@ -394,19 +485,27 @@ def add_product(
     if not hair_types_list:
         hair_types_list = ["All"]
 
+    actives_list = [
+        a.strip()
+        for a in (actives or "").replace(";", ",").split(",")
+        if a.strip()
+    ]
+
     new_product = {
         "name": name,
         "brand": brand or "Partner Brand",
         "hair_types": hair_types_list,
         "image": image_url,
         "description": description or "Recommended for your ideal clients.",
+        "actives": actives_list,
         "score_boost": 0.15,
     }
 
-    updated = products + [new_product]
-    msg = f"✅ Added **{name}** for {', '.join(hair_types_list)}. Total products: {len(updated)}"
+    product_store.add(PRODUCT_CATALOG_NAME, new_product)
+    total = len(product_store.snapshot(PRODUCT_CATALOG_NAME))
+    msg = f"✅ Added **{name}** for {', '.join(hair_types_list)}. Total products: {total}"
 
-    return msg, updated
+    return msg
 
 
 # ============================================================
@@ -535,7 +634,6 @@ body {
 
 with gr.Blocks(css=CUSTOM_CSS, title="Tricofy · AI Hair Type & Match") as demo:
     auth_state = gr.State({"logged_in": False, "role": None, "name": ""})
-    products_state = gr.State(DEFAULT_PRODUCTS)
 
     # Hero
     with gr.Column():
@@ -579,6 +677,8 @@ with gr.Blocks(css=CUSTOM_CSS, title="Tricofy · AI Hair Type & Match") as demo:
                     type="pil"
                 )
                 analyze_btn = gr.Button("Analyze & Recommend", variant="primary")
+                # check_analysis' verdict for the click being analyzed
+                analysis_allowed = gr.Checkbox(value=False, visible=False)
 
             with gr.Column(scale=2, elem_classes="card-soft"):
                 hair_summary = gr.Markdown(label="AI Prediction")
@@ -610,6 +710,10 @@ with gr.Blocks(css=CUSTOM_CSS, title="Tricofy · AI Hair Type & Match") as demo:
                 label="Short description",
                 placeholder="Key benefits, active ingredients, claims..."
             )
+            p_actives = gr.Textbox(
+                label="Active ingredients (optional)",
+                placeholder="e.g. Shea Butter, Argan Oil (comma separated)"
+            )
             add_btn = gr.Button("Add product to Tricofy", variant="primary")
             provider_msg = gr.Markdown()
 
@@ -620,21 +724,38 @@ with gr.Blocks(css=CUSTOM_CSS, title="Tricofy · AI Hair Type & Match") as demo:
         outputs=[login_msg, user_tab, provider_tab, auth_state],
     )
 
+    # Auth is checked per session first; only component values (photo, goal,
+    # verdict) reach the batched step, whose session state would be the
+    # first click's for the whole batch
     analyze_btn.click(
-        fn=analyze_and_recommend,
-        inputs=[img_input, user_goal, auth_state, products_state],
+        fn=check_analysis,
+        inputs=[img_input, auth_state],
+        outputs=[hair_summary, hair_probs, product_html, analysis_allowed],
+        queue=False,
+        show_progress="hidden",
+    ).then(
+        fn=analyze_and_recommend_batch,
+        inputs=[img_input, user_goal, analysis_allowed],
         outputs=[hair_summary, hair_probs, product_html],
+        batch=True,
+        max_batch_size=GRADIO_MAX_BATCH_SIZE,
+        concurrency_limit=GRADIO_CONCURRENCY,
+        show_progress="full",  # queue position + ETA while waiting
     )
 
     add_btn.click(
         fn=add_product,
-        inputs=[p_name, p_brand, p_hair_types, p_image, p_desc, auth_state, products_state],
-        outputs=[provider_msg, products_state],
+        inputs=[p_name, p_brand, p_hair_types, p_image, p_desc, p_actives, auth_state],
+        outputs=[provider_msg],
     )
 
 # ============================================================
 # 6) Launch
 # ============================================================
 
+# Bounded queue: past GRADIO_MAX_QUEUE waiting events, new clicks are
+# turned away with "queue is full" instead of waiting minutes
+demo.queue(max_size=GRADIO_MAX_QUEUE)
+
 if __name__ == "__main__":
     demo.launch(share=False, show_api=False, server_name="127.0.0.1", server_port=7860)
@@ -5,7 +5,7 @@ import { Button, PageIntro, ProductCard, SectionHeader, TreatmentCard } from "./
 
 const API_BASE_URL = import.meta.env.VITE_API_URL || "https://trichofy-backend.onrender.com";
 const API_ROOT = API_BASE_URL.replace(/\/$/, "");
-const API_URL = `${API_ROOT}/predict`;
+const ANALYZE_URL = `${API_ROOT}/analyze`;
 const WEATHER_URL = `${API_ROOT}/weather`;
 
 const trustFeatures = [
@@ -174,12 +174,16 @@ export default function App() {
     if (!file) { setError("Choose a clear hair photograph to begin your consultation."); return; }
     setLoading(true); setError(""); setResult(null);
     try {
+      // One round trip: the backend reads the weather while it classifies the photo
       const formData = new FormData();
       formData.append("file", file);
-      const response = await fetch(API_URL, { method: "POST", body: formData });
+      formData.append("city", seasonCity);
+      formData.append("country", seasonCountry);
+      const response = await fetch(ANALYZE_URL, { method: "POST", body: formData });
       if (!response.ok) throw new Error("Backend error");
       const data = await response.json();
       if (data.error) throw new Error(data.error);
+      if (data.weather && !data.weather.error) { setSeasonWeather(data.weather); setSeasonError(""); }
       setResult({
         hair_type: data.hair_type || data.predicted_label || "Unknown",
         probabilities: data.probabilities || data.probs || {},